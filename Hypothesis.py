@@ -16,17 +16,32 @@
 
 # %%
 # Requirements
-import pandas as pd
-import numpy as np
+import os
+
 import plotly.express as px
 import plotly.graph_objects as go
-import plotly.io as pio
 from plotly.subplots import make_subplots
 
+from genz.aggregates import refresh_aggregates
+from genz.answers import AnswerMap, canonicalize_answers
+from genz.crosstab import association_table
+from genz.data import filter_country, save_column_mapping
+from genz.encoding import load_cached
+from genz.inference import format_differences, share_differences, share_intervals
+from genz.multiselect import multiselect_index
+from genz.profiling import stage, write_profile
+from genz.regions import RegionIndex
+from genz.report import write_report
+from genz.schema import QUESTIONS
+from genz.tally import format_counts, question_counts, tally
+from genz.weighting import effective_sample_size, raking_weights
+
 
 # %%
-# Load the data
-df =pd.read_csv("data/GenZ.csv")
+# Load the data. The parsed survey is cached on disk (.cache/) per version of
+# GenZ.csv, so later runs memory-map it instead of parsing the CSV again.
+# The cached columns already have the short names of genz/schema.py.
+df = load_cached().decode()
 df.head()
 
 # %%
@@ -36,45 +51,33 @@ print(df.columns)
 # # Simplifying Column titles
 
 # %%
-# Original column names
-original_columns = [
-    'Your Current Country.',
-    'Your Current Zip Code / Pin Code',
-    'Your Gender',
-    'Which of the below factors influence the most about your career aspirations ?',
-    'Would you definitely pursue a Higher Education / Post Graduation outside of India ? If only you have to self sponsor it.',
-    'How likely is that you will work for one employer for 3 years or more ?',
-    'Would you work for a company whose mission is not clearly defined and publicly posted.',
-    'How likely would you work for a company whose mission is misaligned with their public actions or even their product ?',
-    'How likely would you work for a company whose mission is not bringing social impact ?',
-    'What is the most preferred working environment for you.',
-    'Which of the below Employers would you work with.',
-    'Which type of learning environment that you are most likely to work in ?',
-    'Which of the below careers looks close to your Aspirational job ?',
-    'What type of Manager would you work without looking into your watch ?',
-    'Which of the following setup you would like to work ?'
-]
-
-# New short names
-new_columns = ['country', 'zip_code', 'gender', 'career_factors', 'higher_ed_abroad', 
-               'long_term_employer', 'unclear_mission', 'misaligned_mission', 
-               'no_social_impact', 'work_env', 'employer_choice', 'learning_env', 
-               'asp_job', 'manager_type', 'work_setup']
-
-# Create col_map (short name -> original name)
-col_map = dict(zip(new_columns, original_columns))
-
-# Rename the columns
-df.columns = new_columns
-
-# Optional: Save col_map to CSV
-col_map_df = pd.DataFrame(list(col_map.items()), columns=['Short_Name', 'Original_Name'])
-col_map_df.to_csv('data/column_mapping.csv', index=False)
-
-print("Columns renamed and mapping saved to 'column_mapping.csv'")
+# Save the short name of each original question to data/column_mapping.csv
+save_column_mapping()
+
+print("Column mapping saved to 'column_mapping.csv'")
+
+# %%
+# Map answer variants (spacing, capitalization, aliases such as 'M' or 'Woman')
+# to canonical labels from data/answer_mapping.csv
+answer_map = AnswerMap.from_csv()
+df, unmapped = canonicalize_answers(df, answer_map)
+print(f"Answer mapping {answer_map.version}: {len(unmapped)} unmapped variants")
+if len(unmapped):
+    print(unmapped.to_string(index=False))
 
 # %%
-df.columns
+# Count every answer of every question, split by gender and country. The counts
+# are kept in .cache/aggregates/ and only responses appended to GenZ.csv since
+# the last run are tallied. Comparing them with a full recount re-tallies every
+# response, so it only runs with GENZ_CHECK_AGGREGATES=1 (or run
+# `python -m genz aggregates --check`).
+aggregates, new_rows = refresh_aggregates(answer_map=answer_map)
+tallies = aggregates.table()
+print(f"{new_rows} new responses tallied, {aggregates.rows} counted")
+if os.environ.get('GENZ_CHECK_AGGREGATES'):
+    mismatches = aggregates.check(df)
+    print(f"{len(mismatches)} counts differ from a full recount")
+tallies.head()
 
 # %% [markdown]
 # Dataframe is updated with new columns titles
@@ -83,146 +86,146 @@ df.columns
 # Question 1 : Participant's Current Country and Demographics
 
 # %%
-# Count frequencies for country and gender
-country_counts = df['country'].value_counts().reset_index()
-country_counts.columns = ['country', 'count']
-
-gender_counts = df['gender'].value_counts().reset_index()
-gender_counts.columns = ['gender', 'count']
-
-# Create a subplot with 1 row and 2 columns
-fig = make_subplots(
-    rows=1, cols=2,
-    specs=[[{'type': 'pie'}, {'type': 'pie'}]],  # Specify pie chart types
-    subplot_titles=['Participants by Country', 'Participants by Gender'],
-    horizontal_spacing=0.4  # Add spacing between subplots
-)
-
-# Add Country Pie Chart
-fig.add_trace(
-    go.Pie(
-        labels=country_counts['country'],
-        values=country_counts['count'],
-        textinfo='percent',
-        textposition='inside',
-        name='Country',
-        showlegend=True,  # Enable legend for this pie
-        domain=dict(x=[0, 0.45], y=[0, 1])  # Reduce size by limiting domain
-    ),
-    row=1, col=1
-)
-
-# Add Gender Pie Chart
-fig.add_trace(
-    go.Pie(
-        labels=gender_counts['gender'],
-        values=gender_counts['count'],
-        textinfo='percent',
-        textposition='inside',
-        name='Gender',
-        showlegend=True,  # Enable legend for this pie
-        domain=dict(x=[0.55, 1], y=[0, 1])  # Reduce size by limiting domain
-    ),
-    row=1, col=2
-)
-
-# Update layout for size and separate legends
-fig.update_layout(
-    title_text='Distribution of Participants: Country and Gender',
-    width=1000,  # Half of 1400
-    height=350,  # Half of 700
-    legend=dict(
-        title='',  # Legend title for the first pie
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=0.25  # Position near the country pie
-    ),
-    # Add a second legend for gender pie
-    annotations=[
-        dict(
-            text='',  # Legend title for gender
-            x=1.05, y=0.5,  # Position near the gender pie
-            xref="paper", yref="paper",
-            showarrow=False,
-            font=dict(size=12)
-        )
-    ],
-    margin=dict(t=100, b=50, l=50, r=150)  # Adjust margins
-)
-
-# Update traces to separate legends
-fig.update_traces(
-    legendgroup='country',  # Group country legend
-    selector=dict(name='Country')
-)
-fig.update_traces(
-    legendgroup='gender', legend='legend2',  # Separate gender legend
-    selector=dict(name='Gender')
-)
+# Country and gender counts from the shared tally
+country_counts = question_counts(tallies, 'country')
+gender_counts = question_counts(tallies, 'gender')
+
+# Building each figure is timed as a stage when GENZ_PROFILE is set, like
+# loading, tallying and writing the report (see genz/profiling.py)
+with stage('figure_country_gender'):
+    # Create a subplot with 1 row and 2 columns
+    fig = make_subplots(
+        rows=1, cols=2,
+        specs=[[{'type': 'pie'}, {'type': 'pie'}]],  # Specify pie chart types
+        subplot_titles=['Participants by Country', 'Participants by Gender'],
+        horizontal_spacing=0.4  # Add spacing between subplots
+    )
+
+    # Add Country Pie Chart
+    fig.add_trace(
+        go.Pie(
+            labels=country_counts['country'],
+            values=country_counts['count'],
+            textinfo='percent',
+            textposition='inside',
+            name='Country',
+            showlegend=True,  # Enable legend for this pie
+            domain=dict(x=[0, 0.45], y=[0, 1])  # Reduce size by limiting domain
+        ),
+        row=1, col=1
+    )
+
+    # Add Gender Pie Chart
+    fig.add_trace(
+        go.Pie(
+            labels=gender_counts['gender'],
+            values=gender_counts['count'],
+            textinfo='percent',
+            textposition='inside',
+            name='Gender',
+            showlegend=True,  # Enable legend for this pie
+            domain=dict(x=[0.55, 1], y=[0, 1])  # Reduce size by limiting domain
+        ),
+        row=1, col=2
+    )
+
+    # Update layout for size and separate legends
+    fig.update_layout(
+        title_text='Distribution of Participants: Country and Gender',
+        width=1000,  # Half of 1400
+        height=350,  # Half of 700
+        legend=dict(
+            title='',  # Legend title for the first pie
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=0.25  # Position near the country pie
+        ),
+        # Add a second legend for gender pie
+        annotations=[
+            dict(
+                text='',  # Legend title for gender
+                x=1.05, y=0.5,  # Position near the gender pie
+                xref="paper", yref="paper",
+                showarrow=False,
+                font=dict(size=12)
+            )
+        ],
+        margin=dict(t=100, b=50, l=50, r=150)  # Adjust margins
+    )
+
+    # Update traces to separate legends
+    fig.update_traces(
+        legendgroup='country',  # Group country legend
+        selector=dict(name='Country')
+    )
+    fig.update_traces(
+        legendgroup='gender', legend='legend2',  # Separate gender legend
+        selector=dict(name='Gender')
+    )
 
 # Display the chart
 fig.show()
 
 # Print summaries
 print("Participants' Country Distribution:")
-for country, count in country_counts.itertuples(index=False):
-    print(f"{country}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print(format_counts(share_intervals(country_counts)))
 
 print("\nParticipants' Gender Distribution:")
-for gender, count in gender_counts.itertuples(index=False):
-    print(f"{gender}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print(format_counts(share_intervals(gender_counts)))
 
 # %% [markdown]
 # Since Majority participants i.e., 98% participants from India, We can remove the rest of the responses
 
 # %%
 # Filter the DataFrame to keep only participants from India
-df = df[df['country'] == 'India'].reset_index(drop=True)
+df = filter_country(df, 'India')
 
 # Verify the update
 print("Updated DataFrame - Country Distribution:")
 print(df['country'].value_counts())
 print(f"Total participants after update: {len(df)}")
 
+# Split the comma-joined multi-select answers into per-option bitsets
+multi_select = multiselect_index(df)
+
 # %%
-# Count frequencies for gender in the updated df
-gender_counts = df['gender'].value_counts().reset_index()
-gender_counts.columns = ['gender', 'count']
-
-# Create a pie chart
-fig = px.pie(
-    gender_counts,
-    values='count',
-    names='gender',
-    title='Gender Distribution of Indian Participants',
-    width=800,  # Moderate width
-    height=300  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Gender',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1  # Position legend to the right
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+# Gender counts for Indian participants from the shared tally
+gender_counts = question_counts(tallies, 'gender', country='India')
+
+with stage('figure_gender'):
+    # Create a pie chart
+    fig = px.pie(
+        gender_counts,
+        values='count',
+        names='gender',
+        title='Gender Distribution of Indian Participants',
+        width=800,  # Moderate width
+        height=300  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Gender',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1  # Position legend to the right
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
 
 # Print a summary
 print("Gender Distribution (Indian Participants):")
-for gender, count in gender_counts.itertuples(index=False):
-    print(f"{gender}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print(format_counts(share_intervals(gender_counts)))
 
 # %% [markdown]
 # Question 2 : Which of the below factors influence the most about your career aspirations ?
@@ -232,79 +235,77 @@ for gender, count in gender_counts.itertuples(index=False):
 print(df['career_factors'].head())
 
 # %%
+# Count frequencies for career factors
+career_counts = question_counts(tallies, 'career_factors', country='India')
+
 # Display unique values in 'career_factors'
-unique_factors = df['career_factors'].unique()
 print("Unique Career Factors:")
-for factor in unique_factors:
-    print(factor)
+print('\n'.join(career_counts['career_factors']))
 
-print("\n")    
-# Count frequencies for career factors
-career_counts = df['career_factors'].value_counts().reset_index()
+print("\n")
 
 # Display value counts for 'career_factors'
 print("Career Factors Distribution:")
 print(career_counts.head())
 
 # %%
-# Count frequencies for career_factors
-career_counts = df['career_factors'].value_counts().reset_index()
-career_counts.columns = ['career_factors', 'count']
-
-# Create a pie chart
-fig = px.pie(
-    career_counts,
-    values='count',
-    names='career_factors',
-    title='Distribution of Career Factors Influencing Aspirations',
-    width=800,
-    height=350
-)
-fig.update_traces(textinfo='percent', textposition='inside')
-fig.update_layout(
-    legend_title_text='Career Factors',
-    legend=dict(yanchor="middle", y=0.5, xanchor="left", x=1.1)
-)
+# Answer counts for career_factors from the shared tally
+career_counts = question_counts(tallies, 'career_factors', country='India')
+
+with stage('figure_career_factors'):
+    # Create a pie chart
+    fig = px.pie(
+        career_counts,
+        values='count',
+        names='career_factors',
+        title='Distribution of Career Factors Influencing Aspirations',
+        width=800,
+        height=350
+    )
+    fig.update_traces(textinfo='percent', textposition='inside')
+    fig.update_layout(
+        legend_title_text='Career Factors',
+        legend=dict(yanchor="middle", y=0.5, xanchor="left", x=1.1)
+    )
 fig.show()
 
 # %% [markdown]
 # Question 3: Would you definitely pursue a Higher Education / Post Graduation outside of India ? If only you have to self sponsor it?
 
 # %%
-# Count frequencies for higher_ed_abroad
-higher_ed_counts = df['higher_ed_abroad'].value_counts().reset_index()
-higher_ed_counts.columns = ['higher_ed_abroad', 'count']
+# Answer counts for higher_ed_abroad from the shared tally
+higher_ed_counts = question_counts(tallies, 'higher_ed_abroad', country='India')
 
 # Print a summary
 print("Higher Education Abroad Distribution:")
-for response, count in higher_ed_counts.itertuples(index=False):
-    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
-
-# Create a pie chart
-fig = px.pie(
-    higher_ed_counts,
-    values='count',
-    names='higher_ed_abroad',
-    title='Willingness to Pursue Higher Education Abroad (Self-Sponsored)',
-    width=800,  # Moderate width
-    height=300  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Response',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1  # Position legend to the right
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+print(format_counts(share_intervals(higher_ed_counts)))
+
+with stage('figure_higher_ed_abroad'):
+    # Create a pie chart
+    fig = px.pie(
+        higher_ed_counts,
+        values='count',
+        names='higher_ed_abroad',
+        title='Willingness to Pursue Higher Education Abroad (Self-Sponsored)',
+        width=800,  # Moderate width
+        height=300  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Response',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1  # Position legend to the right
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
@@ -314,40 +315,39 @@ fig.show()
 # Question 4:  How likely is that you will work for one employer for 3 years or more ?
 
 # %%
-# Count frequencies for long_term_employer
-employer_counts = df['long_term_employer'].value_counts().reset_index()
-employer_counts.columns = ['long_term_employer', 'count']
+# Answer counts for long_term_employer from the shared tally
+employer_counts = question_counts(tallies, 'long_term_employer', country='India')
 
 # Print a summary
 print("Long-Term Employer Distribution:")
-for response, count in employer_counts.itertuples(index=False):
-    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
-
-# Create a pie chart
-fig = px.pie(
-    employer_counts,
-    values='count',
-    names='long_term_employer',
-    title='Likelihood of Working for One Employer for 3+ Years',
-    width=800,  # Moderate width
-    height=300  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Likelihood',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1  # Position legend to the right
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+print(format_counts(share_intervals(employer_counts)))
+
+with stage('figure_long_term_employer'):
+    # Create a pie chart
+    fig = px.pie(
+        employer_counts,
+        values='count',
+        names='long_term_employer',
+        title='Likelihood of Working for One Employer for 3+ Years',
+        width=800,  # Moderate width
+        height=300  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Likelihood',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1  # Position legend to the right
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
@@ -356,40 +356,39 @@ fig.show()
 # Question 5: Would you work for a company whose mission is not clearly defined and publicly posted?
 
 # %%
-# Count frequencies for unclear_mission
-mission_counts = df['unclear_mission'].value_counts().reset_index()
-mission_counts.columns = ['unclear_mission', 'count']
+# Answer counts for unclear_mission from the shared tally
+mission_counts = question_counts(tallies, 'unclear_mission', country='India')
 
 # Print a summary
 print("Unclear Mission Distribution:")
-for response, count in mission_counts.itertuples(index=False):
-    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print(format_counts(share_intervals(mission_counts)))
     
-# Create a pie chart
-fig = px.pie(
-    mission_counts,
-    values='count',
-    names='unclear_mission',
-    title='Willingness to Work for a Company with an Unclear Mission',
-    width=600,  # Moderate width
-    height=300  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Response',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1  # Position legend to the right
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+with stage('figure_unclear_mission'):
+    # Create a pie chart
+    fig = px.pie(
+        mission_counts,
+        values='count',
+        names='unclear_mission',
+        title='Willingness to Work for a Company with an Unclear Mission',
+        width=600,  # Moderate width
+        height=300  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Response',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1  # Position legend to the right
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
@@ -398,40 +397,39 @@ fig.show()
 # Question 6:  How likely would you work for a company whose mission is misaligned with their public actions or even their product ?
 
 # %%
-# Count frequencies for misaligned_mission
-mission_counts = df['misaligned_mission'].value_counts().reset_index()
-mission_counts.columns = ['misaligned_mission', 'count']
+# Answer counts for misaligned_mission from the shared tally
+mission_counts = question_counts(tallies, 'misaligned_mission', country='India')
 
 # Print a summary
 print("Misaligned Mission Distribution:")
-for response, count in mission_counts.itertuples(index=False):
-    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print(format_counts(share_intervals(mission_counts)))
     
-# Create a pie chart
-fig = px.pie(
-    mission_counts,
-    values='count',
-    names='misaligned_mission',
-    title='Likelihood of Working for a Company with a Misaligned Mission',
-    width=600,  # Moderate width
-    height=300  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Response',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1  # Position legend to the right
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+with stage('figure_misaligned_mission'):
+    # Create a pie chart
+    fig = px.pie(
+        mission_counts,
+        values='count',
+        names='misaligned_mission',
+        title='Likelihood of Working for a Company with a Misaligned Mission',
+        width=600,  # Moderate width
+        height=300  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Response',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1  # Position legend to the right
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
@@ -440,40 +438,39 @@ fig.show()
 # Question 7:  How likely would you work for a company whose mission is not bringing social impact ?
 
 # %%
-# Count frequencies for misaligned_mission
-mission_counts = df['no_social_impact'].value_counts().reset_index()
-mission_counts.columns = ['no_social_impact', 'count']
+# Answer counts for no_social_impact from the shared tally
+mission_counts = question_counts(tallies, 'no_social_impact', country='India')
 
 # Print a summary
 print("No Social Impact Distribution:")
-for response, count in mission_counts.itertuples(index=False):
-    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print(format_counts(share_intervals(mission_counts)))
     
-# Create a pie chart
-fig = px.pie(
-    mission_counts,
-    values='count',
-    names='no_social_impact',
-    title='Likelihood of not Working for a Company with a social impact Mission',
-    width=800,  # Moderate width
-    height=350  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Response',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1  # Position legend to the right
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+with stage('figure_no_social_impact'):
+    # Create a pie chart
+    fig = px.pie(
+        mission_counts,
+        values='count',
+        names='no_social_impact',
+        title='Likelihood of not Working for a Company with a social impact Mission',
+        width=800,  # Moderate width
+        height=350  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Response',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1  # Position legend to the right
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
@@ -482,42 +479,39 @@ fig.show()
 # Question 8:  What is the most preferred working environment for you?
 
 # %%
-import plotly.express as px
-
-# Count frequencies for work_env
-env_counts = df['work_env'].value_counts().reset_index()
-env_counts.columns = ['work_env', 'count']
+# Answer counts for work_env from the shared tally
+env_counts = question_counts(tallies, 'work_env', country='India')
 
 # Print a summary
 print("Work Environment Distribution:")
-for response, count in env_counts.itertuples(index=False):
-    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
-
-# Create a pie chart
-fig = px.pie(
-    env_counts,
-    values='count',
-    names='work_env',
-    title='Preferred Working Environment',
-    width=800,  # Moderate width
-    height=300  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Work Environment',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1  # Position legend to the right
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+print(format_counts(share_intervals(env_counts)))
+
+with stage('figure_work_env'):
+    # Create a pie chart
+    fig = px.pie(
+        env_counts,
+        values='count',
+        names='work_env',
+        title='Preferred Working Environment',
+        width=800,  # Moderate width
+        height=300  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Work Environment',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1  # Position legend to the right
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
@@ -526,40 +520,39 @@ fig.show()
 # Question 9:  Which of the below Employers would you work with?
 
 # %%
-# Count frequencies for employer_choice
-employer_counts = df['employer_choice'].value_counts().reset_index()
-employer_counts.columns = ['employer_choice', 'count']
+# Answer counts for employer_choice from the shared tally
+employer_counts = question_counts(tallies, 'employer_choice', country='India')
 
 # Print a summary
 print("Employer Choice Distribution:")
-for response, count in employer_counts.itertuples(index=False):
-    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print(format_counts(share_intervals(employer_counts)))
     
-# Create a pie chart
-fig = px.pie(
-    employer_counts,
-    values='count',
-    names='employer_choice',
-    title='Preferred Employer Choice',
-    width=1000,  # Moderate width
-    height=350  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Employer',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1  # Position legend to the right
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+with stage('figure_employer_choice'):
+    # Create a pie chart
+    fig = px.pie(
+        employer_counts,
+        values='count',
+        names='employer_choice',
+        title='Preferred Employer Choice',
+        width=1000,  # Moderate width
+        height=350  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Employer',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1  # Position legend to the right
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
@@ -568,40 +561,39 @@ fig.show()
 # Question 10:  Which type of learning environment that you are most likely to work in ?
 
 # %%
-# Count frequencies for learning_env
-learning_counts = df['learning_env'].value_counts().reset_index()
-learning_counts.columns = ['learning_env', 'count']
+# Per-option counts for learning_env (respondents may select several options)
+learning_counts = multi_select['learning_env'].option_counts()
 
 # Print a summary
 print("Learning Environment Distribution:")
-for response, count in learning_counts.itertuples(index=False):
-    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print(format_counts(share_intervals(learning_counts)))
     
-# Create a pie chart
-fig = px.pie(
-    learning_counts,
-    values='count',
-    names='learning_env',
-    title='Preferred Learning Environment',
-    width=1000,  # Moderate width
-    height=350  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Learning Environment',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1  # Position legend to the right
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+with stage('figure_learning_env'):
+    # Create a pie chart
+    fig = px.pie(
+        learning_counts,
+        values='count',
+        names='learning_env',
+        title='Preferred Learning Environment',
+        width=1000,  # Moderate width
+        height=350  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Learning Environment',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1  # Position legend to the right
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
@@ -610,41 +602,40 @@ fig.show()
 # Question 11:  Which of the below careers looks close to your Aspirational job ?
 
 # %%
-# Count frequencies for asp_job
-job_counts = df['asp_job'].value_counts().reset_index()
-job_counts.columns = ['asp_job', 'count']
+# Per-option counts for asp_job (respondents may select several options)
+job_counts = multi_select['asp_job'].option_counts()
 
 # Print a summary
-#print("Aspirational Job Distribution:")
-#for response, count in job_counts.itertuples(index=False):
-#    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print("Aspirational Job Distribution:")
+print(format_counts(share_intervals(job_counts)))
     
-# Create a pie chart
-fig = px.pie(
-    job_counts,
-    values='count',
-    names='asp_job',
-    title='Aspirational Job Preferences',
-    width=1400,  # Moderate width
-    height=500  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Aspirational Job',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1,  # Position legend to the right
-        font=dict(size=8)  # Adjust font size for better readability
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+with stage('figure_asp_job'):
+    # Create a pie chart
+    fig = px.pie(
+        job_counts,
+        values='count',
+        names='asp_job',
+        title='Aspirational Job Preferences',
+        width=1400,  # Moderate width
+        height=500  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Aspirational Job',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1,  # Position legend to the right
+            font=dict(size=8)  # Adjust font size for better readability
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
@@ -654,41 +645,40 @@ fig.show()
 # Question 12:  What type of Manager would you work without looking into your watch ?
 
 # %%
-# Count frequencies for manager_type
-manager_counts = df['manager_type'].value_counts().reset_index()
-manager_counts.columns = ['manager_type', 'count']
+# Answer counts for manager_type from the shared tally
+manager_counts = question_counts(tallies, 'manager_type', country='India')
 
 # Print a summary
 print("Manager Type Distribution:")
-for response, count in manager_counts.itertuples(index=False):
-    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print(format_counts(share_intervals(manager_counts)))
     
-# Create a pie chart
-fig = px.pie(
-    manager_counts,
-    values='count',
-    names='manager_type',
-    title='Preferred Manager Type',
-    width=900,  # Moderate width
-    height=400  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Manager Type',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1, # Position legend to the right
-        font=dict(size=8) 
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+with stage('figure_manager_type'):
+    # Create a pie chart
+    fig = px.pie(
+        manager_counts,
+        values='count',
+        names='manager_type',
+        title='Preferred Manager Type',
+        width=900,  # Moderate width
+        height=400  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Manager Type',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1, # Position legend to the right
+            font=dict(size=8) 
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
@@ -697,43 +687,114 @@ fig.show()
 # Question 13:  Which of the following setup you would like to work ?
 
 # %%
-# Count frequencies for work_setup
-setup_counts = df['work_setup'].value_counts().reset_index()
-setup_counts.columns = ['work_setup', 'count']
+# Per-option counts for work_setup (respondents may select several options)
+setup_counts = multi_select['work_setup'].option_counts()
 
 # Print a summary
 print("Work Setup Distribution:")
-for response, count in setup_counts.itertuples(index=False):
-    print(f"{response}: {count} participants ({(count / len(df)) * 100:.1f}%)")
+print(format_counts(share_intervals(setup_counts)))
     
-# Create a pie chart
-fig = px.pie(
-    setup_counts,
-    values='count',
-    names='work_setup',
-    title='Preferred Work Setup',
-    width=1200,  # Moderate width
-    height=400  # Moderate height
-)
-
-# Customize the chart
-fig.update_traces(
-    textinfo='percent',  # Show percentages on the slices
-    textposition='inside'  # Place percentages inside the slices
-)
-fig.update_layout(
-    legend_title_text='Work Setup',  # Legend title
-    legend=dict(
-        yanchor="middle",
-        y=0.5,
-        xanchor="left",
-        x=1.1,  # Position legend to the right
-        font=dict(size=8) 
-    ),
-    margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
-)
+with stage('figure_work_setup'):
+    # Create a pie chart
+    fig = px.pie(
+        setup_counts,
+        values='count',
+        names='work_setup',
+        title='Preferred Work Setup',
+        width=1200,  # Moderate width
+        height=400  # Moderate height
+    )
+
+    # Customize the chart
+    fig.update_traces(
+        textinfo='percent',  # Show percentages on the slices
+        textposition='inside'  # Place percentages inside the slices
+    )
+    fig.update_layout(
+        legend_title_text='Work Setup',  # Legend title
+        legend=dict(
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.1,  # Position legend to the right
+            font=dict(size=8) 
+        ),
+        margin=dict(t=50, b=50, l=50, r=150)  # Adjust margins for legend
+    )
 
 # Display the chart
 fig.show()
 
 
+# %% [markdown]
+# Regional breakdown: the first digit of an Indian PIN code is the postal zone, the first two the sub-zone and the first three the sorting district. Zip codes that are not valid PIN codes are listed and left out.
+
+# %%
+regions = RegionIndex.build(df)
+print("Zip codes that are not valid PIN codes:")
+print(regions.malformed().to_string(index=False))
+
+print("\nParticipants by postal zone:")
+print(regions.region_counts('zone').to_string(index=False))
+
+# Share of each answer per zone, e.g. for higher education abroad
+zone_tally = regions.tally(df, ['higher_ed_abroad'], level='zone')
+print(zone_tally.pivot_table(index='region', columns='answer', values='share', fill_value=0).round(3).to_string())
+
+
+# %% [markdown]
+# Weighting: the sample is about two-thirds male and skewed towards some postal zones. Raking to Census 2011 gender and zone shares gives each participant a weight; weighted shares estimate what a population-representative sample would have answered.
+
+# %%
+weights = raking_weights(df, regions=regions)
+print(f"Weights range from {weights.min():.2f} to {weights.max():.2f}; "
+      f"effective sample size {effective_sample_size(weights):.0f} of {len(df)}")
+
+weighted_tallies = tally(df, by=['gender'], weights=weights)
+for question in ['higher_ed_abroad', 'unclear_mission', 'work_env']:
+    print(f"\n{QUESTIONS[question]} (weighted)")
+    print(format_counts(question_counts(weighted_tallies, question)))
+
+
+# %% [markdown]
+# Shares above carry 95% bootstrap confidence intervals. Gender differences per answer: bootstrap interval of the Male − Female difference and a permutation-test p-value.
+
+# %%
+is_male = (df['gender'] == 'Male').to_numpy()
+for question in QUESTIONS:
+    if question in multi_select:
+        male = multi_select[question].option_counts(is_male)
+        female = multi_select[question].option_counts(~is_male)
+    else:
+        male = question_counts(tallies, question, country='India', gender='Male')
+        female = question_counts(tallies, question, country='India', gender='Female')
+    print(f"\n{QUESTIONS[question]}")
+    print(format_differences(share_differences(male, female)))
+
+
+# %% [markdown]
+# Hypothesis tests: chi-square test of independence for every pair of questions and for each question against gender, strongest associations (Cramér's V) first. Multi-select questions are tested per option (selected or not). `low_expected` is the share of cells with an expected count below 5; tables where it exceeds 20% are too sparse for the chi-square approximation and are left out by `association_table`.
+
+# %%
+associations = association_table(df)
+print(associations.head(10).to_string(index=False, float_format='{:.3f}'.format))
+
+print("\nAssociations with gender at the 5% level:")
+by_gender = associations[(associations['question_b'] == 'gender') & (associations['p_value'] < 0.05)]
+print(by_gender[['question_a', 'chi2', 'dof', 'p_value', 'cramers_v']].to_string(index=False, float_format='{:.3f}'.format))
+
+
+# %% [markdown]
+# Batch report: every figure above in a single HTML file, with plotly.js included once
+
+# %%
+report = write_report(tallies, multi_select, 'report.html')
+print(f"Report saved as 'report.html' ({report['figures']} figures, {report['bytes']:,} bytes)")
+
+# %% [markdown]
+# Stage profile: run with `GENZ_PROFILE=profile.json` (or `profile.trace.json` for chrome://tracing) to record wall time, CPU time, peak memory and row counts of each stage above.
+
+# %%
+profile_path = write_profile()
+if profile_path:
+    print(f"Stage profile saved as '{profile_path}'")
@@ -0,0 +1,35 @@
+"""Gen Z career preferences survey: loading and tallying helpers.
+
+Only the light core is imported here. Aggregates, validation, inference,
+regions, sketches, ingest and the rest are imported from their modules,
+e.g. ``from genz.aggregates import refresh_aggregates``, so importing
+``genz`` (and every ``python -m genz`` command) does not load them.
+"""
+
+from .data import filter_country, load_survey, rename_columns, save_column_mapping
+from .encoding import EncodedSurvey, load_cached, load_encoded
+from .schema import (COL_MAP, DATA_PATH, DIMENSIONS, MULTI_SELECT_COLUMNS, NEW_COLUMNS,
+                     ORIGINAL_COLUMNS, QUESTIONS)
+from .tally import add_shares, column_codes, format_counts, question_counts, tally
+
+__all__ = [
+    'COL_MAP',
+    'DATA_PATH',
+    'DIMENSIONS',
+    'EncodedSurvey',
+    'MULTI_SELECT_COLUMNS',
+    'NEW_COLUMNS',
+    'ORIGINAL_COLUMNS',
+    'QUESTIONS',
+    'add_shares',
+    'column_codes',
+    'filter_country',
+    'format_counts',
+    'load_cached',
+    'load_encoded',
+    'load_survey',
+    'question_counts',
+    'rename_columns',
+    'save_column_mapping',
+    'tally',
+]
@@ -0,0 +1,393 @@
+"""Delta-maintained answer counts with a row watermark.
+
+An ``AggregateState`` holds the counts behind the report and the dashboard
+for every response applied so far:
+- the ``tally`` table per question, answer, gender and country;
+- the per-option counts of the multi-select questions;
+- the number of respondents per gender and country.
+
+For each source it also keeps a watermark. For the CSV this is the rows and
+bytes already counted; for an ingest segment directory it is the last
+segment counted. ``refresh`` reads only what lies past the watermark,
+tallies those rows and adds their counts, so its cost follows the new rows
+rather than the size of the survey.
+
+CSV rows and ingest segments pass the ``genz.validation`` checks before
+they are counted; failing rows are appended to the quarantine file beside
+the CSV or the segment directory, numbered from the source's first row.
+The state keeps the hashes of the last ``DUPLICATE_WINDOW`` distinct rows it
+has read, so a submission repeated in a later refresh is caught as a
+duplicate, and the number of rows quarantined.
+
+Deleted and corrected responses are applied with ``retract`` and ``correct``,
+which subtract the old rows' counts (and add the corrected ones). Rows
+already counted should not be edited in place in the CSV. ``check`` compares
+the state with a full recount.
+
+``refresh_aggregates`` keeps the state as JSON under ``CACHE_DIR``, with
+the row hashes in a binary ``.hashes.npy`` file beside it. It
+starts over when the answer mapping or the ``genz`` code changed. It also
+starts over when the CSV no longer continues the bytes it was counted from,
+i.e. the file shrank or the bytes just before the watermark differ.
+"""
+
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .answers import AnswerMap, canonicalize_answers
+from .cache import CACHE_FORMAT, _write_json, code_digest, digest
+from .data import rename_columns
+from .encoding import EncodedSurvey
+from .ingest import segment_paths
+from .multiselect import option_tally
+from .profiling import profiled
+from .schema import (CACHE_DIR, COL_MAP, DATA_PATH, DIMENSIONS, MULTI_SELECT_OPTIONS, NUMERIC_COLUMNS,
+                     ORIGINAL_COLUMNS)
+from .streaming import TallyAccumulator
+from .tally import _group_ids
+from .validation import RowHashes, read_validated, validate_renamed, write_quarantine
+
+# CSV bytes parsed at a time; blocks end on a line break
+BLOCK_BYTES = 16 * 1024 * 1024
+# Bytes before the watermark that must be unchanged for the CSV to count as appended to
+TAIL_BYTES = 4096
+
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _group_sizes(survey):
+    # Respondents per (gender, country) group
+    group_ids, labels, shape = _group_ids(survey, DIMENSIONS)
+    counts = np.bincount(group_ids, minlength=int(np.prod(shape)))
+    groups = np.flatnonzero(counts)
+    index = pd.MultiIndex.from_arrays(
+        [dim_labels[codes] for dim_labels, codes in zip(labels, np.unravel_index(groups, shape))],
+        names=DIMENSIONS)
+    return pd.Series(counts[groups], index=index, dtype='int64')
+
+
+def _watermark(f, header, rows, offset, quarantined=0):
+    # Watermark of an open CSV counted up to ``offset``: rows, offset and the bytes it must keep
+    start = max(offset - TAIL_BYTES, 0)
+    f.seek(start)
+    return {'rows': rows, 'quarantined': quarantined, 'offset': offset, 'header': _sha1(header),
+            'tail': _sha1(f.read(offset - start))}
+
+
+def _add_counts(counts, delta, sign=1):
+    # Sum two count Series over the same index levels; counts may not go negative
+    if delta.empty:
+        return counts
+    delta = delta * sign
+    if not counts.empty:
+        delta = pd.concat([counts, delta])
+    delta = delta.groupby(level=DIMENSIONS, sort=False, dropna=False).sum()
+    if (delta < 0).any():
+        raise ValueError(f"Retracted respondents exceed the counted ones for {delta[delta < 0].index.tolist()}")
+    return delta
+
+
+def _records(table, columns):
+    # JSON-ready rows; missing labels become null
+    table = table[columns].astype(object)
+    return table.where(table.notna(), None).values.tolist()
+
+
+class AggregateState:
+    """Counts of every applied response, plus the watermark of each source."""
+
+    def __init__(self, answer_map=None):
+        self.answer_map = AnswerMap.from_csv() if answer_map is None else answer_map
+        self.reset()
+
+    def reset(self):
+        """Drop every count and watermark."""
+        self.answers = TallyAccumulator(None, DIMENSIONS)
+        self.options = TallyAccumulator(list(MULTI_SELECT_OPTIONS), DIMENSIONS)
+        self.respondents = pd.Series(dtype='int64')
+        # Hashes of the recent rows read, and how many rows were quarantined
+        self.seen = RowHashes()
+        self.quarantined = 0
+        # {resolved source path: watermark}
+        self.watermarks = {}
+
+    @property
+    def key(self):
+        """What the counts depend on besides the rows: answer mapping and ``genz`` code."""
+        return digest(CACHE_FORMAT, self.answer_map.version, code_digest())
+
+    @property
+    def rows(self):
+        """Responses currently counted."""
+        return self.answers.rows
+
+    def _fold(self, survey, sign):
+        survey, _ = canonicalize_answers(survey, self.answer_map)
+        saved = self.answers._counts, self.answers.rows, self.options._counts, self.respondents
+        try:
+            if sign > 0:
+                self.answers.update(survey)
+            else:
+                self.answers.retract(survey)
+            self.options.add_table(option_tally(survey, by=DIMENSIONS), sign)
+            self.respondents = _add_counts(self.respondents, _group_sizes(survey), sign)
+        except ValueError:
+            self.answers._counts, self.answers.rows, self.options._counts, self.respondents = saved
+            raise
+        return self
+
+    def merge(self, *others):
+        """Fold in the counts of other states, such as shards' partial results.
+
+        Counts add up exactly; watermarks of sources this state has not
+        counted yet are taken over.
+        """
+        self.answers.merge(*(other.answers for other in others))
+        self.options.merge(*(other.options for other in others))
+        respondents = [other.respondents for other in others if not other.respondents.empty]
+        if respondents:
+            self.respondents = _add_counts(self.respondents, pd.concat(respondents))
+        self.seen.merge(*(other.seen for other in others))
+        self.quarantined += sum(other.quarantined for other in others)
+        for other in others:
+            for source, watermark in other.watermarks.items():
+                self.watermarks.setdefault(source, watermark)
+        return self
+
+    def apply(self, rows):
+        """Add the counts of renamed responses (DataFrame or EncodedSurvey)."""
+        return self._fold(rows, 1)
+
+    def retract(self, rows):
+        """Subtract the counts of responses deleted after they were counted.
+
+        ``rows`` must hold the responses as they were counted. A retraction
+        that would make any count negative raises ``ValueError`` and changes
+        nothing.
+        """
+        return self._fold(rows, -1)
+
+    def correct(self, old_rows, new_rows):
+        """Replace counted responses ``old_rows`` with their corrected ``new_rows``."""
+        return self.retract(old_rows).apply(new_rows)
+
+    @profiled('refresh_csv')
+    def refresh(self, path=DATA_PATH, block_bytes=BLOCK_BYTES):
+        """Count the CSV rows appended since the watermark; returns how many.
+
+        Rows are read from the watermark's byte offset, ``block_bytes`` at a
+        time. A last line without a line break is left for the next refresh,
+        as it may still be being written. If ``path`` no longer continues the
+        counted bytes, every count and watermark is dropped and the file is
+        counted from the start.
+        """
+        source = str(Path(path).resolve())
+        watermark = self.watermarks.get(source)
+        with open(path, 'rb') as f:
+            header = f.readline()
+            if watermark is not None and not self._continues(f, header, watermark):
+                self.reset()
+                watermark = None
+            if watermark is None:
+                watermark = {'rows': 0, 'quarantined': 0, 'offset': len(header)}
+            quarantined = self.quarantined
+            applied, offset = self.apply_range(f, watermark['offset'], os.fstat(f.fileno()).st_size, block_bytes,
+                                               watermark['rows'] + watermark['quarantined'], path)
+            self.watermarks[source] = _watermark(f, header, watermark['rows'] + applied, offset,
+                                                 watermark['quarantined'] + self.quarantined - quarantined)
+        return applied
+
+    def apply_range(self, f, start, end, block_bytes=BLOCK_BYTES, first_row=0, path=None):
+        """Count the CSV lines between byte offsets ``start`` and ``end`` of open file ``f``.
+
+        ``start`` must be the start of a line after the header, and
+        ``first_row`` the number of that line's record. Rows failing
+        validation are quarantined rather than applied; with ``path`` they
+        are appended to its quarantine file, which is started afresh when
+        ``first_row`` is 0. Returns the rows applied and the offset after
+        the last complete line.
+        """
+        dtype = {original: 'category' for short, original in COL_MAP.items() if short not in NUMERIC_COLUMNS}
+        applied, quarantined, offset = 0, 0, start
+        f.seek(offset)
+        while offset < end:
+            block = f.read(min(block_bytes, end - offset))
+            cut = block.rfind(b'\n') + 1
+            if not cut:
+                break
+            # One response per line: the header is given by name
+            row = first_row + applied + quarantined
+            chunk, quarantine = read_validated(io.BytesIO(block[:cut]), self.answer_map, self.seen, row,
+                                               header=None, names=ORIGINAL_COLUMNS, dtype=dtype)
+            if len(chunk):
+                self.apply(rename_columns(chunk))
+            if path is not None:
+                write_quarantine(quarantine, path, append=row > 0)
+            applied += len(chunk)
+            quarantined += len(quarantine)
+            self.quarantined += len(quarantine)
+            offset += cut
+            f.seek(offset)
+        return applied, offset
+
+    @staticmethod
+    def _continues(f, header, watermark):
+        # Whether the open CSV still holds the header and the bytes before the watermark
+        return _watermark(f, header, watermark['rows'], watermark['offset'], watermark['quarantined']) == watermark
+
+    @profiled('refresh_segments')
+    def refresh_segments(self, directory):
+        """Count the ingest segments written since the watermark; returns the rows applied.
+
+        Segment rows are validated like CSV rows, duplicates included; the
+        failing ones are appended to the directory's quarantine file.
+        """
+        source = str(Path(directory).resolve())
+        watermark = self.watermarks.get(source, {'rows': 0, 'quarantined': 0, 'segment': -1})
+        applied = 0
+        for path in segment_paths(directory):
+            if int(path.name) <= watermark['segment']:
+                continue
+            survey, quarantine = validate_renamed(EncodedSurvey.open(path), self.answer_map, self.seen,
+                                                  watermark['rows'] + watermark['quarantined'])
+            if len(survey):
+                self.apply(survey)
+            write_quarantine(quarantine, directory, append=True)
+            applied += len(survey)
+            self.quarantined += len(quarantine)
+            watermark = {'rows': watermark['rows'] + len(survey),
+                         'quarantined': watermark['quarantined'] + len(quarantine), 'segment': int(path.name)}
+        self.watermarks[source] = watermark
+        return applied
+
+    def table(self, country=None, options=False):
+        """Counts in the ``tally`` layout, for one country or (``None``) all.
+
+        With ``options`` the multi-select questions are counted per option,
+        as in ``option_tally``, instead of per comma-joined answer.
+        """
+        table = self.answers.table()
+        if options:
+            table = pd.concat([table[~table['question'].isin(MULTI_SELECT_OPTIONS)], self.option_table()],
+                              ignore_index=True)
+        if country is not None:
+            table = table[table['country'] == country].reset_index(drop=True)
+        return table
+
+    def option_table(self):
+        """Per-option counts in the ``option_tally`` layout."""
+        table = self.options.table()
+        groups = pd.MultiIndex.from_frame(table[DIMENSIONS])
+        table['share'] = table['count'] / self.respondents.reindex(groups).to_numpy()
+        return table
+
+    def _counts(self):
+        # {table name: count Series} without zero counts
+        counts = {'answers': self.answers._counts, 'options': self.options._counts,
+                  'respondents': self.respondents}
+        return {name: series[series != 0] for name, series in counts.items()}
+
+    def check(self, survey):
+        """Counts where the state and a full recount of ``survey`` disagree.
+
+        ``survey`` holds every response the state should cover, renamed.
+        Returns rows of ``[table, question, answer, gender, country, state,
+        recomputed]``; an empty frame means the counts are exact.
+        """
+        expected = AggregateState(self.answer_map).apply(survey)._counts()
+        frames = []
+        for name, counts in self._counts().items():
+            both = pd.concat([counts.rename('state'), expected[name].rename('recomputed')], axis=1)
+            both = both.fillna(0).astype('int64')
+            frame = both[both['state'] != both['recomputed']].reset_index()
+            frame.insert(0, 'table', name)
+            frames.append(frame)
+        columns = ['table', 'question', 'answer', *DIMENSIONS, 'state', 'recomputed']
+        return pd.concat(frames, ignore_index=True).reindex(columns=columns)
+
+    def to_dict(self):
+        """JSON-ready counts, watermarks and key; the row hashes are saved apart."""
+        keys = ['question', 'answer', *DIMENSIONS, 'count']
+        return {
+            'key': self.key,
+            'rows': self.rows,
+            'quarantined': self.quarantined,
+            'watermarks': self.watermarks,
+            'answers': _records(self.answers.table(), keys),
+            'options': _records(self.options.table(), keys),
+            'respondents': _records(self.respondents.rename('count').reset_index(), [*DIMENSIONS, 'count']),
+        }
+
+    @classmethod
+    def from_dict(cls, data, answer_map=None):
+        """State saved by ``to_dict``; an empty one if its key no longer matches."""
+        state = cls(answer_map)
+        if data.get('key') != state.key:
+            return state
+        keys = ['question', 'answer', *DIMENSIONS, 'count']
+        state.answers.add_table(pd.DataFrame(data['answers'], columns=keys))
+        state.answers.rows = data['rows']
+        state.options.add_table(pd.DataFrame(data['options'], columns=keys))
+        respondents = pd.DataFrame(data['respondents'], columns=[*DIMENSIONS, 'count'])
+        state.respondents = respondents.set_index(DIMENSIONS)['count'].astype('int64')
+        state.quarantined = data['quarantined']
+        state.watermarks = data['watermarks']
+        return state
+
+    def save(self, path):
+        """Write the state as JSON at ``path`` and its row hashes beside it."""
+        self.seen.save(_hashes_path(path))
+        _write_json(Path(path), self.to_dict())
+        return path
+
+    @classmethod
+    def load(cls, path, answer_map=None):
+        """State saved at ``path``, or an empty one if there is none."""
+        try:
+            data = json.loads(Path(path).read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            data = {}
+        state = cls.from_dict(data, answer_map)
+        if state.watermarks:
+            state.seen = RowHashes.load(_hashes_path(path))
+        return state
+
+
+def _hashes_path(path):
+    # Binary row-hash file kept beside a saved state
+    path = Path(path)
+    return path.with_name(f'{path.stem}.hashes.npy')
+
+
+def aggregates_path(path=DATA_PATH, segments=None, directory=CACHE_DIR):
+    """Where the state of a CSV (plus segment directory) is kept."""
+    sources = [str(Path(path).resolve()), None if segments is None else str(Path(segments).resolve())]
+    return Path(directory) / 'aggregates' / f'{digest(*sources)}.json'
+
+
+@profiled('refresh_aggregates')
+def refresh_aggregates(path=DATA_PATH, segments=None, directory=CACHE_DIR, answer_map=None):
+    """Bring the saved ``AggregateState`` of ``path`` up to date and save it.
+
+    Only responses appended to the CSV (and, with ``segments``, ingest
+    segments written) since the last refresh are tallied. Returns the state
+    and the number of rows applied.
+    """
+    state_path = aggregates_path(path, segments, directory)
+    state = AggregateState.load(state_path, answer_map)
+    watermarks = json.dumps(state.watermarks, sort_keys=True)
+    applied = state.refresh(path)
+    if segments is not None:
+        applied += state.refresh_segments(segments)
+    # Rows that were all quarantined still move the watermark
+    if json.dumps(state.watermarks, sort_keys=True) != watermarks or not state_path.exists():
+        state.save(state_path)
+    return state, applied
@@ -0,0 +1,152 @@
+"""Canonical answer labels for the single-choice questions.
+
+``data/answer_mapping.csv`` lists, per question, every accepted variant of
+an answer and the canonical label it maps to. Variants match after
+whitespace is collapsed and case is folded, so "Will NOT work for them"
+and " will not  work for them" are one answer. Lookups run once per
+distinct string (``pd.factorize`` first, then a memoized table) and
+canonical labels are interned, so the cost does not grow with repeated
+rows. Values without a mapping are kept (whitespace-cleaned) and reported.
+
+Multi-select columns are left to ``genz.multiselect``, which matches
+options against the fixed vocabulary in ``genz.schema``.
+"""
+
+import hashlib
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .profiling import profiled
+from .schema import ANSWER_MAPPING_PATH, MULTI_SELECT_OPTIONS, NUMERIC_COLUMNS
+
+UNMAPPED_COLUMNS = ['question', 'variant', 'count']
+
+
+def normalize(text):
+    """Matching key of an answer: whitespace collapsed, case folded."""
+    return ' '.join(str(text).split()).casefold()
+
+
+class AnswerMap:
+    """Canonical label of every known answer variant, per question."""
+
+    def __init__(self, variants):
+        # {question: {variant as written: canonical label}}, kept for to_csv
+        self.variants = {question: dict(question_variants) for question, question_variants in variants.items()}
+        # {question: {normalized variant: interned canonical label}}
+        self.table = {
+            question: {normalize(variant): sys.intern(canonical)
+                       for variant, canonical in question_variants.items()}
+            for question, question_variants in variants.items()
+        }
+        self.canonical = lru_cache(maxsize=None)(self._canonical)
+
+    def __reduce__(self):
+        # Pickled as its variants (e.g. for worker processes); lookups are rebuilt
+        return type(self), (self.variants,)
+
+    @classmethod
+    def from_csv(cls, path=ANSWER_MAPPING_PATH):
+        """Read a ``Short_Name, Variant, Canonical`` mapping file."""
+        mapping = pd.read_csv(path, dtype=str, keep_default_na=False)
+        table = {}
+        for question, variant, canonical in mapping[['Short_Name', 'Variant', 'Canonical']].itertuples(index=False):
+            table.setdefault(question, {})[variant] = canonical
+        return cls(table)
+
+    @classmethod
+    def from_frame(cls, df, columns=None):
+        """Identity mapping of every answer in a renamed frame, to seed a mapping file."""
+        columns = mappable_columns(df.columns) if columns is None else columns
+        return cls({column: {label: label for label in df[column].dropna().unique()} for column in columns})
+
+    @property
+    def questions(self):
+        return list(self.table)
+
+    @property
+    def version(self):
+        """Short content hash of the mapping, to record which one a report used."""
+        rows = sorted((question, variant, canonical) for question, variants in self.variants.items()
+                      for variant, canonical in variants.items())
+        return hashlib.sha1(repr(rows).encode('utf-8')).hexdigest()[:12]
+
+    def _canonical(self, question, value):
+        # (label, mapped) of one distinct raw value; memoized per map
+        cleaned = ' '.join(str(value).split())
+        label = self.table[question].get(cleaned.casefold())
+        return (label, True) if label is not None else (sys.intern(cleaned), False)
+
+    def _map_labels(self, question, labels):
+        # Canonical label and mapped flag of each distinct label
+        results = [self.canonical(question, label) for label in labels]
+        canonical = np.array([label for label, _ in results], dtype=object)
+        mapped = np.array([flag for _, flag in results], dtype=bool)
+        return canonical, mapped
+
+    def to_csv(self, path=ANSWER_MAPPING_PATH):
+        """Write the map as ``Short_Name, Variant, Canonical`` rows, canonical labels first."""
+        rows = []
+        for question, variants in self.variants.items():
+            for canonical in dict.fromkeys(variants.values()):
+                rows.append((question, canonical, canonical))
+                rows += [(question, variant, canonical) for variant, label in variants.items()
+                         if label == canonical and variant != canonical]
+        pd.DataFrame(rows, columns=['Short_Name', 'Variant', 'Canonical']).to_csv(path, index=False)
+
+
+def mappable_columns(columns):
+    """Columns that take canonical labels: single-choice, non-numeric."""
+    return [column for column in columns
+            if column not in MULTI_SELECT_OPTIONS and column not in NUMERIC_COLUMNS]
+
+
+@profiled('canonicalize')
+def canonicalize_answers(df, answer_map=None):
+    """Replace answer variants with canonical labels after the rename.
+
+    ``df`` is a renamed DataFrame or an ``EncodedSurvey`` (only its
+    vocabularies are rewritten; codes of merged labels are remapped).
+    Returns the canonicalized survey and a ``[question, variant, count]``
+    table of values that have no mapping, most frequent first.
+    """
+    answer_map = AnswerMap.from_csv() if answer_map is None else answer_map
+    questions = [question for question in answer_map.questions if question in df.columns]
+    unmapped = []
+    if isinstance(df, pd.DataFrame):
+        df = df.copy(deep=False)
+        for question in questions:
+            codes, labels = pd.factorize(df[question])
+            canonical, mapped = answer_map._map_labels(question, labels)
+            df[question] = pd.Series(np.append(canonical, None)[codes], index=df.index)
+            counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+            unmapped += [(question, canonical[i], counts[i]) for i in np.flatnonzero(~mapped)]
+    else:
+        from .encoding import EncodedSurvey
+
+        codes, vocab = dict(df.codes), dict(df.vocab)
+        for question in questions:
+            canonical, mapped = answer_map._map_labels(question, vocab[question][1:])
+            # Merge labels that now coincide; code 0 stays missing
+            inverse, merged = pd.factorize(canonical)
+            remap = np.concatenate([[0], inverse + 1]).astype(codes[question].dtype)
+            counts = np.bincount(codes[question], minlength=len(vocab[question]))[1:]
+            codes[question] = remap[codes[question]]
+            vocab[question] = np.concatenate([[None], np.asarray(merged, dtype=object)])
+            unmapped += [(question, canonical[i], counts[i]) for i in np.flatnonzero(~mapped)]
+        df = EncodedSurvey(codes, vocab, df.dtypes)
+
+    report = pd.DataFrame(unmapped, columns=UNMAPPED_COLUMNS)
+    report = report.groupby(['question', 'variant'], sort=False, as_index=False)['count'].sum()
+    return df, report.sort_values('count', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def save_answer_mapping(df, path=ANSWER_MAPPING_PATH, aliases=None):
+    """Write the answers of a renamed frame, plus ``{question: {variant: canonical}}`` aliases."""
+    variants = AnswerMap.from_frame(df).variants
+    for question, question_aliases in (aliases or {}).items():
+        variants.setdefault(question, {}).update(question_aliases)
+    AnswerMap(variants).to_csv(path)
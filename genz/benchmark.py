@@ -0,0 +1,128 @@
+"""Scaling benchmark of the report pipeline on synthetic survey files.
+
+Each stage of ``Hypothesis.py`` and the dashboard build (CSV load,
+validation, rename, India filter, tallies, figure construction, dashboard HTML) is timed and its
+peak traced allocation recorded at every requested size. Results can be
+saved as a baseline and later runs compared against it.
+"""
+
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from .data import filter_country, load_survey, rename_columns
+from .multiselect import multiselect_index
+from .schema import DATA_PATH, ROOT
+from .synthetic import write_synthetic
+from .tally import tally
+from .validation import validate_survey
+
+BENCHMARK_DIR = ROOT / 'benchmarks'
+BASELINE_PATH = BENCHMARK_DIR / 'baseline.json'
+# Generated CSVs are cached here (git-ignored) and reused across runs
+SYNTHETIC_DIR = BENCHMARK_DIR / 'data'
+DEFAULT_SIZES = [10_000, 100_000]
+STAGES = ['load', 'validate', 'rename', 'filter', 'tally', 'figures', 'dashboard']
+# A stage regresses when it is this much slower or larger than the baseline
+DEFAULT_TOLERANCE = 0.25
+# ...and by more than this absolute amount, so millisecond stages do not flap
+NOISE_FLOOR = {'seconds': 0.05, 'peak_bytes': 1_000_000}
+
+
+def synthetic_path(n_rows, seed=0):
+    """Cached synthetic CSV of ``n_rows`` responses, generated on first use."""
+    path = SYNTHETIC_DIR / f'synthetic-{n_rows}-{seed}.csv'
+    if not path.exists():
+        SYNTHETIC_DIR.mkdir(parents=True, exist_ok=True)
+        write_synthetic(path, n_rows, seed)
+    return path
+
+
+def _measure(results, stage, func, *args):
+    # Wall time and traced peak of one stage; tracing adds a roughly constant overhead
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = func(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    results[stage] = {'seconds': round(seconds, 4), 'peak_bytes': peak}
+    return value
+
+
+def _figures(tallies, multi_select):
+    from .report import figure_data, figures_json
+
+    return figures_json(figure_data(tallies, multi_select), processes=1)
+
+
+def _dashboard(india):
+    from .dashboard import render_dashboard
+
+    return render_dashboard(india)
+
+
+def run_stages(path):
+    """``{stage: {'seconds': ..., 'peak_bytes': ...}}`` for one survey CSV."""
+    results = {}
+    raw = _measure(results, 'load', load_survey, path)
+    valid, _ = _measure(results, 'validate', validate_survey, raw)
+    df = _measure(results, 'rename', rename_columns, valid)
+    india = _measure(results, 'filter', filter_country, df)
+    tallies, multi_select = _measure(results, 'tally', lambda: (tally(df), multiselect_index(india)))
+    _measure(results, 'figures', _figures, tallies, multi_select)
+    _measure(results, 'dashboard', _dashboard, india)
+    return results
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, seed=0):
+    """Stage results keyed by row count (as a string, for JSON round-trips)."""
+    # Warm-up pass on the real file so lazy Plotly imports and template
+    # loading are not charged to the first size
+    run_stages(DATA_PATH)
+    return {str(n_rows): run_stages(synthetic_path(n_rows, seed)) for n_rows in sizes}
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+        f.write('\n')
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """One row per (size, stage, metric) with its ratio to the baseline.
+
+    Sizes or stages missing from the baseline are skipped. A metric regresses
+    when it exceeds the baseline by more than ``tolerance`` and by more than
+    its ``NOISE_FLOOR``.
+    """
+    rows = []
+    for size, stages in results.items():
+        for stage, metrics in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if reference is None:
+                continue
+            for metric, value in metrics.items():
+                ratio = value / reference[metric] if reference[metric] else float('inf')
+                regressed = ratio > 1 + tolerance and value - reference[metric] > NOISE_FLOOR[metric]
+                rows.append({'rows': int(size), 'stage': stage, 'metric': metric,
+                             'baseline': reference[metric], 'current': value,
+                             'ratio': round(ratio, 3), 'regressed': regressed})
+    return rows
+
+
+def format_results(results):
+    """Plain-text table of seconds and peak MB per size and stage."""
+    lines = [f"{'rows':>10}  " + '  '.join(f'{stage:>16}' for stage in STAGES)]
+    for size, stages in results.items():
+        cells = [f"{stages[stage]['seconds']:7.3f}s {stages[stage]['peak_bytes'] / 1e6:6.1f}MB"
+                 for stage in STAGES]
+        lines.append(f'{int(size):>10,}  ' + '  '.join(cells))
+    return '\n'.join(lines)
@@ -0,0 +1,117 @@
+"""Content-addressed cache for incremental builds.
+
+A build step is keyed by a SHA-1 digest of everything its output depends
+on: input bytes (the CSV, the answer mapping, one survey column), labels,
+templates, options and the ``genz`` source itself. Its JSON result is
+stored under ``CACHE_DIR`` as ``<kind>/<key>.json``. A step whose key is
+already stored is skipped. A changed input changes the key, so stale
+entries are never read and nothing has to be invalidated; deleting the
+directory only costs one full rebuild.
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from .schema import CACHE_DIR
+from .tally import column_codes
+
+# Bump when the layout of stored values changes
+CACHE_FORMAT = 1
+
+
+def digest(*parts):
+    """Hex SHA-1 of ``parts``: bytes as-is, anything else as sorted-key JSON."""
+    sha = hashlib.sha1()
+    for part in parts:
+        data = part if isinstance(part, bytes) else json.dumps(part, sort_keys=True, default=str).encode('utf-8')
+        # Length prefix so ('ab', 'c') and ('a', 'bc') differ
+        sha.update(len(data).to_bytes(8, 'little'))
+        sha.update(data)
+    return sha.hexdigest()
+
+
+def file_digest(path):
+    """Hex SHA-1 of a file's bytes, or ``None`` if it does not exist."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.file_digest(f, 'sha1').hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def source_digest(path, directory=CACHE_DIR):
+    """``file_digest`` of a large input, remembered per (path, size, mtime).
+
+    An unchanged file is not re-read on later runs; any write to it changes
+    its size or modification time and so triggers a fresh hash.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    index_path = Path(directory) / 'digests.json'
+    try:
+        index = json.loads(index_path.read_text(encoding='utf-8'))
+    except (FileNotFoundError, ValueError):
+        index = {}
+    entry = index.get(str(path))
+    if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return entry[2]
+    index[str(path)] = [stat.st_size, stat.st_mtime_ns, file_digest(path)]
+    _write_json(index_path, index)
+    return index[str(path)][2]
+
+
+def _write_json(path, value):
+    # Write to a temporary name and swap it in, so readers never see a partial file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    partial.write_text(json.dumps(value, separators=(',', ':')), encoding='utf-8')
+    os.replace(partial, path)
+
+
+@lru_cache(maxsize=None)
+def code_digest():
+    """Digest of the ``genz`` sources, so results of older code are not reused."""
+    sources = sorted(Path(__file__).parent.glob('*.py'))
+    return digest(*[(path.name, file_digest(path)) for path in sources])
+
+
+def column_digest(df, column):
+    """Digest of one column's values (renamed DataFrame or ``EncodedSurvey``)."""
+    codes, labels = column_codes(df, column)
+    return digest(codes.astype(np.int64).tobytes(), labels.tolist())
+
+
+def array_digest(values):
+    """Digest of a numeric array such as per-row weights; ``None`` stays ``None``."""
+    return None if values is None else digest(np.ascontiguousarray(values, dtype=float).tobytes())
+
+
+class BuildCache:
+    """JSON values stored by ``(kind, key)`` under ``directory``, with hit and miss counts."""
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = Path(directory)
+        self.hits = self.misses = 0
+
+    def _path(self, kind, key):
+        return self.directory / kind / f'{key}.json'
+
+    def get(self, kind, key):
+        """Stored value, or ``None`` (counted as a miss) when absent or unreadable."""
+        try:
+            value = json.loads(self._path(kind, key).read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, kind, key, value):
+        """Store ``value``; the file is swapped in whole, so readers never see a partial entry."""
+        _write_json(self._path(kind, key), value)
+        return value
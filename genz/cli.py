@@ -0,0 +1,487 @@
+"""Command line entry point: ``python -m genz <command>``.
+
+``tally`` is compute-only and never imports Plotly; ``report`` and
+``dashboard`` import it lazily when a figure or bundle is needed.
+"""
+
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from . import profiling
+from .answers import canonicalize_answers
+from .data import filter_country
+from .encoding import load_cached
+from .multiselect import option_tally
+from .schema import (ANSWER_MAPPING_PATH, DATA_PATH, DIMENSIONS, MULTI_SELECT_OPTIONS, NEW_COLUMNS,
+                     PARQUET_DIR, SEGMENTS_DIR)
+from .streaming import DEFAULT_CHUNKSIZE, stream_tally
+from .tally import tally
+
+# Help of --plotly: which plotly.js bundle each choice puts in the page
+PLOTLY_HELP = ("'cdn' links plotly.js; 'inline' embeds the pie-only bundle from the bundle command, "
+               "or the full plotly.js bundle (with a warning) until it is built")
+
+
+def _country(value):
+    return None if value.lower() == 'all' else value
+
+
+def _or_default(value, default):
+    # Option value, or the module constant when the option was not given; the
+    # constants are imported by the handlers so other commands do not load their modules
+    return default if value is None else value
+
+
+def _write_table(table, output):
+    if output is None:
+        table.to_csv(sys.stdout, index=False)
+    elif str(output).endswith('.json'):
+        table.to_json(output, orient='records', indent=1)
+    else:
+        table.to_csv(output, index=False)
+
+
+def _canonicalize(survey):
+    # Map answer variants to canonical labels and report the unmapped ones
+    survey, unmapped = canonicalize_answers(survey)
+    if len(unmapped):
+        print(f"{len(unmapped)} answer variants have no canonical label "
+              f"(see data/answer_mapping.csv): {unmapped['variant'].tolist()[:5]}", file=sys.stderr)
+    return survey
+
+
+def _load(args, columns=None):
+    # With --parquet only the country's partition and the given columns are read
+    if args.parquet:
+        from .partitioned import load_partitioned
+
+        survey = load_partitioned(args.parquet, args.country, columns=columns)
+    else:
+        survey = load_cached(args.csv)
+    survey = _canonicalize(survey)
+    return survey if args.parquet or args.country is None else filter_country(survey, args.country)
+
+
+def _weights(args, survey):
+    # Census raking weights when --weighted was given
+    if not getattr(args, 'weighted', False):
+        return None
+    from .weighting import effective_sample_size, raking_weights
+
+    weights = raking_weights(survey)
+    print(f"Raked {len(weights)} respondents to gender and zone targets "
+          f"(effective sample size {effective_sample_size(weights):.0f})", file=sys.stderr)
+    return weights
+
+
+def run_tally(args):
+    questions = args.question or NEW_COLUMNS
+    if args.chunksize:
+        table = stream_tally(args.csv, args.chunksize, args.country, questions, args.by).table()
+    elif args.region:
+        from .regions import RegionIndex
+
+        survey = _load(args, [*questions, 'zip_code'])
+        regions = RegionIndex.build(survey)
+        malformed = regions.malformed()
+        if len(malformed):
+            reasons = malformed['reason'].value_counts().to_dict()
+            print(f"{len(malformed)} zip codes left out of regions: {reasons}", file=sys.stderr)
+        table = regions.tally(survey, questions, args.region)
+    else:
+        survey = _load(args, [*questions, *args.by, *(['gender', 'zip_code'] if args.weighted else [])])
+        if args.options:
+            single = [question for question in questions if question not in MULTI_SELECT_OPTIONS]
+            multi = [question for question in questions if question in MULTI_SELECT_OPTIONS]
+            weights = _weights(args, survey)
+            table = pd.concat([tally(survey, single, args.by, weights),
+                               option_tally(survey, multi, args.by, weights)], ignore_index=True)
+        else:
+            table = tally(survey, questions, args.by, _weights(args, survey))
+    _write_table(table, args.output)
+
+
+def run_aggregates(args):
+    from .aggregates import refresh_aggregates
+
+    state, applied = refresh_aggregates(args.csv, args.segments)
+    print(f"Tallied {applied:,} new responses; {state.rows:,} counted, {state.quarantined:,} quarantined",
+          file=sys.stderr)
+    if args.check:
+        from .encoding import load_encoded
+        from .ingest import load_segments
+        from .validation import RowHashes, validate_renamed
+
+        # Segments are validated after the CSV, duplicates included, as in the state
+        seen = RowHashes()
+        survey = load_encoded(args.csv, seen=seen)
+        if args.segments is not None:
+            segments, _ = validate_renamed(load_segments(args.segments), seen=seen)
+            survey = pd.concat([survey.decode(), segments], ignore_index=True)
+        _check(state, survey)
+    _write_table(state.table(args.country, args.options), args.output)
+
+
+def _check(state, survey):
+    # Exit non-zero when aggregated counts differ from a full recount of ``survey``
+    mismatches = state.check(survey)
+    if len(mismatches):
+        print(mismatches.to_string(index=False), file=sys.stderr)
+        sys.exit(f"{len(mismatches)} counts differ from a full recount")
+    print("Counts match a full recount", file=sys.stderr)
+
+
+def run_shards(args):
+    from .sharded import tally_shards
+
+    start = time.perf_counter()
+    state = tally_shards(args.exports, args.processes)
+    elapsed = time.perf_counter() - start
+    print(f"Tallied {state.rows:,} responses from {len(args.exports)} exports in {elapsed:.2f}s "
+          f"({state.rows / elapsed:,.0f} rows/s); {state.quarantined:,} quarantined", file=sys.stderr)
+    if args.check:
+        from .encoding import concat_surveys, load_encoded
+        from .validation import RowHashes
+
+        # Duplicates are caught across exports, as the shards do
+        seen = RowHashes()
+        _check(state, concat_surveys(load_encoded(path, seen=seen) for path in args.exports))
+    _write_table(state.table(args.country, args.options), args.output)
+
+
+def run_validate(args):
+    from .validation import format_reasons, read_validated
+
+    valid, quarantine = read_validated(args.csv)
+    print(f"{len(quarantine):,} of {len(valid) + len(quarantine):,} rows quarantined"
+          + (f" ({format_reasons(quarantine)})" if len(quarantine) else ""), file=sys.stderr)
+    _write_table(quarantine, args.output)
+
+
+def run_associations(args):
+    from .crosstab import MAX_LOW_EXPECTED, association_table
+
+    _write_table(association_table(_load(args), max_low_expected=None if args.keep_sparse else MAX_LOW_EXPECTED),
+                 args.output)
+
+
+def run_report(args):
+    from .cache import BuildCache
+    from .data import rename_columns
+    from .multiselect import multiselect_index
+    from .report import write_report
+    from .validation import read_validated, write_quarantine
+
+    df, quarantine = read_validated(args.csv)
+    write_quarantine(quarantine, args.csv)
+    df = _canonicalize(rename_columns(df))
+    tallies = tally(df)
+    multi_select = multiselect_index(filter_country(df, args.country) if args.country else df)
+    report = write_report(tallies, multi_select, args.output, args.country or 'India',
+                          args.processes, args.plotly, None if args.no_cache else BuildCache())
+    print(f"Report saved as '{report['path']}' ({report['figures']} figures, {report['bytes']:,} bytes, "
+          f"plotly.js from {report['plotly']})")
+
+
+def run_dashboard(args):
+    from .dashboard import build_dashboard, write_dashboard
+
+    def load():
+        survey = None if args.counts_url else _load(args)
+        return survey, None if survey is None else _weights(args, survey)
+
+    if args.no_cache:
+        survey, weights = load()
+        report = write_dashboard(survey, args.output, plotly=args.plotly, counts_url=args.counts_url,
+                                 weights=weights)
+    else:
+        if args.parquet:
+            from .partitioned import partition_files
+
+            inputs = [*partition_files(args.parquet, args.country), ANSWER_MAPPING_PATH]
+        else:
+            inputs = [args.csv, ANSWER_MAPPING_PATH]
+        report = build_dashboard(load, args.output, inputs=inputs,
+                                 settings={'country': args.country, 'weighted': args.weighted},
+                                 plotly=args.plotly, counts_url=args.counts_url)
+    status = 'saved as' if report['written'] else 'up to date:'
+    print(f"Dashboard {status} '{report['path']}' ({report['bytes']:,} bytes, "
+          f"{report['gzip_bytes']:,} gzipped, budget {report['budget']:,}, plotly.js from {report['plotly']})")
+
+
+def run_bundle(args):
+    from .dashboard import PIE_BUNDLE_PATH, build_pie_bundle
+
+    path = build_pie_bundle(args.checkout, args.output or PIE_BUNDLE_PATH)
+    print(f"Pie-only plotly.js bundle saved as '{path}' ({path.stat().st_size:,} bytes)")
+
+
+def run_partition(args):
+    from .partitioned import write_partitioned
+
+    rows = write_partitioned(args.csv, args.output, args.wave, args.chunksize)
+    print(f"Wrote {rows:,} responses to '{args.output}', partitioned by country"
+          + (f" (wave {args.wave})" if args.wave is not None else ''))
+
+
+def run_serve(args):
+    from .server import serve
+    from .sketches import DEFAULT_CAPACITY
+
+    serve(args.csv, args.country, args.host, args.port, args.approximate, args.chunksize,
+          _or_default(args.capacity, DEFAULT_CAPACITY))
+
+
+def run_sketch(args):
+    from .answers import AnswerMap
+    from .sketches import (ALL, DEFAULT_CAPACITY, DEFAULT_DEPTH, DEFAULT_WIDTH, load_sketches, merge_sketches,
+                           save_sketches, sketch_answers)
+    from .streaming import iter_chunks
+
+    gender = _or_default(args.gender, ALL)
+    capacity = _or_default(args.capacity, DEFAULT_CAPACITY)
+    width, depth = _or_default(args.width, DEFAULT_WIDTH), _or_default(args.depth, DEFAULT_DEPTH)
+    answer_map = AnswerMap.from_csv()
+    sketch_sets = [load_sketches(path) for path in args.load or []]
+    for path in args.exports or ([] if args.load else [args.csv]):
+        chunks = (canonicalize_answers(chunk, answer_map)[0]
+                  for chunk in iter_chunks(path, args.chunksize, args.country))
+        sketch_sets.append(sketch_answers(chunks, [args.question], capacity, width, depth))
+    sketches = merge_sketches(*sketch_sets)
+    if args.save:
+        save_sketches(sketches, args.save)
+        print(f"Sketches saved as '{args.save}'", file=sys.stderr)
+    table = sketches[args.question].counts(gender, args.top, args.view)
+    summary = sketches[args.question].groups[gender]
+    print(f"{summary.total:,} answers, {len(summary.counters)} kept; counts are at most "
+          f"{table.attrs['max_error']:,} above min_count", file=sys.stderr)
+    _write_table(table, args.output)
+
+
+def run_ingest(args):
+    from .ingest import BATCH_ROWS, MAX_DELAY, QUEUE_ROWS, serve_ingest
+
+    stats = serve_ingest(args.output, args.host, args.port, _or_default(args.batch_rows, BATCH_ROWS),
+                         _or_default(args.max_delay, MAX_DELAY), _or_default(args.queue_rows, QUEUE_ROWS))
+    print(f"Wrote {stats['rows_written']:,} rows in {stats['segments']} segments", file=sys.stderr)
+
+
+def run_loadtest(args):
+    from .loadtest import run_ingest_load_test, run_load_test
+
+    if args.ingest:
+        result = run_ingest_load_test(args.url or 'http://127.0.0.1:8001', args.duration, args.concurrency,
+                                      args.rows_per_request)
+        print(f"{result['requests']} submissions, {result['requests_per_second']:.0f} req/s, "
+              f"{result['rows_per_second']:.0f} rows/s, p50 {result['p50_ms']:.2f} ms, "
+              f"p99 {result['p99_ms']:.2f} ms, {result['rejected']} rejected (queue full), "
+              f"{result['errors']} errors; server wrote {result['server']['rows_written']:,} rows "
+              f"in {result['server']['segments']} segments")
+        return
+    result = run_load_test(args.url or 'http://127.0.0.1:8000', args.duration, args.concurrency,
+                           not args.no_revalidate)
+    print(f"{result['requests']} requests, {result['requests_per_second']:.0f} req/s, "
+          f"p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, "
+          f"{result['not_modified']} not modified, {result['errors']} errors")
+
+
+def run_synthetic(args):
+    from .synthetic import write_synthetic
+
+    write_synthetic(args.output, args.rows, args.seed)
+    print(f"Wrote {args.rows:,} synthetic responses to '{args.output}'")
+
+
+def run_benchmark(args):
+    from .benchmark import (BASELINE_PATH, compare, format_results, load_baseline,
+                            run_benchmark, save_baseline)
+
+    baseline = args.baseline or BASELINE_PATH
+    results = run_benchmark(args.sizes, args.seed)
+    print(format_results(results))
+    if args.save_baseline:
+        save_baseline(results, baseline)
+        print(f"Baseline saved as '{baseline}'")
+        return
+    regressions = [row for row in compare(results, load_baseline(baseline), args.tolerance)
+                   if row['regressed']]
+    for row in regressions:
+        print(f"REGRESSION {row['rows']:,} rows {row['stage']} {row['metric']}: "
+              f"{row['baseline']} -> {row['current']} (x{row['ratio']})")
+    if regressions:
+        sys.exit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m genz', description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default=DATA_PATH, help='survey CSV export (default: data/GenZ.csv)')
+    parser.add_argument('--parquet', metavar='DIR',
+                        help="read a dataset written by 'partition' instead of --csv")
+    parser.add_argument('--country', type=_country, default='India',
+                        help="keep one country, or 'all' (default: India)")
+    parser.add_argument('--timings', action='store_true', help='report elapsed time on stderr')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='write per-stage timings and memory to PATH (.trace.json for Chrome tracing)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    tally_parser = commands.add_parser('tally', help='write answer counts and shares (no plotting)')
+    tally_parser.add_argument('--question', action='append', choices=NEW_COLUMNS,
+                              help='question to tally; repeat for several (default: all)')
+    tally_parser.add_argument('--by', nargs='*', default=DIMENSIONS, help='split dimensions')
+    tally_parser.add_argument('--options', action='store_true',
+                              help='count multi-select questions per option')
+    tally_parser.add_argument('--region', choices=['zone', 'subzone', 'district'],
+                              help='split by PIN-code region instead of --by')
+    tally_parser.add_argument('--weighted', action='store_true',
+                              help='rake to Census 2011 gender and postal-zone shares')
+    tally_parser.add_argument('--chunksize', type=int, help='stream the CSV in chunks of this many rows')
+    tally_parser.add_argument('--output', help='.csv or .json file (default: CSV on stdout)')
+    tally_parser.set_defaults(run=run_tally)
+
+    aggregates_parser = commands.add_parser(
+        'aggregates', help='update saved answer counts with the responses added since the last run')
+    aggregates_parser.add_argument('--segments', metavar='DIR',
+                                   help="also count segments written by 'ingest' (e.g. data/segments)")
+    aggregates_parser.add_argument('--options', action='store_true',
+                                   help='count multi-select questions per option')
+    aggregates_parser.add_argument('--check', action='store_true',
+                                   help='compare the counts with a full recount and fail on any difference')
+    aggregates_parser.add_argument('--output', help='.csv or .json file (default: CSV on stdout)')
+    aggregates_parser.set_defaults(run=run_aggregates)
+
+    shards_parser = commands.add_parser(
+        'shards', help='tally many CSV exports in parallel worker processes and merge the counts')
+    shards_parser.add_argument('exports', nargs='+', help='CSV exports with the columns of data/GenZ.csv')
+    shards_parser.add_argument('--processes', type=int, help='worker processes (default: one per core, 1 = no pool)')
+    shards_parser.add_argument('--options', action='store_true',
+                               help='count multi-select questions per option')
+    shards_parser.add_argument('--check', action='store_true',
+                               help='compare the merged counts with a single-process recount')
+    shards_parser.add_argument('--output', help='.csv or .json file (default: CSV on stdout)')
+    shards_parser.set_defaults(run=run_shards)
+
+    validate_parser = commands.add_parser(
+        'validate', help='list the rows that fail the data-quality checks, with their reasons')
+    validate_parser.add_argument('--output', help='.csv or .json file (default: CSV on stdout)')
+    validate_parser.set_defaults(run=run_validate)
+
+    associations_parser = commands.add_parser(
+        'associations', help='chi-square and Cramér\'s V for every question pair, strongest first')
+    associations_parser.add_argument('--output', help='.csv or .json file (default: CSV on stdout)')
+    associations_parser.add_argument('--keep-sparse', action='store_true',
+                                     help='keep tables with over 20%% of expected counts below 5')
+    associations_parser.set_defaults(run=run_associations)
+
+    report_parser = commands.add_parser('report', help='write every figure into one HTML report')
+    report_parser.add_argument('--output', default='report.html')
+    report_parser.add_argument('--processes', type=int, help='worker processes (1 = no pool)')
+    report_parser.add_argument('--plotly', choices=['cdn', 'inline'], default='cdn', help=PLOTLY_HELP)
+    report_parser.add_argument('--no-cache', action='store_true', help='rebuild every figure')
+    report_parser.set_defaults(run=run_report)
+
+    dashboard_parser = commands.add_parser('dashboard', help='write the interactive dashboard')
+    dashboard_parser.add_argument('--output', default='survey_dashboard.html')
+    dashboard_parser.add_argument('--plotly', choices=['cdn', 'inline'], default='cdn', help=PLOTLY_HELP)
+    dashboard_parser.add_argument('--weighted', action='store_true',
+                                  help='chart counts raked to Census 2011 gender and postal-zone shares')
+    dashboard_parser.add_argument('--counts-url', help='fetch counts from a genz server, e.g. http://127.0.0.1:8000/counts')
+    dashboard_parser.add_argument('--no-cache', action='store_true',
+                                  help='rebuild and rewrite the page even if no input changed')
+    dashboard_parser.set_defaults(run=run_dashboard)
+
+    bundle_parser = commands.add_parser('bundle', help="build the pie-only plotly.js bundle for --plotly inline")
+    bundle_parser.add_argument('--checkout', help='plotly.js source tree (default: clone the matching release)')
+    bundle_parser.add_argument('--output', help='default: assets/plotly-pie.min.js')
+    bundle_parser.set_defaults(run=run_bundle)
+
+    partition_parser = commands.add_parser('partition', help='convert the CSV to Parquet partitioned by country')
+    partition_parser.add_argument('--output', default=PARQUET_DIR)
+    partition_parser.add_argument('--wave', help='survey wave label, written as a second partition level')
+    partition_parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                                  help='rows converted at a time')
+    partition_parser.set_defaults(run=run_partition)
+
+    serve_parser = commands.add_parser('serve', help='serve /counts for the dashboard over HTTP')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--approximate', action='store_true',
+                              help='stream the CSV into bounded-memory sketches (multi-select answers per combination)')
+    serve_parser.add_argument('--chunksize', type=int, help='rows streamed at a time with --approximate')
+    serve_parser.add_argument('--capacity', type=int,
+                              help='heavy-hitter counters per question and gender with --approximate (default: 1024)')
+    serve_parser.set_defaults(run=run_serve)
+
+    sketch_parser = commands.add_parser(
+        'sketch', help='approximate top/bottom answers of a high-cardinality question in bounded memory')
+    sketch_parser.add_argument('exports', nargs='*', help='CSV exports to stream (default: --csv)')
+    sketch_parser.add_argument('--question', choices=NEW_COLUMNS, default='asp_job')
+    sketch_parser.add_argument('--gender', help="one gender, or 'All' (default)")
+    sketch_parser.add_argument('--top', type=int, default=10, help='answers to list')
+    sketch_parser.add_argument('--view', choices=['top', 'bottom'], default='top')
+    sketch_parser.add_argument('--capacity', type=int, help='heavy-hitter counters per gender (default: 1024)')
+    sketch_parser.add_argument('--width', type=int, help='Count-Min counters per row (default: 4096)')
+    sketch_parser.add_argument('--depth', type=int, help='Count-Min rows (default: 5)')
+    sketch_parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='rows streamed at a time')
+    sketch_parser.add_argument('--load', action='append', metavar='PATH',
+                               help='merge sketches saved earlier (other files or time windows); repeatable')
+    sketch_parser.add_argument('--save', metavar='PATH', help='save the merged sketches as JSON')
+    sketch_parser.add_argument('--output', help='.csv or .json file (default: CSV on stdout)')
+    sketch_parser.set_defaults(run=run_sketch)
+
+    ingest_parser = commands.add_parser('ingest', help='accept live submissions over HTTP into columnar segments')
+    ingest_parser.add_argument('--output', default=SEGMENTS_DIR, help='segment directory (default: data/segments)')
+    ingest_parser.add_argument('--host', default='127.0.0.1')
+    ingest_parser.add_argument('--port', type=int, default=8001)
+    ingest_parser.add_argument('--batch-rows', type=int, help='rows per segment at most (default: 5000)')
+    ingest_parser.add_argument('--max-delay', type=float,
+                               help='seconds a partial batch waits before it is written (default: 0.2)')
+    ingest_parser.add_argument('--queue-rows', type=int,
+                               help='queued rows before submissions wait (back-pressure, default: 50000)')
+    ingest_parser.set_defaults(run=run_ingest)
+
+    loadtest_parser = commands.add_parser('loadtest', help='measure req/s and p99 latency of a running server')
+    loadtest_parser.add_argument('--url', help='server to test (default: http://127.0.0.1:8000, or :8001 with --ingest)')
+    loadtest_parser.add_argument('--duration', type=float, default=5.0, help='seconds')
+    loadtest_parser.add_argument('--concurrency', type=int, default=8)
+    loadtest_parser.add_argument('--no-revalidate', action='store_true', help='never send If-None-Match')
+    loadtest_parser.add_argument('--ingest', action='store_true', help='post submissions to a genz ingest endpoint')
+    loadtest_parser.add_argument('--rows-per-request', type=int, default=1,
+                                 help='submissions per POST with --ingest (default: 1)')
+    loadtest_parser.set_defaults(run=run_loadtest)
+
+    synthetic_parser = commands.add_parser('synthetic', help='write synthetic responses with the original headers')
+    synthetic_parser.add_argument('--rows', type=int, default=10_000)
+    synthetic_parser.add_argument('--seed', type=int, default=0)
+    synthetic_parser.add_argument('--output', default='synthetic.csv')
+    synthetic_parser.set_defaults(run=run_synthetic)
+
+    benchmark_parser = commands.add_parser('benchmark', help='time each pipeline stage on synthetic data')
+    benchmark_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000],
+                                  help='row counts, e.g. 10000 1000000 10000000')
+    benchmark_parser.add_argument('--seed', type=int, default=0)
+    benchmark_parser.add_argument('--baseline', help='baseline JSON (default: benchmarks/baseline.json)')
+    benchmark_parser.add_argument('--save-baseline', action='store_true',
+                                  help='store this run as the baseline instead of comparing')
+    benchmark_parser.add_argument('--tolerance', type=float, default=0.25,
+                                  help='allowed slowdown or growth before flagging (default: 0.25)')
+    benchmark_parser.set_defaults(run=run_benchmark)
+    return parser
+
+
+def main(argv=None):
+    start = time.perf_counter()
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        profiling.enable(args.profile)
+    args.run(args)
+    if args.profile:
+        print(f"Stage profile saved as '{profiling.write_profile()}'", file=sys.stderr)
+    if args.timings:
+        # process_time() also covers interpreter start-up and imports
+        print(f"{args.command}: {time.perf_counter() - start:.3f}s wall, "
+              f"{time.process_time():.3f}s CPU since start, "
+              f"plotly imported: {'plotly' in sys.modules}", file=sys.stderr)
+    return 0
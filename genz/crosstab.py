@@ -0,0 +1,238 @@
+"""All-pairs contingency tables and chi-square tests of independence.
+
+Every question column is encoded once to integer codes; each pair's table
+is one ``np.bincount`` over the combined codes, written into a single
+flattened array, and the chi-square statistic, Cramér's V and p-value of
+every table are computed in bulk from that array.
+
+Multi-select questions are tested per option: each option becomes a
+selected / not selected indicator built from the ``multiselect`` bitsets,
+named ``question[option]``, instead of one column per raw answer
+combination. Tables too sparse for the chi-square approximation are left
+out of ``association_table``.
+"""
+
+import itertools
+import math
+
+import numpy as np
+import pandas as pd
+
+from .multiselect import MultiSelectIndex
+from .schema import MULTI_SELECT_OPTIONS, QUESTIONS
+from .tally import column_codes
+
+# Cochran's rule of thumb for the chi-square approximation: expected counts
+# of at least 5 in all but 20% of the cells
+MIN_EXPECTED = 5
+MAX_LOW_EXPECTED = 0.2
+
+# Labels of a multi-select option indicator, by code
+INDICATOR_LABELS = np.array(['not selected', 'selected'], dtype=object)
+
+ASSOCIATION_COLUMNS = ['question_a', 'question_b', 'n', 'rows', 'cols', 'chi2', 'dof',
+                       'p_value', 'cramers_v', 'low_expected']
+
+
+def option_column(question, option):
+    """Name of the indicator of one multi-select option, e.g. ``'asp_job[Work alone]'``."""
+    return f'{question}[{option}]'
+
+
+def _indicators(questions):
+    # {indicator name: (question, bit)} and the columns to test, multi-select ones expanded
+    indicators, columns = {}, []
+    for question in questions:
+        if question in MULTI_SELECT_OPTIONS:
+            for bit, option in enumerate(MULTI_SELECT_OPTIONS[question]):
+                indicators[option_column(question, option)] = question, bit
+                columns.append(option_column(question, option))
+        else:
+            columns.append(question)
+    return indicators, columns
+
+
+def question_pairs(questions=None, against=('gender',)):
+    """Every pair of ``questions`` followed by each question against ``against``.
+
+    Multi-select questions are replaced by one indicator per option; options
+    of the same question are not paired with each other.
+    """
+    indicators, columns = _indicators(QUESTIONS if questions is None else questions)
+    source = {column: indicators.get(column, (column,))[0] for column in columns}
+    pairs = [(a, b) for a, b in itertools.combinations(columns, 2) if source[a] != source[b]]
+    pairs += [(column, dim) for dim in against for column in columns if source[column] != dim]
+    return pairs
+
+
+class _PairCounts:
+    # Flattened counts of every pair table, missing answers in row/column 0
+
+    def __init__(self, df, pairs):
+        columns = list(dict.fromkeys(column for pair in pairs for column in pair))
+        position = {column: i for i, column in enumerate(columns)}
+        indicators, _ = _indicators(MULTI_SELECT_OPTIONS)
+        indexes = {}
+        encoded = [self._encode(df, column, indicators, indexes) for column in columns]
+        self.pairs = pairs
+        self.labels = {column: labels for column, (_, labels) in zip(columns, encoded)}
+
+        # One contiguous row of codes per column, shifted by one so missing
+        # (-1) gets its own slot instead of a mask
+        codes = np.stack([values + 1 for values, _ in encoded]).astype(np.intp)
+        sizes = np.array([len(labels) + 1 for _, labels in encoded], dtype=np.intp)
+        first = np.array([position[a] for a, _ in pairs], dtype=np.intp)
+        second = np.array([position[b] for _, b in pairs], dtype=np.intp)
+        self.shapes = np.column_stack([sizes[first], sizes[second]])
+        self.offsets = np.concatenate([[0], np.cumsum(self.shapes.prod(axis=1))])
+
+        # A bincount per pair keeps each count array small enough to stay in
+        # cache, which beats one bincount over the stacked keys of all pairs
+        self.counts = np.empty(self.offsets[-1], dtype=np.int64)
+        for i, (a, b) in enumerate(zip(first, second)):
+            keys = codes[a] * self.shapes[i, 1] + codes[b]
+            self.counts[self.offsets[i]:self.offsets[i + 1]] = np.bincount(
+                keys, minlength=self.offsets[i + 1] - self.offsets[i])
+
+    @staticmethod
+    def _encode(df, column, indicators, indexes):
+        # Codes of a question, or 0/1 of an option indicator (-1 where the question is unanswered)
+        if column not in indicators:
+            return column_codes(df, column)
+        question, bit = indicators[column]
+        if question not in indexes:
+            indexes[question] = (MultiSelectIndex.build(df, question), column_codes(df, question)[0] < 0)
+        index, missing = indexes[question]
+        codes = ((index.bits >> bit) & 1).astype(np.intp)
+        codes[missing] = -1
+        return codes, INDICATOR_LABELS
+
+    def observed(self, i):
+        # Table i without the missing row and column
+        rows, cols = self.shapes[i]
+        return self.counts[self.offsets[i]:self.offsets[i + 1]].reshape(rows, cols)[1:, 1:]
+
+
+def contingency_tables(df, pairs=None):
+    """``{(question_a, question_b): DataFrame}`` of answer counts for every pair.
+
+    ``df`` is a renamed DataFrame or an ``EncodedSurvey``; rows missing
+    either answer are left out of that pair's table.
+    """
+    counts = _PairCounts(df, question_pairs() if pairs is None else pairs)
+    return {
+        (a, b): pd.DataFrame(counts.observed(i), index=pd.Index(counts.labels[a], name=a),
+                             columns=pd.Index(counts.labels[b], name=b))
+        for i, (a, b) in enumerate(counts.pairs)
+    }
+
+
+def _chi2_sf(x, dof):
+    # Upper tail of the chi-square distribution, Q(dof/2, x/2)
+    try:
+        from scipy.stats import chi2
+    except ImportError:
+        return np.array([_gammaincc(k / 2, value / 2) for value, k in zip(x, dof)])
+    return chi2.sf(x, dof)
+
+
+def _gammaincc(a, x):
+    # Regularized upper incomplete gamma: series below a + 1, continued fraction above
+    if a <= 0 or np.isnan(x):
+        return np.nan
+    if x <= 0:
+        return 1.0
+    log_prefactor = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1 - total * math.exp(log_prefactor))
+    # Modified Lentz evaluation of the continued fraction
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(log_prefactor) * h
+
+
+def _independence_tests(counts):
+    """Chi-square, Cramér's V and p-value of every table in a ``_PairCounts``.
+
+    Answers nobody gave (empty rows or columns) do not count towards the
+    degrees of freedom. ``low_expected`` is the share of cells with an
+    expected count below ``MIN_EXPECTED``.
+    """
+    n_tables = len(counts.pairs)
+    # Per-cell table, row and column ids over the flattened counts,
+    # restricted to the non-missing part of each table
+    table_id = np.repeat(np.arange(n_tables), np.diff(counts.offsets))
+    local = np.arange(len(counts.counts)) - counts.offsets[table_id]
+    n_cols = counts.shapes[table_id, 1]
+    row, col = local // n_cols, local % n_cols
+    keep = (row > 0) & (col > 0)
+    table_id, observed = table_id[keep], counts.counts[keep].astype(float)
+    row_offsets = np.concatenate([[0], np.cumsum(counts.shapes[:, 0])])
+    col_offsets = np.concatenate([[0], np.cumsum(counts.shapes[:, 1])])
+    row_id = row_offsets[table_id] + row[keep]
+    col_id = col_offsets[table_id] + col[keep]
+
+    row_totals = np.bincount(row_id, weights=observed, minlength=row_offsets[-1])
+    col_totals = np.bincount(col_id, weights=observed, minlength=col_offsets[-1])
+    n = np.bincount(table_id, weights=observed, minlength=n_tables)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = row_totals[row_id] * col_totals[col_id] / n[table_id]
+        contribution = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.0)
+    chi2 = np.bincount(table_id, weights=contribution, minlength=n_tables)
+
+    # Non-empty rows and columns of each table
+    rows = np.bincount(np.repeat(np.arange(n_tables), counts.shapes[:, 0]),
+                       weights=row_totals > 0, minlength=n_tables).astype(int)
+    cols = np.bincount(np.repeat(np.arange(n_tables), counts.shapes[:, 1]),
+                       weights=col_totals > 0, minlength=n_tables).astype(int)
+    dof = (rows - 1) * (cols - 1)
+    live = (expected > 0).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        low_expected = (np.bincount(table_id, weights=live * (expected < MIN_EXPECTED), minlength=n_tables)
+                        / np.bincount(table_id, weights=live, minlength=n_tables))
+        cramers_v = np.sqrt(chi2 / (n * (np.minimum(rows, cols) - 1)))
+        p_value = np.where(dof > 0, _chi2_sf(chi2, np.maximum(dof, 1)), np.nan)
+
+    return pd.DataFrame({
+        'question_a': [a for a, _ in counts.pairs],
+        'question_b': [b for _, b in counts.pairs],
+        'n': n.astype(np.int64), 'rows': rows, 'cols': cols,
+        'chi2': chi2, 'dof': dof, 'p_value': p_value,
+        'cramers_v': np.where(dof > 0, cramers_v, np.nan),
+        'low_expected': low_expected,
+    }, columns=ASSOCIATION_COLUMNS)
+
+
+def association_table(df, pairs=None, max_low_expected=MAX_LOW_EXPECTED):
+    """Independence tests for every pair, strongest association (Cramér's V) first.
+
+    Tables with more than ``max_low_expected`` of their cells expected below
+    ``MIN_EXPECTED`` are left out; ``max_low_expected=None`` keeps them all.
+    """
+    counts = _PairCounts(df, question_pairs() if pairs is None else pairs)
+    table = _independence_tests(counts)
+    if max_low_expected is not None:
+        table = table[table['low_expected'] <= max_low_expected]
+    return table.sort_values('cramers_v', ascending=False, kind='stable',
+                             na_position='last').reset_index(drop=True)
@@ -0,0 +1,480 @@
+"""HTML survey dashboard generator.
+
+The page embeds a compact cube of answer counts keyed by question and
+filter dimensions (gender by default) rather than the raw response rows, so
+its size and parse time depend on the number of answer categories, not on
+the number of respondents.
+
+With a ``genz.cache.BuildCache`` builds are incremental: each question's
+cube entry is keyed by the content of its column, so only changed
+questions are re-tallied, an unchanged page is not rewritten, and
+``build_dashboard`` skips loading the survey at all when no input changed.
+"""
+
+import gzip
+import json
+import shutil
+import subprocess
+import tempfile
+import warnings
+from importlib import metadata
+from pathlib import Path
+
+import pandas as pd
+
+from .cache import CACHE_FORMAT, BuildCache, array_digest, code_digest, column_digest, digest, file_digest
+from .multiselect import option_tally
+from .profiling import profiled
+from .schema import MULTI_SELECT_OPTIONS, QUESTIONS, ROOT
+from .tally import tally
+
+# Filter dimensions available in the dashboard
+CUBE_DIMENSIONS = ['gender']
+
+# Separator of dimension values in cube cell keys
+CELL_KEY_SEPARATOR = '|'
+
+# Where plotly.js comes from: 'cdn' links the hosted bundle, 'inline' embeds
+# a local bundle so the page works without network access.
+PLOTLY_CDN_URL = 'https://cdn.plot.ly/plotly-latest.min.js'
+
+# Pie-only custom plotly.js bundle written by ``build_pie_bundle``
+# (``python -m genz bundle``); 'inline' needs it
+PIE_BUNDLE_PATH = ROOT / 'assets' / 'plotly-pie.min.js'
+PLOTLY_JS_REPO = 'https://github.com/plotly/plotly.js.git'
+
+# Size budget for the generated HTML, in bytes
+HTML_SIZE_BUDGET = 1_500_000
+
+# HTML content with styled title, single pie chart, and legend below
+DASHBOARD_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Survey Dashboard</title>
+    {plotly_script}
+    <style>
+        body {{
+            font-family: Arial, sans-serif;
+            margin: 0;
+            padding: 20px;
+            background-color: #f4f4f9;
+        }}
+        .container {{
+            max-width: 1200px;
+            margin: auto;
+            background: white;
+            padding: 20px;
+            border-radius: 10px;
+            box-shadow: 0 0 10px rgba(0,0,0,0.1);
+        }}
+        .controls {{
+            display: flex;
+            justify-content: space-between;
+            margin-bottom: 20px;
+            gap: 20px;
+        }}
+        select {{
+            padding: 8px;
+            font-size: 14px;
+            border-radius: 5px;
+            border: 1px solid #ccc;
+        }}
+        .chart-container {{
+            display: flex;
+            justify-content: center;
+            margin-bottom: 20px;
+        }}
+        .chart {{
+            width: 60%;
+        }}
+        .tabs {{
+            margin-bottom: 20px;
+        }}
+        .tab {{
+            padding: 10px 20px;
+            cursor: pointer;
+            display: inline-block;
+            background: #ddd;
+            border-radius: 5px 5px 0 0;
+        }}
+        .tab.active {{
+            background: #007bff;
+            color: white;
+        }}
+        @keyframes fadeIn {{
+            from {{ opacity: 0; transform: translateY(-10px); }}
+            to {{ opacity: 1; transform: translateY(0); }}
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div style="background: linear-gradient(90deg, #00B8D9, #00ACC1); padding: 40px 20px; border-radius: 15px; text-align: center; animation: fadeIn 2s ease-in-out;">
+            <h1 style="color: white; font-size: 48px; margin-bottom: 10px;">Career Preferences Report: Gen Z Edition</h1>
+            <h3 style="color: #ECEFF1; font-weight: normal; font-size: 20px;">
+                Insights into Aspirations, Motivations, Industry Choices, and Challenges Shaping the Future of Work
+            </h3>
+        </div>
+        <div class="tabs">
+            <span class="tab active" onclick="setView('top'); updateChart();">Top Responses</span>
+            <span class="tab" onclick="setView('bottom'); updateChart();">Bottom Responses</span>
+        </div>
+        <div class="controls">
+            <div>
+                <label for="question">Select Question:</label>
+                <select id="question" onchange="updateChart()">
+                    {question_options}
+                </select>
+            </div>
+            <div>
+                <label for="gender">Gender Filter:</label>
+                <select id="gender" onchange="updateChart()">
+                    <option value="All">All</option>
+                    <option value="Male">Men</option>
+                    <option value="Female">Women</option>
+                </select>
+            </div>
+            <div>
+                <label for="nResponses">Top/Bottom N:</label>
+                <select id="nResponses" onchange="updateChart()">
+                    <option value="3" selected>3</option>
+                    <option value="5">5</option>
+                </select>
+            </div>
+        </div>
+        <div class="chart-container">
+            <div id="chart" class="chart"></div>
+        </div>
+    </div>
+
+    <script>
+        // Either the embedded answer cube, or the URL of a genz.server /counts endpoint
+        const cube = {cube_json};
+        const countsUrl = {counts_url};
+        let currentView = 'top';
+        let latestRequest = 0;
+
+        // Populate question dropdown
+        const questionOptions = `{question_options}`.replace(/<option value="/g, '<option value=\\"').replace(/">/g, '\\">');
+        document.getElementById('question').innerHTML = questionOptions;
+
+        // Function to set the active tab
+        function setView(view) {{
+            currentView = view;
+            const tabs = document.querySelectorAll('.tab');
+            tabs.forEach(tab => {{
+                tab.classList.remove('active');
+                if (tab.textContent === (view === 'top' ? 'Top Responses' : 'Bottom Responses')) {{
+                    tab.classList.add('active');
+                }}
+            }});
+        }}
+
+        // Sum the precomputed cube cells that match the selected filters
+        function answerCounts(question, filters) {{
+            const entry = cube.questions[question];
+            const counts = new Array(entry.labels.length).fill(0);
+            Object.entries(entry.cells).forEach(([key, values]) => {{
+                const parts = key.split('|');
+                const keep = cube.dimensions.every((dim, i) =>
+                    !(dim in filters) || filters[dim] === 'All' || filters[dim] === parts[i]);
+                if (keep) {{
+                    values.forEach((value, i) => {{ counts[i] += value; }});
+                }}
+            }});
+            return entry.labels
+                .map((name, i) => ({{name: name, count: counts[i]}}))
+                .filter(d => d.count > 0);
+        }}
+
+        // Counts sorted most frequent first, memoized per (question, gender)
+        const sortedCountsCache = {{}};
+        function sortedCounts(question, gender) {{
+            const key = question + '|' + gender;
+            if (!(key in sortedCountsCache)) {{
+                sortedCountsCache[key] = answerCounts(question, {{gender: gender}})
+                    .sort((a, b) => b.count - a.count);
+            }}
+            return sortedCountsCache[key];
+        }}
+
+        // Top N or bottom N (least frequent first) answers for the selection
+        async function selectCounts(question, gender, n, view) {{
+            if (countsUrl) {{
+                const params = new URLSearchParams({{question: question, gender: gender, top: n, view: view}});
+                const response = await fetch(countsUrl + '?' + params);
+                const body = await response.json();
+                return body.labels.map((name, i) => ({{name: name, count: body.values[i]}}));
+            }}
+            const counts = sortedCounts(question, gender);
+            return view === 'top' ? counts.slice(0, n) : counts.slice(-n).reverse();
+        }}
+
+        async function updateChart() {{
+            const question = document.getElementById('question').value;
+            const gender = document.getElementById('gender').value;
+            const n = parseInt(document.getElementById('nResponses').value);
+
+            // Ignore responses that arrive after a newer selection
+            const request = ++latestRequest;
+            const data = await selectCounts(question, gender, n, currentView);
+            if (request !== latestRequest) {{
+                return;
+            }}
+
+            const chartData = [{{
+                type: 'pie',
+                labels: data.map(d => d.name),
+                values: data.map(d => d.count),
+                textinfo: 'percent',
+                textposition: 'inside'
+            }}];
+
+            const layout = {{
+                title: currentView === 'top' ? 'Top ' + n + ' Responses' : 'Bottom ' + n + ' Responses',
+                legend: {{x: 0.5, y: -0.1, xanchor: 'center', yanchor: 'top', orientation: 'h'}},
+                margin: {{t: 50, b: 100, l: 50, r: 50}}
+            }};
+
+            // Update the existing chart in place instead of rebuilding it
+            Plotly.react('chart', chartData, layout);
+        }}
+
+        // Initial chart render
+        updateChart();
+    </script>
+</body>
+</html>
+"""
+
+
+def _cell_key(values):
+    values = values if isinstance(values, tuple) else (values,)
+    return CELL_KEY_SEPARATOR.join(str(value) for value in values)
+
+
+def _cube_entries(df, questions, by, weights):
+    # {question: {'labels': [...], 'cells': {...}}} for the given questions
+    single = [question for question in questions if question not in MULTI_SELECT_OPTIONS]
+    multi = [question for question in questions if question in MULTI_SELECT_OPTIONS]
+    table = pd.concat([tally(df, single, by, weights), option_tally(df, multi, by, weights)],
+                      ignore_index=True)
+    return _pivot_entries(table, questions, by, weighted=weights is not None)
+
+
+def _pivot_entries(table, questions, by, weighted):
+    # Cube entries from a tally-layout table; dimensions not in ``by`` are summed over
+    entries = {}
+    for question in questions:
+        rows = table[table['question'] == question]
+        counts = rows.pivot_table(index='answer', columns=by, values='count',
+                                  aggfunc='sum', fill_value=0, sort=False)
+        counts = counts.loc[counts.sum(axis=1).sort_values(ascending=False, kind='stable').index]
+        counts = counts.round(2) if weighted else counts.astype(int)
+        entries[question] = {
+            'labels': [str(label) for label in counts.index],
+            'cells': {_cell_key(key): counts[key].tolist() for key in counts.columns},
+        }
+    return entries
+
+
+@profiled('build_cube')
+def build_cube(df, questions=QUESTIONS, by=CUBE_DIMENSIONS, weights=None, cache=None):
+    """Answer counts per question for every combination of the ``by`` dimensions.
+
+    Single-choice questions are counted per answer and multi-select questions
+    per option. The result is JSON-ready::
+
+        {'dimensions': ['gender'],
+         'questions': {question: {'labels': [...],
+                                  'cells': {'Male': [...], 'Female': [...]}}}}
+
+    where each cell list is aligned with ``labels``, most frequent label first.
+    With per-row ``weights`` the cells hold weighted counts (two decimals).
+    With a ``BuildCache`` only questions whose column (or the ``by``
+    columns and weights) changed since a previous build are tallied.
+    """
+    by = list(by)
+    if cache is None:
+        return {'dimensions': by, 'questions': _cube_entries(df, list(questions), by, weights)}
+
+    shared = digest(CACHE_FORMAT, code_digest(), by, [column_digest(df, dim) for dim in by],
+                    array_digest(weights))
+    keys = {question: digest(shared, question, column_digest(df, question)) for question in questions}
+    entries = {question: cache.get('cube', key) for question, key in keys.items()}
+    stale = [question for question, entry in entries.items() if entry is None]
+    if stale:
+        for question, entry in _cube_entries(df, stale, by, weights).items():
+            entries[question] = cache.put('cube', keys[question], entry)
+    return {'dimensions': by, 'questions': {question: entries[question] for question in questions}}
+
+
+def cube_from_table(table, questions=QUESTIONS, by=CUBE_DIMENSIONS):
+    """``build_cube`` result from an already counted ``tally``-layout table.
+
+    Multi-select questions must be counted per option, as in
+    ``AggregateState.table(country, options=True)``; dimensions other than
+    ``by`` are summed over.
+    """
+    by = list(by)
+    weighted = table['count'].dtype.kind == 'f'
+    return {'dimensions': by, 'questions': _pivot_entries(table, list(questions), by, weighted)}
+
+
+def plotly_script(plotly='cdn', bundle_path=PIE_BUNDLE_PATH):
+    """``(script tag, source description)`` that loads plotly.js.
+
+    ``plotly='inline'`` embeds the bundle at ``bundle_path``; when it has
+    not been built (see ``build_pie_bundle``) the full bundle of the plotly
+    package is embedded instead, with a warning.
+    """
+    if plotly == 'cdn':
+        return f'<script src="{PLOTLY_CDN_URL}"></script>', PLOTLY_CDN_URL
+    if plotly != 'inline':
+        raise ValueError(f"plotly must be 'cdn' or 'inline', got {plotly!r}")
+    if bundle_path is not None and Path(bundle_path).exists():
+        plotly_js, source = Path(bundle_path).read_text(encoding='utf-8'), str(bundle_path)
+    else:
+        from plotly.offline import get_plotlyjs
+
+        if bundle_path is not None:
+            warnings.warn(f"{bundle_path} not found, embedding the full plotly.js bundle instead: "
+                          f"build it with `python -m genz bundle`")
+        plotly_js, source = get_plotlyjs(), 'plotly package (full bundle)'
+    # Keep the minified bundle byte-for-byte, apart from closing-tag escapes
+    return '<script>' + plotly_js.replace('</script', '<\\/script') + '</script>', source
+
+
+def build_pie_bundle(checkout=None, path=PIE_BUNDLE_PATH):
+    """Build the pie-only plotly.js bundle with npm and copy it to ``path``.
+
+    ``checkout`` is a plotly.js source tree; without one, the release
+    matching the plotly Python package is cloned into a temporary directory.
+    Needs git, node and npm.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        if checkout is None:
+            from plotly.offline import get_plotlyjs_version
+
+            checkout = Path(scratch) / 'plotly.js'
+            subprocess.run(['git', 'clone', '--depth', '1', '--branch', f'v{get_plotlyjs_version()}',
+                            PLOTLY_JS_REPO, str(checkout)], check=True)
+        subprocess.run(['npm', 'ci'], cwd=checkout, check=True)
+        subprocess.run(['npm', 'run', 'custom-bundle', '--', '--out', 'pie', '--traces', 'pie'],
+                       cwd=checkout, check=True)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(Path(checkout) / 'dist' / 'plotly-pie.min.js', path)
+    return Path(path)
+
+
+def size_report(html_content, budget=HTML_SIZE_BUDGET):
+    """Raw and gzip size of the page checked against ``budget`` (raw bytes)."""
+    raw = html_content.encode('utf-8')
+    return {
+        'bytes': len(raw),
+        'gzip_bytes': len(gzip.compress(raw, mtime=0)),
+        'budget': budget,
+        'within_budget': budget is None or len(raw) <= budget,
+    }
+
+
+def _script_json(value):
+    # Compact JSON; '</' is escaped so labels cannot close the script tag
+    return json.dumps(value, separators=(',', ':')).replace('</', '<\\/')
+
+
+def _fill_template(df, questions, by, script, counts_url=None, weights=None, cache=None, cube=None):
+    # Generate question options for dropdown
+    question_options = ''.join([f'<option value="{key}">{value}</option>' for key, value in questions.items()])
+
+    # Served dashboards fetch counts, so they embed no cube at all
+    if counts_url:
+        cube = None
+    elif cube is None:
+        cube = build_cube(df, questions, by, weights, cache)
+
+    return DASHBOARD_TEMPLATE.format(
+        plotly_script=script,
+        question_options=question_options,
+        cube_json=_script_json(cube),
+        counts_url=_script_json(counts_url)
+    )
+
+
+@profiled('render_dashboard')
+def render_dashboard(df, questions=QUESTIONS, by=CUBE_DIMENSIONS, plotly='cdn',
+                     bundle_path=PIE_BUNDLE_PATH, counts_url=None, weights=None):
+    """Dashboard HTML for a renamed (and filtered) survey frame.
+
+    With ``counts_url`` (e.g. ``'http://127.0.0.1:8000/counts'``) the page
+    fetches counts from a running ``genz.server`` instead of embedding them;
+    ``df`` may then be ``None``. Per-row ``weights`` chart weighted counts.
+    """
+    return _fill_template(df, questions, by, plotly_script(plotly, bundle_path)[0], counts_url, weights)
+
+
+@profiled('write_dashboard')
+def write_dashboard(df, path='survey_dashboard.html', questions=QUESTIONS, by=CUBE_DIMENSIONS,
+                    plotly='cdn', bundle_path=PIE_BUNDLE_PATH, size_budget=HTML_SIZE_BUDGET,
+                    counts_url=None, weights=None, cache=None, cube=None):
+    """Render the dashboard, write it to ``path`` and return its size report.
+
+    ``plotly='inline'`` builds a self-contained page for offline kiosks;
+    ``counts_url`` builds one that queries a ``genz.server``, and per-row
+    ``weights`` chart weighted counts. A prebuilt ``cube`` (see
+    ``cube_from_table``) is embedded as is and ``df`` may be ``None``.
+    The report warns when the page exceeds ``size_budget``. With a
+    ``BuildCache`` unchanged questions are not re-tallied and an identical
+    page is left untouched (``written`` is ``False``).
+    """
+    script, source = plotly_script(plotly, bundle_path)
+    html_content = _fill_template(df, questions, by, script, counts_url, weights, cache, cube)
+    written = cache is None or not Path(path).exists() or Path(path).read_text(encoding='utf-8') != html_content
+    if written:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+
+    report = {'path': str(path), 'plotly': source, 'written': written,
+              **size_report(html_content, size_budget)}
+    if not report['within_budget']:
+        warnings.warn(f"{path} is {report['bytes']:,} bytes, over the {size_budget:,} byte budget")
+    return report
+
+
+def _plotly_digest(plotly, bundle_path):
+    # What the page's plotly.js comes from, without importing plotly
+    if plotly != 'inline':
+        return plotly
+    if bundle_path is None or not Path(bundle_path).exists():
+        return metadata.version('plotly')
+    return file_digest(bundle_path)
+
+
+@profiled('build_dashboard')
+def build_dashboard(load, path='survey_dashboard.html', inputs=(), settings=None, questions=QUESTIONS,
+                    by=CUBE_DIMENSIONS, plotly='cdn', bundle_path=PIE_BUNDLE_PATH,
+                    size_budget=HTML_SIZE_BUDGET, counts_url=None, cache=None):
+    """``write_dashboard`` that does nothing when none of its inputs changed.
+
+    ``inputs`` are the files the survey is read from and ``settings`` any
+    JSON-ready options that shape it (country, weighting). Hashed together
+    with the questions, plotly source and ``genz`` code, they key the page.
+    Only when that key or the file at ``path`` changed is ``load()`` called
+    for ``(survey, weights)`` and the page rebuilt, re-tallying only the
+    questions whose data changed. ``rebuilt`` in the report tells which.
+    """
+    cache = BuildCache() if cache is None else cache
+    key = digest(CACHE_FORMAT, code_digest(), [file_digest(input_path) for input_path in inputs], settings,
+                 questions, list(by), _plotly_digest(plotly, bundle_path), size_budget, counts_url)
+    page = cache.get('pages', key)
+    if page is not None and file_digest(path) == page['sha1']:
+        return {**page['report'], 'path': str(path), 'written': False, 'rebuilt': False}
+
+    survey, weights = load()
+    report = write_dashboard(survey, path, questions, by, plotly, bundle_path, size_budget,
+                             counts_url, weights, cache)
+    cache.put('pages', key, {'sha1': file_digest(path), 'report': report})
+    return {**report, 'rebuilt': True}
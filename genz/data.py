@@ -0,0 +1,34 @@
+"""Loading, renaming and filtering of the raw survey export."""
+
+import pandas as pd
+
+from .profiling import profiled
+from .schema import COL_MAP, COLUMN_MAPPING_PATH, DATA_PATH, NEW_COLUMNS
+
+
+@profiled('load_csv')
+def load_survey(path=DATA_PATH, **read_csv_kwargs):
+    """Read the survey CSV with its original question headers."""
+    return pd.read_csv(path, **read_csv_kwargs)
+
+
+@profiled('rename')
+def rename_columns(df):
+    """Replace the original question headers with the short names from col_map."""
+    df = df.copy(deep=False)
+    df.columns = NEW_COLUMNS
+    return df
+
+
+def save_column_mapping(path=COLUMN_MAPPING_PATH):
+    """Write col_map as a Short_Name/Original_Name CSV."""
+    col_map_df = pd.DataFrame(list(COL_MAP.items()), columns=['Short_Name', 'Original_Name'])
+    col_map_df.to_csv(path, index=False)
+
+
+@profiled('filter_country')
+def filter_country(df, country='India'):
+    """Keep only participants from one country (DataFrame or EncodedSurvey)."""
+    if not isinstance(df, pd.DataFrame):
+        return df.take(df.mask('country', country))
+    return df[df['country'] == country].reset_index(drop=True)
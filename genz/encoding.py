@@ -0,0 +1,246 @@
+"""Dictionary-encoded survey responses.
+
+Each column is stored as an array of small unsigned integer codes plus a
+per-column vocabulary, so memory grows with the number of respondents
+rather than with the length of the answer text. Code 0 is reserved for a
+missing answer; ``vocab[column][code]`` is the original label.
+
+``load_cached`` keeps the parsed survey on disk as one ``.npy`` file of
+codes per column plus the vocabularies, keyed by a hash of the CSV, and
+later runs memory-map the codes instead of parsing the CSV again.
+"""
+
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cache import CACHE_FORMAT, code_digest, digest, source_digest
+from .data import load_survey, rename_columns
+from .profiling import profiled
+from .schema import CACHE_DIR, COL_MAP, DATA_PATH, NUMERIC_COLUMNS
+from .validation import read_validated, write_quarantine
+
+MISSING = 0
+
+
+def _json_label(label):
+    # numpy scalars (numeric vocabularies) as plain Python numbers
+    return label.item() if isinstance(label, np.generic) else label
+
+
+def code_dtype(n_labels):
+    """Smallest unsigned dtype that holds ``n_labels`` codes plus the missing code."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n_labels < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def encode_column(values):
+    """Encode one column into ``(codes, vocab)``."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # read_csv already interned the labels; reuse its codes
+        codes, labels = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, labels = pd.factorize(values)
+    vocab = np.empty(len(labels) + 1, dtype=object)
+    vocab[1:] = np.asarray(labels, dtype=object)
+    vocab[MISSING] = None
+    return (codes + 1).astype(code_dtype(len(labels))), vocab
+
+
+class EncodedSurvey:
+    """Survey responses held as per-column integer codes and vocabularies."""
+
+    def __init__(self, codes, vocab, dtypes=None):
+        self.codes = dict(codes)
+        self.vocab = dict(vocab)
+        self.dtypes = dict(dtypes or {})
+        lengths = {len(column_codes) for column_codes in self.codes.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+        self._length = lengths.pop() if lengths else 0
+
+    @classmethod
+    def from_frame(cls, df):
+        """Encode every column of a DataFrame."""
+        codes, vocab, dtypes = {}, {}, {}
+        for column in df.columns:
+            values = df[column]
+            codes[column], vocab[column] = encode_column(values)
+            dtypes[column] = values.cat.categories.dtype if isinstance(
+                values.dtype, pd.CategoricalDtype) else values.dtype
+        return cls(codes, vocab, dtypes)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def columns(self):
+        return list(self.codes)
+
+    def factorize(self, column, use_na_sentinel=True):
+        """``pd.factorize``-style ``(codes, labels)`` straight from the stored codes."""
+        codes, vocab = self.codes[column], self.vocab[column]
+        if use_na_sentinel:
+            return codes.astype(np.intp) - 1, vocab[1:]
+        return codes.astype(np.intp), vocab
+
+    def code_of(self, column, label):
+        """Code of ``label`` in ``column``, or ``None`` if it never occurs."""
+        matches = np.flatnonzero(self.vocab[column][1:] == label)
+        return int(matches[0]) + 1 if len(matches) else None
+
+    def mask(self, column, label):
+        """Boolean row mask for ``column == label``."""
+        code = self.code_of(column, label)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.codes[column] == code
+
+    def take(self, rows):
+        """New EncodedSurvey with the selected rows (mask or indices); vocabularies are shared."""
+        return EncodedSurvey(
+            {column: codes[rows] for column, codes in self.codes.items()},
+            self.vocab, self.dtypes,
+        )
+
+    def labels(self, column):
+        """Decode one column back to its original labels."""
+        values = pd.Series(self.vocab[column][self.codes[column]], name=column)
+        dtype = self.dtypes.get(column)
+        if dtype is not None and not (values.isna().any() and np.dtype(dtype).kind in 'iub'):
+            values = values.astype(dtype)
+        return values.infer_objects()
+
+    def decode(self):
+        """Round-trip back to a DataFrame of the original labels."""
+        return pd.DataFrame({column: self.labels(column) for column in self.codes})
+
+    def vocabulary_table(self):
+        """Tidy ``question, code, label`` table of every vocabulary."""
+        return pd.DataFrame(
+            [(column, code, label)
+             for column, vocab in self.vocab.items()
+             for code, label in enumerate(vocab) if code != MISSING],
+            columns=['question', 'code', 'label'],
+        )
+
+    def save(self, directory):
+        """Write the codes as one ``.npy`` file per column and the vocabularies as JSON."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for column, codes in self.codes.items():
+            np.save(directory / f'{column}.npy', codes)
+        # Written last: its presence marks a complete survey
+        (directory / 'vocab.json').write_text(json.dumps({
+            'columns': self.columns,
+            'vocab': {column: [_json_label(label) for label in vocab[1:]] for column, vocab in self.vocab.items()},
+            'dtypes': {column: str(dtype) for column, dtype in self.dtypes.items()},
+        }), encoding='utf-8')
+
+    @classmethod
+    def open(cls, directory):
+        """Survey written by ``save``, with codes memory-mapped read-only rather than read."""
+        directory = Path(directory)
+        meta = json.loads((directory / 'vocab.json').read_text(encoding='utf-8'))
+        codes, vocab = {}, {}
+        for column in meta['columns']:
+            codes[column] = np.asarray(np.load(directory / f'{column}.npy', mmap_mode='r'))
+            labels = meta['vocab'][column]
+            vocab[column] = np.empty(len(labels) + 1, dtype=object)
+            vocab[column][1:] = labels
+        dtypes = {column: pd.api.types.pandas_dtype(dtype) for column, dtype in meta['dtypes'].items()}
+        return cls(codes, vocab, dtypes)
+
+    def memory_usage(self):
+        """Approximate bytes held by codes and vocabularies."""
+        code_bytes = sum(codes.nbytes for codes in self.codes.values())
+        vocab_bytes = sum(vocab.nbytes + sum(sys.getsizeof(label) for label in vocab)
+                          for vocab in self.vocab.values())
+        return code_bytes + vocab_bytes
+
+
+def concat_surveys(surveys):
+    """One EncodedSurvey with the rows of ``surveys`` in order; vocabularies are merged.
+
+    Labels keep their first-seen order, so a survey's codes are unchanged
+    when the surveys after it add new labels.
+    """
+    surveys = list(surveys)
+    if not surveys:
+        return EncodedSurvey({}, {})
+    codes, vocab, dtypes = {}, {}, {}
+    for column in surveys[0].columns:
+        lookup = {}
+        for survey in surveys:
+            for label in survey.vocab[column][1:]:
+                lookup.setdefault(label, len(lookup) + 1)
+        dtype = code_dtype(len(lookup))
+        remapped = []
+        for survey in surveys:
+            remap = np.array([MISSING, *(lookup[label] for label in survey.vocab[column][1:])], dtype=dtype)
+            remapped.append(remap[survey.codes[column]])
+        codes[column] = np.concatenate(remapped)
+        vocab[column] = np.empty(len(lookup) + 1, dtype=object)
+        vocab[column][1:] = list(lookup)
+        # A column whose dtype differs between surveys is decoded with inferred types
+        if len({str(survey.dtypes.get(column)) for survey in surveys}) == 1:
+            dtypes[column] = surveys[0].dtypes.get(column)
+    return EncodedSurvey(codes, vocab, dtypes)
+
+
+@profiled('load_encoded')
+def load_encoded(path=DATA_PATH, validate=True, seen=None):
+    """Load and rename the survey CSV straight into an EncodedSurvey.
+
+    Text columns are parsed as categoricals so each distinct answer is
+    stored once while reading; numeric columns are encoded afterwards.
+    With ``validate``, rows failing a ``genz.validation`` check are left
+    out and written to the CSV's quarantine file. ``seen`` (a ``RowHashes``)
+    shared between calls also catches duplicates across files.
+    """
+    dtype = {original: 'category' for short, original in COL_MAP.items()
+             if short not in NUMERIC_COLUMNS}
+    if not validate:
+        return EncodedSurvey.from_frame(rename_columns(load_survey(path, dtype=dtype)))
+    df, quarantine = read_validated(path, seen=seen, dtype=dtype)
+    write_quarantine(quarantine, path)
+    return EncodedSurvey.from_frame(rename_columns(df))
+
+
+@profiled('load_cached')
+def load_cached(path=DATA_PATH, directory=CACHE_DIR):
+    """``load_encoded`` through an on-disk cache keyed by the CSV's content hash.
+
+    The first load of each version of the CSV parses and validates it and
+    saves the survey under ``directory``; later loads memory-map the saved
+    codes.
+    Editing the CSV changes its hash, so it is parsed again and the entry
+    of its previous version is removed.
+    """
+    source = str(Path(path).resolve())
+    entries = Path(directory) / 'encoded'
+    entry = entries / digest(CACHE_FORMAT, source_digest(path, directory), code_digest())
+    if (entry / 'vocab.json').exists():
+        return EncodedSurvey.open(entry)
+
+    survey = load_encoded(path)
+    partial = entry.with_name(f'{entry.name}.{os.getpid()}.tmp')
+    survey.save(partial)
+    (partial / 'source').write_text(source, encoding='utf-8')
+    try:
+        os.replace(partial, entry)
+    except OSError:
+        # Another process saved the same entry first
+        shutil.rmtree(partial, ignore_errors=True)
+    for other in entries.iterdir():
+        marker = other / 'source'
+        if other != entry and marker.is_file() and marker.read_text(encoding='utf-8') == source:
+            shutil.rmtree(other, ignore_errors=True)
+    return survey
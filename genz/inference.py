@@ -0,0 +1,147 @@
+"""Bootstrap confidence intervals and permutation tests for answer shares.
+
+Resamples are drawn as whole matrices: multinomial draws for single-choice
+questions (answers are mutually exclusive) and per-option binomial draws
+for multi-select options, whose shares are fractions of respondents. Gender
+differences get a bootstrap interval and a permutation p-value. Permuted
+group labels make the group counts multivariate hypergeometric, so they are
+sampled directly instead of shuffling rows.
+
+Work is split into fixed-size chunks with one spawned seed each, so
+results for a given ``seed`` do not depend on the number of processes.
+"""
+
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RESAMPLES = 10_000
+CONFIDENCE = 0.95
+# Resamples per job; also the unit of seeding
+CHUNK_RESAMPLES = 2_000
+# With processes=None, smaller jobs (resamples x answers) stay in-process
+PARALLEL_MIN_DRAWS = 2_000_000
+
+
+def _sample_size(counts):
+    # Participants behind a counts table: sum of answers, or respondents for options
+    counts = counts[counts['share'] > 0]
+    if counts.empty:
+        return 0, True
+    n = int(round(counts['count'].iloc[0] / counts['share'].iloc[0]))
+    return n, int(counts['count'].sum()) == n
+
+
+def _bootstrap_shares(rng, size, counts, n, exclusive):
+    # (size, k) resampled shares of one group
+    if n == 0:
+        return np.zeros((size, len(counts)))
+    p = counts / n
+    draws = rng.multinomial(n, p, size=size) if exclusive else rng.binomial(n, p, size=(size, len(p)))
+    return draws / n
+
+
+def _bootstrap_job(job):
+    # Resampled shares for one chunk; a second group gives resampled differences
+    size, seed, groups = job
+    rng = np.random.default_rng(seed)
+    shares = [_bootstrap_shares(rng, size, *group) for group in groups]
+    return shares[0] if len(shares) == 1 else shares[0] - shares[1]
+
+
+def _permutation_job(job):
+    # How often a relabelled split is at least as extreme as the observed one
+    size, seed, pooled, n_a, n_b, exclusive, observed = job
+    rng = np.random.default_rng(seed)
+    if exclusive:
+        counts_a = rng.multivariate_hypergeometric(pooled, n_a, size=size)
+    else:
+        counts_a = rng.hypergeometric(pooled, n_a + n_b - pooled, n_a, size=(size, len(pooled)))
+    differences = counts_a / max(n_a, 1) - (pooled - counts_a) / max(n_b, 1)
+    return (np.abs(differences) >= np.abs(observed) - 1e-12).sum(axis=0)
+
+
+def _run(func, args, resamples, n_answers, seed, processes):
+    # Map fixed-size, individually seeded chunks over a process pool
+    n_chunks = math.ceil(resamples / CHUNK_RESAMPLES)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    sizes = [min(CHUNK_RESAMPLES, resamples - i * CHUNK_RESAMPLES) for i in range(n_chunks)]
+    jobs = [(size, chunk_seed, *args) for size, chunk_seed in zip(sizes, seeds)]
+    if processes is None and resamples * n_answers < PARALLEL_MIN_DRAWS:
+        processes = 1
+    processes = min(processes or os.cpu_count() or 1, n_chunks)
+    if processes == 1:
+        return [func(job) for job in jobs]
+    # Fork where available so workers do not re-run the calling script
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+        return list(pool.map(func, jobs))
+
+
+def _percentiles(samples, confidence):
+    tail = (1 - confidence) / 2 * 100
+    return np.percentile(samples, [tail, 100 - tail], axis=0)
+
+
+def share_intervals(counts, resamples=DEFAULT_RESAMPLES, confidence=CONFIDENCE, seed=0, processes=None):
+    """Add bootstrap ``low``/``high`` share bounds to a counts table.
+
+    ``counts`` is ``question_counts`` or ``option_counts`` output; option
+    tables (shares of respondents) are resampled per option. ``processes=1``
+    stays in the current process; ``None`` uses every core for large jobs.
+    """
+    n, exclusive = _sample_size(counts)
+    group = (counts['count'].to_numpy(), n, exclusive)
+    samples = np.concatenate(_run(_bootstrap_job, ((group,),), resamples, len(counts), seed, processes))
+    counts = counts.copy()
+    counts['low'], counts['high'] = _percentiles(samples, confidence)
+    counts.attrs['confidence'] = confidence
+    return counts
+
+
+def share_differences(counts_a, counts_b, resamples=DEFAULT_RESAMPLES, confidence=CONFIDENCE,
+                      seed=0, processes=None):
+    """Share differences between two groups with bootstrap bounds and permutation p-values.
+
+    ``counts_a`` and ``counts_b`` are counts tables of the same question for
+    two disjoint groups, e.g. ``question_counts(tallies, q, gender='Male')``
+    and ``gender='Female'``. Returns ``[question, 'share_a', 'share_b',
+    'difference', 'low', 'high', 'p_value']`` ordered by pooled count.
+    """
+    question = counts_a.columns[0]
+    n_a, exclusive_a = _sample_size(counts_a)
+    n_b, exclusive_b = _sample_size(counts_b)
+    exclusive = exclusive_a and exclusive_b
+    both = pd.concat([counts_a.set_index(question)['count'], counts_b.set_index(question)['count']],
+                     axis=1, keys=['a', 'b'], sort=False).fillna(0).astype(np.int64)
+    both = both.loc[(both['a'] + both['b']).sort_values(ascending=False, kind='stable').index]
+    a, b = both['a'].to_numpy(), both['b'].to_numpy()
+    observed = a / max(n_a, 1) - b / max(n_b, 1)
+
+    groups = ((a, n_a, exclusive), (b, n_b, exclusive))
+    samples = np.concatenate(_run(_bootstrap_job, (groups,), resamples, len(a), seed, processes))
+    # Offset the permutation seed so it does not reuse the bootstrap streams
+    extreme = sum(_run(_permutation_job, (a + b, n_a, n_b, exclusive, observed),
+                       resamples, len(a), (seed, 1), processes))
+
+    table = pd.DataFrame({question: both.index, 'share_a': a / max(n_a, 1), 'share_b': b / max(n_b, 1),
+                          'difference': observed})
+    table['low'], table['high'] = _percentiles(samples, confidence)
+    table['p_value'] = (extreme + 1) / (resamples + 1)
+    table.attrs['confidence'] = confidence
+    return table
+
+
+def format_differences(table, labels=('Male', 'Female')):
+    """Render ``share_differences`` output as one line per answer."""
+    level = round(table.attrs.get('confidence', CONFIDENCE) * 100)
+    lines = []
+    for row in table.itertuples(index=False):
+        lines.append(f"{row[0]}: {labels[0]} {row.share_a * 100:.1f}% vs {labels[1]} {row.share_b * 100:.1f}%, "
+                     f"difference {row.difference * 100:+.1f} pts "
+                     f"({level}% CI {row.low * 100:+.1f} to {row.high * 100:+.1f}), p = {row.p_value:.3f}")
+    return '\n'.join(lines)
@@ -0,0 +1,336 @@
+"""Live submission ingest: an asyncio HTTP endpoint writing columnar segments.
+
+``POST /submit`` takes one JSON object, or a list of them, keyed by the 15
+original question headers recorded in ``data/column_mapping.csv``. Each
+submission is validated and renamed on the event loop and queued. A single
+writer task then gathers queued rows into micro-batches of up to
+``batch_rows`` rows, waiting at most ``max_delay`` seconds to fill one.
+Each batch is written, in a worker thread, as a new immutable segment
+directory (an ``EncodedSurvey`` saved with ``save``). No file is rewritten,
+and ``load_segments`` concatenates the segments in order.
+
+The queue holds at most ``queue_rows`` rows. When the writer falls behind,
+submissions wait for room. One that still finds the queue full after
+``put_timeout`` seconds gets ``503`` with ``Retry-After``. A ``202``
+response means the rows match the schema and are queued; a crash can lose
+up to one unwritten batch. A failed segment write is retried with backoff
+and, while it keeps failing, submissions get ``503`` and ``GET /health``
+reports the error, so no row is accepted that cannot be written. The data-quality checks of ``genz.validation``
+(rating scales, known labels, duplicates) run when the segments are
+counted by ``AggregateState.refresh_segments``, which quarantines failing
+rows. ``GET /stats`` reports the counters.
+"""
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from .encoding import EncodedSurvey, concat_surveys
+from .schema import COLUMN_MAPPING_PATH, NUMERIC_COLUMNS, SEGMENTS_DIR
+
+# Micro-batch and back-pressure defaults
+BATCH_ROWS = 5_000
+MAX_DELAY = 0.2
+QUEUE_ROWS = 50_000
+PUT_TIMEOUT = 5.0
+# Seconds before a failed segment write is retried, doubling up to the maximum
+WRITE_RETRY = 0.1
+WRITE_RETRY_MAX = 5.0
+# Seconds ``stop`` waits for queued rows to be written
+STOP_TIMEOUT = 30.0
+# Largest accepted request body
+MAX_BODY_BYTES = 1_000_000
+
+REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+
+class SubmissionError(ValueError):
+    """A submission that does not match the survey schema."""
+
+
+def expected_headers(path=COLUMN_MAPPING_PATH):
+    """``{original header: short name}`` from the column mapping file, in column order."""
+    mapping = pd.read_csv(path, dtype=str)
+    return dict(zip(mapping['Original_Name'], mapping['Short_Name']))
+
+
+def validate_submission(submission, headers):
+    """Tuple of the submission's values in ``headers`` order, or ``SubmissionError``.
+
+    Every header must be present and nothing else; values must be strings,
+    numbers or null, and numeric questions must hold whole numbers. The
+    row checks of ``genz.validation`` run later, on whole segments.
+    """
+    if not isinstance(submission, dict):
+        raise SubmissionError(f"Submission must be a JSON object, got {type(submission).__name__}")
+    if submission.keys() != headers.keys():
+        missing = [header for header in headers if header not in submission]
+        unknown = [key for key in submission if key not in headers]
+        raise SubmissionError(f"Headers do not match data/column_mapping.csv: "
+                              f"missing {missing}, unknown {unknown}")
+    row = []
+    for header, short_name in headers.items():
+        value = submission[header]
+        if short_name in NUMERIC_COLUMNS and value is not None:
+            try:
+                number = float(str(value).strip())
+            except ValueError:
+                number = None
+            if number is None or not number.is_integer():
+                raise SubmissionError(f"{short_name} must be a whole number, got {value!r}")
+            value = int(number)
+        elif value is not None and not isinstance(value, (str, int, float)):
+            raise SubmissionError(f"{short_name} must be a string, number or null")
+        row.append(value)
+    return tuple(row)
+
+
+def _segment_number(path):
+    return int(path.name) if path.name.isdigit() else -1
+
+
+def segment_paths(directory=SEGMENTS_DIR):
+    """Completed segment directories in write order."""
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    return sorted((path for path in directory.iterdir() if _segment_number(path) >= 0),
+                  key=_segment_number)
+
+
+def load_segments(directory=SEGMENTS_DIR):
+    """All ingested rows as one ``EncodedSurvey`` with short column names."""
+    return concat_surveys(EncodedSurvey.open(path) for path in segment_paths(directory))
+
+
+class SegmentWriter:
+    """Writes row batches as numbered, immutable segment directories."""
+
+    def __init__(self, directory=SEGMENTS_DIR, columns=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.columns = list(expected_headers().values()) if columns is None else list(columns)
+        existing = segment_paths(self.directory)
+        self.next_number = _segment_number(existing[-1]) + 1 if existing else 0
+
+    def write(self, rows):
+        """Encode ``rows`` (tuples in column order) into the next segment; returns its path."""
+        path = self.directory / f'{self.next_number:08d}'
+        partial = self.directory / f'.{path.name}.{os.getpid()}.tmp'
+        EncodedSurvey.from_frame(pd.DataFrame(rows, columns=self.columns)).save(partial)
+        # Segments appear whole: readers only list fully named directories
+        os.replace(partial, path)
+        self.next_number += 1
+        return path
+
+
+class IngestServer:
+    """Validates submissions, queues rows and micro-batches them into segments."""
+
+    def __init__(self, directory=SEGMENTS_DIR, batch_rows=BATCH_ROWS, max_delay=MAX_DELAY,
+                 queue_rows=QUEUE_ROWS, put_timeout=PUT_TIMEOUT, headers=None):
+        self.headers = expected_headers() if headers is None else headers
+        self.writer = SegmentWriter(directory, self.headers.values())
+        self.batch_rows, self.max_delay, self.put_timeout = batch_rows, max_delay, put_timeout
+        self.queue_rows = queue_rows
+        self.stats = {'accepted_rows': 0, 'invalid_requests': 0, 'rejected_requests': 0,
+                      'rows_written': 0, 'segments': 0, 'write_seconds': 0.0, 'write_errors': 0}
+        # Error of the segment write being retried, if any
+        self.write_error = None
+        # Submissions waiting for the writer, and the rows they hold
+        self.queue = None
+        self.queued_rows = 0
+        self._room = None
+        self._writer_task = None
+
+    async def start(self, host='127.0.0.1', port=8001):
+        """Start the writer task and listen; returns the ``asyncio.Server``."""
+        self.queue = asyncio.Queue()
+        self._room = asyncio.Condition()
+        self._writer_task = asyncio.create_task(self._write_batches())
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self, timeout=STOP_TIMEOUT):
+        """Write every queued row, then stop the writer.
+
+        Raises ``RuntimeError`` if segment writes still fail after
+        ``timeout`` seconds; the rows not written are then lost.
+        """
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"{self.queued_rows:,} queued rows were not written: {self.write_error}") from None
+        finally:
+            self._writer_task.cancel()
+
+    def _has_room(self, n_rows):
+        # An oversized submission is let in alone rather than never
+        return self.queued_rows + n_rows <= self.queue_rows or self.queued_rows == 0
+
+    async def submit(self, rows):
+        """Queue validated rows as a whole, waiting up to ``put_timeout`` for room.
+
+        Returns ``False``, with nothing queued, if the queue stayed full or
+        segment writes are failing.
+        """
+        if self.write_error is not None:
+            self.stats['rejected_requests'] += 1
+            return False
+        if not self._has_room(len(rows)):
+            try:
+                async with self._room:
+                    await asyncio.wait_for(self._room.wait_for(lambda: self._has_room(len(rows))),
+                                           self.put_timeout)
+            except asyncio.TimeoutError:
+                self.stats['rejected_requests'] += 1
+                return False
+        self.queued_rows += len(rows)
+        self.queue.put_nowait(rows)
+        self.stats['accepted_rows'] += len(rows)
+        return True
+
+    async def _write_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            submissions = [await self.queue.get()]
+            rows = list(submissions[0])
+            deadline = loop.time() + self.max_delay
+            while len(rows) < self.batch_rows:
+                try:
+                    submissions.append(self.queue.get_nowait())
+                    rows += submissions[-1]
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                # Let handlers run and fill the batch
+                await asyncio.sleep(min(remaining, 0.01))
+            try:
+                await self._write(rows)
+            finally:
+                for _ in submissions:
+                    self.queue.task_done()
+
+    async def _write(self, rows):
+        # Write one batch, retrying with backoff until it succeeds
+        loop = asyncio.get_running_loop()
+        delay = WRITE_RETRY
+        while True:
+            start = time.perf_counter()
+            try:
+                # Encoding and writing happen off the event loop; submissions keep
+                # queueing meanwhile until the queue is full
+                await loop.run_in_executor(None, self.writer.write, rows)
+                break
+            except Exception as error:
+                self.stats['write_errors'] += 1
+                self.write_error = f'{type(error).__name__}: {error}'
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, WRITE_RETRY_MAX)
+        self.write_error = None
+        self.stats['write_seconds'] += time.perf_counter() - start
+        self.stats['rows_written'] += len(rows)
+        self.stats['segments'] += 1
+        self.queued_rows -= len(rows)
+        async with self._room:
+            self._room.notify_all()
+
+    async def _submit_body(self, body):
+        # (status, payload, extra headers) for a POST /submit body
+        try:
+            try:
+                submissions = json.loads(body)
+            except ValueError as error:
+                raise SubmissionError(f"Body is not valid JSON: {error}") from error
+            submissions = submissions if isinstance(submissions, list) else [submissions]
+            rows = [validate_submission(submission, self.headers) for submission in submissions]
+        except SubmissionError as error:
+            self.stats['invalid_requests'] += 1
+            return 400, {'error': str(error)}, {}
+        if not await self.submit(rows):
+            error = 'Ingest queue is full' if self.write_error is None else f'Segment writes fail ({self.write_error})'
+            return 503, {'error': f'{error}, retry later'}, {'Retry-After': '1'}
+        return 202, {'accepted': len(rows)}, {}
+
+    async def _handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: one request at a time per connection
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                fields = dict(line.split(':', 1) for line in header_lines if ':' in line)
+                fields = {name.strip().lower(): value.strip() for name, value in fields.items()}
+                try:
+                    method, target, _ = request_line.split(' ', 2)
+                    length = int(fields.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self._send(writer, 400, {'error': 'Malformed request line or Content-Length'}, close=True)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._send(writer, 413, {'error': f'Body over {MAX_BODY_BYTES} bytes'}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                path, extra = target.split('?', 1)[0], {}
+                if path == '/stats':
+                    status, payload = 200, {**self.stats, 'queued_rows': self.queued_rows,
+                                            'write_error': self.write_error}
+                elif path == '/health':
+                    status = 200 if self.write_error is None else 503
+                    payload = {'status': 'ok' if self.write_error is None else 'failing', 'error': self.write_error}
+                elif path != '/submit':
+                    status, payload = 404, {'error': f'Unknown path {path}'}
+                elif method != 'POST':
+                    status, payload, extra = 405, {'error': 'Use POST'}, {'Allow': 'POST'}
+                else:
+                    status, payload, extra = await self._submit_body(body)
+                await self._send(writer, status, payload, extra)
+                if fields.get('connection', '').lower() == 'close':
+                    break
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer, status, payload, extra=None, close=False):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Content-Length': str(len(body)), **(extra or {})}
+        if close:
+            headers['Connection'] = 'close'
+        head = f'HTTP/1.1 {status} {REASONS[status]}\r\n' + ''.join(
+            f'{name}: {value}\r\n' for name, value in headers.items()) + '\r\n'
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+async def _serve(server, host, port):
+    listener = await server.start(host, port)
+    print(f"Accepting submissions on http://{host}:{listener.sockets[0].getsockname()[1]}/submit, "
+          f"writing segments to '{server.writer.directory}'")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+
+def serve_ingest(directory=SEGMENTS_DIR, host='127.0.0.1', port=8001, batch_rows=BATCH_ROWS,
+                 max_delay=MAX_DELAY, queue_rows=QUEUE_ROWS):
+    """Run the ingest endpoint until interrupted, then flush the queue."""
+    server = IngestServer(directory, batch_rows, max_delay, queue_rows)
+    try:
+        asyncio.run(_serve(server, host, port))
+    except KeyboardInterrupt:
+        pass
+    return server.stats
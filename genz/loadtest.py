@@ -0,0 +1,135 @@
+"""Load tests for the ``genz.server`` /counts and ``genz.ingest`` /submit endpoints.
+
+Worker threads replay a mix of dashboard queries over keep-alive
+connections, revalidating with ``If-None-Match`` the way a browser cache
+would, and report requests per second and latency percentiles.
+``run_ingest_load_test`` instead posts a sustained burst of synthetic
+submissions and also reports rows per second and back-pressure rejections.
+"""
+
+import http.client
+import itertools
+import json
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from .schema import QUESTIONS
+
+GENDERS = ['All', 'Male', 'Female']
+
+
+def dashboard_queries(questions=QUESTIONS):
+    """Every query the dashboard controls can produce."""
+    return [
+        '/counts?' + urlencode({'question': question, 'gender': gender, 'top': top, 'view': view})
+        for question, gender, top, view in itertools.product(questions, GENDERS, (3, 5), ('top', 'bottom'))
+    ]
+
+
+def _worker(host, port, queries, latencies, statuses, revalidate, deadline):
+    connection = http.client.HTTPConnection(host, port)
+    etags = {}
+    for query in itertools.cycle(queries):
+        if time.perf_counter() >= deadline:
+            break
+        headers = {'If-None-Match': etags[query]} if revalidate and query in etags else {}
+        start = time.perf_counter()
+        connection.request('GET', query, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses.append(response.status)
+        if response.status == 200:
+            etags[query] = response.getheader('ETag')
+    connection.close()
+
+
+def _summary(latencies, statuses, elapsed):
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies_ms, 99)) if len(latencies) else None,
+    }
+
+
+def _run_workers(target, worker_args, duration):
+    # Start one thread per argument tuple and wait for the deadline
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=target, args=(*args, deadline)) for args in worker_args]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def run_load_test(url='http://127.0.0.1:8000', duration=5.0, concurrency=8, revalidate=True):
+    """Hammer the server for ``duration`` seconds and summarize throughput and latency."""
+    target = urlsplit(url)
+    queries = dashboard_queries()
+    latencies, statuses = [], []
+    elapsed = _run_workers(_worker, [
+        (target.hostname, target.port or 80, queries[i::concurrency] or queries, latencies, statuses, revalidate)
+        for i in range(concurrency)
+    ], duration)
+    statuses = np.asarray(statuses)
+    return {**_summary(latencies, statuses, elapsed),
+            'not_modified': int((statuses == 304).sum()),
+            'errors': int((statuses >= 400).sum())}
+
+
+def submission_bodies(n_bodies=200, rows_per_body=1, seed=0):
+    """JSON bodies of synthetic submissions keyed by the original headers."""
+    from .synthetic import generate
+
+    frame = generate(n_bodies * rows_per_body, seed=seed).astype(object)
+    records = frame.where(frame.notna(), None).to_dict('records')
+    bodies = []
+    for i in range(n_bodies):
+        chunk = records[i * rows_per_body:(i + 1) * rows_per_body]
+        bodies.append(json.dumps(chunk if rows_per_body > 1 else chunk[0],
+                                 default=lambda value: value.item()).encode('utf-8'))
+    return bodies
+
+
+def _submit_worker(host, port, bodies, latencies, statuses, deadline):
+    connection = http.client.HTTPConnection(host, port)
+    headers = {'Content-Type': 'application/json'}
+    for body in itertools.cycle(bodies):
+        if time.perf_counter() >= deadline:
+            break
+        start = time.perf_counter()
+        connection.request('POST', '/submit', body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses.append(response.status)
+    connection.close()
+
+
+def run_ingest_load_test(url='http://127.0.0.1:8001', duration=5.0, concurrency=8, rows_per_body=1):
+    """Post synthetic submissions for ``duration`` seconds; summarize throughput, latency and back-pressure."""
+    target = urlsplit(url)
+    host, port = target.hostname, target.port or 80
+    bodies = submission_bodies(rows_per_body=rows_per_body)
+    latencies, statuses = [], []
+    elapsed = _run_workers(_submit_worker, [
+        (host, port, bodies[i::concurrency] or bodies, latencies, statuses) for i in range(concurrency)
+    ], duration)
+    statuses = np.asarray(statuses)
+    accepted = int((statuses == 202).sum())
+    connection = http.client.HTTPConnection(host, port)
+    connection.request('GET', '/stats')
+    server_stats = json.loads(connection.getresponse().read())
+    connection.close()
+    return {**_summary(latencies, statuses, elapsed),
+            'rows_per_second': accepted * rows_per_body / elapsed,
+            'rejected': int((statuses == 503).sum()),
+            'errors': int(((statuses >= 400) & (statuses != 503)).sum()),
+            'server': server_stats}
@@ -0,0 +1,188 @@
+"""Bitset index over the comma-joined multi-select answers.
+
+Each distinct answer string is split once against the question's fixed
+option vocabulary (``MULTI_SELECT_OPTIONS``) and turned into a bit mask;
+every respondent then holds one small unsigned integer with a bit per
+selected option. Option counts, co-occurrence counts and "selected X"
+filters are bit operations over that array instead of string matching.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .profiling import profiled
+from .schema import DIMENSIONS, MULTI_SELECT_OPTIONS
+from .tally import _group_ids, column_codes
+
+SEPARATOR = ', '
+
+# Set-bit count of every byte value, for numpy without bitwise_count
+_BYTE_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def bitset_dtype(n_options):
+    """Smallest unsigned dtype with one bit per option."""
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if n_options <= np.iinfo(dtype).bits:
+            return np.dtype(dtype)
+    raise ValueError(f"At most 64 options fit in a bitset, got {n_options}")
+
+
+def popcount(bits):
+    """Number of set bits in every element of an unsigned integer array."""
+    bits = np.ascontiguousarray(bits)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits)
+    as_bytes = bits.view(np.uint8).reshape(len(bits), bits.dtype.itemsize)
+    return _BYTE_POPCOUNT[as_bytes].sum(axis=1, dtype=np.uint8)
+
+
+def split_options(text, options):
+    """Split one comma-joined answer into ``(bit mask, unknown tokens)``.
+
+    Options are matched longest first so that options which contain the
+    separator themselves are not broken apart.
+    """
+    by_length = sorted(enumerate(options), key=lambda item: -len(item[1]))
+    mask, unknown, pos = 0, [], 0
+    text = text.strip()
+    while pos < len(text):
+        for bit, option in by_length:
+            end = pos + len(option)
+            if text.startswith(option, pos) and (end == len(text) or text.startswith(SEPARATOR, end)):
+                mask |= 1 << bit
+                break
+        else:
+            end = text.find(SEPARATOR, pos)
+            end = len(text) if end < 0 else end
+            unknown.append(text[pos:end].strip())
+        pos = end + len(SEPARATOR)
+    return mask, unknown
+
+
+class MultiSelectIndex:
+    """Per-respondent option bitsets for one multi-select question."""
+
+    def __init__(self, column, options, bits, unknown=None):
+        self.column = column
+        self.options = list(options)
+        self.bits = bits
+        self.unknown = dict(unknown or {})
+
+    @classmethod
+    def build(cls, df, column, options=None):
+        """Tokenize ``df[column]`` (DataFrame or EncodedSurvey) into bitsets."""
+        options = MULTI_SELECT_OPTIONS[column] if options is None else options
+        dtype = bitset_dtype(len(options))
+        codes, labels = column_codes(df, column)
+
+        # Parse each distinct answer string once, then broadcast by code
+        label_bits = np.zeros(len(labels) + 1, dtype=dtype)
+        label_unknown = []
+        for code, label in enumerate(labels):
+            mask, unknown = split_options(str(label), options)
+            label_bits[code] = mask
+            label_unknown.append(unknown)
+        bits = label_bits[codes]  # code -1 (missing) picks the trailing empty set
+
+        unknown = {}
+        label_counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+        for tokens, count in zip(label_unknown, label_counts):
+            for token in tokens:
+                unknown[token] = unknown.get(token, 0) + int(count)
+        return cls(column, options, bits, unknown)
+
+    def __len__(self):
+        return len(self.bits)
+
+    def option_mask(self, *options):
+        """Bit mask with the bits of the named options set."""
+        mask = 0
+        for option in options:
+            mask |= 1 << self.options.index(option)
+        return self.bits.dtype.type(mask)
+
+    def selected(self, *options, how='any'):
+        """Boolean row mask of respondents who selected any/all of ``options``."""
+        mask = self.option_mask(*options)
+        if how == 'any':
+            return (self.bits & mask) != 0
+        if how == 'all':
+            return (self.bits & mask) == mask
+        raise ValueError(f"how must be 'any' or 'all', got {how!r}")
+
+    def n_selected(self):
+        """Number of options each respondent selected."""
+        return popcount(self.bits)
+
+    def _patterns(self, rows=None):
+        # Distinct bit patterns as a boolean (pattern, option) matrix plus their frequencies
+        bits = self.bits if rows is None else self.bits[rows]
+        patterns, weights = np.unique(bits, return_counts=True)
+        shifts = np.arange(len(self.options), dtype=bits.dtype)
+        selected = ((patterns[:, None] >> shifts) & 1).astype(np.int64)
+        return selected, weights
+
+    def cooccurrence(self, rows=None):
+        """Option x option matrix of respondents selecting both; the diagonal holds option counts."""
+        selected, weights = self._patterns(rows)
+        matrix = selected.T @ (selected * weights[:, None])
+        return pd.DataFrame(matrix, index=self.options, columns=self.options)
+
+    def option_counts(self, rows=None):
+        """Respondents selecting each option, most frequent first.
+
+        Same ``[column, 'count', 'share']`` layout as ``question_counts``;
+        ``share`` is the fraction of respondents (it does not sum to 1).
+        """
+        selected, weights = self._patterns(rows)
+        counts = pd.DataFrame({
+            self.column: self.options,
+            'count': weights @ selected,
+        }).sort_values('count', ascending=False, kind='stable').reset_index(drop=True)
+        counts['share'] = counts['count'] / max(int(weights.sum()), 1)
+        return counts
+
+
+@profiled('multiselect_index')
+def multiselect_index(df, columns=None):
+    """``MultiSelectIndex`` for each multi-select column, keyed by column name."""
+    columns = list(MULTI_SELECT_OPTIONS) if columns is None else columns
+    return {column: MultiSelectIndex.build(df, column) for column in columns}
+
+
+@profiled('option_tally')
+def option_tally(df, columns=None, by=DIMENSIONS, weights=None):
+    """Per-option counts of the multi-select questions, split by ``by``.
+
+    Returns the same tidy layout as ``tally``: one row per
+    (question, option, *by) with ``count`` and ``share``, where ``share`` is
+    the fraction of respondents in the group selecting the option. With
+    per-row ``weights`` counts and respondents are weighted.
+    """
+    by = list(by)
+    group_ids, group_labels, group_shape = _group_ids(df, by)
+    n_groups = int(np.prod(group_shape)) if by else 1
+    respondents = np.bincount(group_ids, weights=weights, minlength=n_groups)
+    row_weights = 1 if weights is None else weights
+
+    frames = []
+    for column, index in multiselect_index(df, columns).items():
+        counts = np.stack([
+            np.bincount(group_ids, weights=((index.bits >> bit) & 1) * row_weights, minlength=n_groups)
+            for bit in range(len(index.options))
+        ])
+        counts = counts.astype(np.int64) if weights is None else counts
+        options, groups = np.nonzero(counts)
+        frame = {
+            'question': column,
+            'answer': np.asarray(index.options, dtype=object)[options],
+        }
+        if by:
+            for dim, labels, codes in zip(by, group_labels, np.unravel_index(groups, group_shape)):
+                frame[dim] = labels[codes]
+        frame['count'] = counts[options, groups]
+        frame['share'] = frame['count'] / respondents[groups]
+        frames.append(pd.DataFrame(frame))
+    columns = ['question', 'answer', *by, 'count', 'share']
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
@@ -0,0 +1,103 @@
+"""Country-partitioned Parquet copy of the survey.
+
+``write_partitioned`` converts the CSV export once into a hive-partitioned
+dataset, ``country=<name>/[wave=<label>/]part-<n>.parquet``, with short
+column names and canonical answer labels (so country aliases land in the
+right partition). ``load_partitioned`` then opens only the partition
+directories that match ``country`` (and ``wave``), decodes only the
+requested columns, and applies a ``gender`` filter inside the scan (row
+groups whose statistics rule it out are skipped), so a single-country
+load scales with that country's slice rather than with the whole export.
+Rows keep their order in the CSV.
+
+pyarrow is optional and imported only by these functions.
+"""
+
+from .answers import AnswerMap, canonicalize_answers
+from .schema import DATA_PATH, NEW_COLUMNS, NUMERIC_COLUMNS, PARQUET_DIR
+from .streaming import DEFAULT_CHUNKSIZE, iter_chunks
+
+# Hive partition keys, outermost first; 'wave' is only written when given
+PARTITION_KEYS = ['country', 'wave']
+# Upper bound on rows per Parquet row group, the unit of predicate pushdown
+ROW_GROUP_ROWS = 65_536
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError as error:
+        raise ImportError("Partitioned storage needs pyarrow: pip install pyarrow") from error
+    return pyarrow, pyarrow.dataset
+
+
+def _partitioning(pa, ds, keys):
+    # Partition values are always read back as strings, e.g. wave '2024'
+    return ds.partitioning(pa.schema([(key, pa.string()) for key in keys]), flavor='hive')
+
+
+def write_partitioned(csv_path=DATA_PATH, root=PARQUET_DIR, wave=None, chunksize=DEFAULT_CHUNKSIZE,
+                      answer_map=None):
+    """Convert the survey CSV into a Parquet dataset partitioned by country (and ``wave``).
+
+    The CSV is streamed ``chunksize`` rows at a time and canonicalized with
+    ``answer_map`` (default: ``data/answer_mapping.csv``). Partitions
+    written by this call replace earlier files of the same country and
+    wave, so each wave of an export can be added under its own label;
+    countries missing from the new export keep their old files. Returns the
+    number of rows written.
+    """
+    pa, ds = _arrow()
+    answer_map = AnswerMap.from_csv() if answer_map is None else answer_map
+    keys = ['country'] if wave is None else PARTITION_KEYS
+    schema = pa.schema([(column, pa.int64() if column in NUMERIC_COLUMNS else pa.string())
+                        for column in [*NEW_COLUMNS, *keys[1:]]])
+    rows = 0
+
+    def batches():
+        nonlocal rows
+        for chunk in iter_chunks(csv_path, chunksize, country=None):
+            chunk, _ = canonicalize_answers(chunk, answer_map)
+            if wave is not None:
+                chunk = chunk.assign(wave=str(wave))
+            rows += len(chunk)
+            yield from pa.Table.from_pandas(chunk, schema=schema, preserve_index=False).to_batches()
+
+    ds.write_dataset(batches(), root, schema=schema, format='parquet', partitioning=_partitioning(pa, ds, keys),
+                     basename_template='part-{i}.parquet', existing_data_behavior='delete_matching',
+                     preserve_order=True,
+                     max_rows_per_group=ROW_GROUP_ROWS, min_rows_per_group=min(ROW_GROUP_ROWS, chunksize))
+    return rows
+
+
+def _open(root, country=None, gender=None, wave=None):
+    # (dataset, filter expression or None) for the equality filters given
+    pa, ds = _arrow()
+    dataset = ds.dataset(root, format='parquet', partitioning=_partitioning(pa, ds, PARTITION_KEYS))
+    expression = None
+    for name, value in (('country', country), ('wave', wave), ('gender', gender)):
+        if value is not None:
+            term = ds.field(name) == str(value)
+            expression = term if expression is None else expression & term
+    return dataset, expression
+
+
+def load_partitioned(root=PARQUET_DIR, country=None, gender=None, wave=None, columns=None):
+    """Renamed survey DataFrame read from a ``write_partitioned`` dataset.
+
+    ``country`` and ``wave`` select partition directories, ``gender`` is
+    filtered during the scan, before rows become pandas objects, and
+    ``columns`` (default: every survey column) limits what is read. The
+    result matches ``filter_country(rename_columns(load_survey()), country)``
+    restricted to ``columns``.
+    """
+    dataset, expression = _open(root, country, gender, wave)
+    columns = NEW_COLUMNS if columns is None else list(dict.fromkeys(columns))
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def partition_files(root=PARQUET_DIR, country=None, wave=None):
+    """Sorted paths of the Parquet files a ``country``/``wave`` load reads."""
+    dataset, expression = _open(root, country, wave=wave)
+    return sorted(fragment.path for fragment in dataset.get_fragments(filter=expression))
@@ -0,0 +1,166 @@
+"""Regional rollups of the ``zip_code`` column.
+
+Indian PIN codes are six digits: the first is the postal zone, the first
+two the sub-zone (postal circle) and the first three the sorting district.
+``RegionIndex`` parses each distinct zip code once, stores every
+respondent's PIN as an integer, and derives the three prefixes by integer
+division. Grouped tallies are one ``np.bincount`` per question, and a
+stable argsort of the PINs answers prefix queries with ``searchsorted``.
+
+Zip codes that are not valid PINs are kept out of every region and
+listed by ``malformed()`` with a reason, instead of raising.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .schema import NEW_COLUMNS
+from .tally import column_codes
+
+PIN_DIGITS = 6
+# Prefix length of each rollup level
+LEVELS = {'zone': 1, 'subzone': 2, 'district': 3}
+
+ZONES = {
+    '1': 'Delhi, Haryana, Punjab, Himachal Pradesh, Jammu & Kashmir, Chandigarh',
+    '2': 'Uttar Pradesh, Uttarakhand',
+    '3': 'Rajasthan, Gujarat, Daman & Diu, Dadra & Nagar Haveli',
+    '4': 'Maharashtra, Madhya Pradesh, Chhattisgarh, Goa',
+    '5': 'Andhra Pradesh, Telangana, Karnataka',
+    '6': 'Tamil Nadu, Kerala, Puducherry, Lakshadweep',
+    '7': 'West Bengal, Odisha, North Eastern states, Andaman & Nicobar',
+    '8': 'Bihar, Jharkhand',
+    '9': 'Army Postal Service',
+}
+
+# Postal circle of each two-digit sub-zone
+POSTAL_CIRCLES = {
+    '11': 'Delhi', '12': 'Haryana', '13': 'Haryana', '14': 'Punjab', '15': 'Punjab',
+    '16': 'Punjab', '17': 'Himachal Pradesh', '18': 'Jammu & Kashmir', '19': 'Jammu & Kashmir',
+    **{str(prefix): 'Uttar Pradesh' for prefix in range(20, 29)},
+    '24': 'Uttarakhand', '26': 'Uttarakhand',
+    '30': 'Rajasthan', '31': 'Rajasthan', '32': 'Rajasthan', '33': 'Rajasthan', '34': 'Rajasthan',
+    '36': 'Gujarat', '37': 'Gujarat', '38': 'Gujarat', '39': 'Gujarat',
+    '40': 'Maharashtra', '41': 'Maharashtra', '42': 'Maharashtra', '43': 'Maharashtra',
+    '44': 'Maharashtra', '45': 'Madhya Pradesh', '46': 'Madhya Pradesh', '47': 'Madhya Pradesh',
+    '48': 'Madhya Pradesh', '49': 'Chhattisgarh',
+    '50': 'Telangana', '51': 'Andhra Pradesh', '52': 'Andhra Pradesh', '53': 'Andhra Pradesh',
+    '56': 'Karnataka', '57': 'Karnataka', '58': 'Karnataka', '59': 'Karnataka',
+    '60': 'Tamil Nadu', '61': 'Tamil Nadu', '62': 'Tamil Nadu', '63': 'Tamil Nadu',
+    '64': 'Tamil Nadu', '67': 'Kerala', '68': 'Kerala', '69': 'Kerala',
+    '70': 'West Bengal', '71': 'West Bengal', '72': 'West Bengal', '73': 'West Bengal',
+    '74': 'West Bengal', '75': 'Odisha', '76': 'Odisha', '77': 'Odisha', '78': 'Assam',
+    '79': 'North Eastern', '80': 'Bihar', '81': 'Bihar', '82': 'Bihar', '83': 'Jharkhand',
+    '84': 'Bihar', '85': 'Bihar',
+    **{str(prefix): 'Army Postal Service' for prefix in range(90, 100)},
+}
+
+REGION_COLUMNS = ['question', 'answer', 'region', 'region_name', 'count', 'share']
+
+
+def parse_pins(values):
+    """Integer PINs (0 where invalid) and the reason each invalid value was rejected.
+
+    Vectorized over any array-like of zip codes; spaces inside a code
+    (``'560 001'``) are ignored.
+    """
+    values = pd.Series(values, dtype=object)
+    text = values.astype(str).str.replace(' ', '', regex=False).str.removesuffix('.0')
+    digits = text.str.fullmatch(r'\d+').fillna(False).to_numpy(dtype=bool)
+    numbers = pd.to_numeric(text.where(digits), errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+
+    reasons = np.full(len(values), None, dtype=object)
+    reasons[~digits] = 'not numeric'
+    reasons[digits & (text.str.len().to_numpy() != PIN_DIGITS)] = f'not {PIN_DIGITS} digits'
+    reasons[digits & (text.str.len().to_numpy() == PIN_DIGITS) & (numbers < 10 ** (PIN_DIGITS - 1))] = 'zone 0'
+    reasons[values.isna().to_numpy()] = 'missing'
+    pins = np.where(reasons == None, numbers, 0).astype(np.uint32)  # noqa: E711
+    return pins, reasons
+
+
+class RegionIndex:
+    """Integer PINs of every respondent with zone, sub-zone and district codes."""
+
+    def __init__(self, pins, zip_codes, reasons):
+        self.pins = pins
+        self.valid = pins > 0
+        # Raw zip code and rejection reason (None when valid) of every row
+        self._zip_codes = zip_codes
+        self._reasons = reasons
+        self.order = np.argsort(pins, kind='stable')
+        self.sorted_pins = pins[self.order]
+        self.prefixes, self.codes = {}, {}
+        for level, digits in LEVELS.items():
+            prefix = pins // 10 ** (PIN_DIGITS - digits)
+            # Prefixes are bounded by 10 ** digits, so a dense lookup table
+            # replaces a sort: codes index the sorted distinct prefixes
+            present = np.bincount(prefix[self.valid], minlength=10 ** digits) > 0
+            lookup = np.cumsum(present, dtype=np.int32) - 1
+            self.prefixes[level] = np.flatnonzero(present)
+            self.codes[level] = np.where(self.valid, lookup[prefix], -1).astype(np.int32)
+
+    @classmethod
+    def build(cls, df, column='zip_code'):
+        """Index a renamed DataFrame or ``EncodedSurvey``, parsing each distinct value once."""
+        codes, labels = column_codes(df, column)
+        pins, reasons = parse_pins(labels)
+        # A trailing entry for missing values, so code -1 indexes it directly
+        pins, reasons = np.append(pins, np.uint32(0)), np.append(reasons, 'missing')
+        zip_codes = np.append(labels, None)
+        return cls(pins[codes], zip_codes[codes], reasons[codes])
+
+    def __len__(self):
+        return len(self.pins)
+
+    def labels(self, level):
+        """Prefix strings of ``level`` in code order, e.g. ``['1', '4', '5']`` for zones."""
+        return [str(prefix) for prefix in self.prefixes[level]]
+
+    def names(self, level):
+        """Zone or postal circle name of every ``level`` prefix."""
+        return [ZONES.get(label) if level == 'zone' else POSTAL_CIRCLES.get(label[:2])
+                for label in self.labels(level)]
+
+    def rows(self, prefix):
+        """Row indices of respondents whose PIN starts with ``prefix`` (e.g. ``'56'``)."""
+        scale = 10 ** (PIN_DIGITS - len(prefix))
+        low, high = np.searchsorted(self.sorted_pins, [int(prefix) * scale, (int(prefix) + 1) * scale])
+        return np.sort(self.order[low:high])
+
+    def malformed(self):
+        """Rows whose zip code is not a valid PIN, with the value and the reason."""
+        rows = np.flatnonzero(~self.valid)
+        return pd.DataFrame({'row': rows, 'zip_code': self._zip_codes[rows],
+                             'reason': self._reasons[rows]})
+
+    def region_counts(self, level='zone'):
+        """Respondents per ``level`` prefix, in prefix order."""
+        counts = np.bincount(self.codes[level][self.valid], minlength=len(self.prefixes[level]))
+        return pd.DataFrame({'region': self.labels(level), 'region_name': self.names(level),
+                             'count': counts})
+
+    def tally(self, df, questions=None, level='zone'):
+        """Answer counts of each question per region, like ``tally`` with region as the split.
+
+        ``share`` is the share of the question's answers within the region.
+        Respondents with a malformed PIN are left out.
+        """
+        questions = [question for question in (NEW_COLUMNS if questions is None else questions)
+                     if question != 'zip_code']
+        region_codes = self.codes[level]
+        n_regions = len(self.prefixes[level])
+        labels, names = np.asarray(self.labels(level), dtype=object), np.asarray(self.names(level), dtype=object)
+        frames = []
+        for question in questions:
+            codes, answers = column_codes(df, question)
+            keep = (codes >= 0) & (region_codes >= 0)
+            counts = np.bincount(codes[keep] * n_regions + region_codes[keep],
+                                 minlength=len(answers) * n_regions).reshape(len(answers), n_regions)
+            totals = counts.sum(axis=0)
+            answer, region = np.nonzero(counts)
+            frames.append(pd.DataFrame({
+                'question': question, 'answer': answers[answer],
+                'region': labels[region], 'region_name': names[region],
+                'count': counts[answer, region], 'share': counts[answer, region] / totals[region],
+            }))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=REGION_COLUMNS)
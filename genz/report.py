@@ -0,0 +1,210 @@
+"""Headless batch report: every Hypothesis.py figure in one HTML file.
+
+Figures are described by ``REPORT_FIGURES`` and built from a ``tally``
+table plus the multi-select option index. Building each figure and
+serializing it to JSON runs in a process pool; the page then loads
+plotly.js once and draws all figures from one bulk JSON array. With a
+``genz.cache.BuildCache`` only figures whose counts or spec changed are
+rebuilt.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+
+from .cache import CACHE_FORMAT, code_digest, digest
+from .dashboard import plotly_script, size_report
+from .profiling import profiled
+from .tally import question_counts
+
+# One entry per figure, in report order. 'source' selects the counts:
+# 'all' = every participant, 'india' = Indian participants,
+# 'options' = per-option counts of a multi-select question.
+REPORT_FIGURES = [
+    {'key': 'participants', 'source': 'all', 'title': 'Distribution of Participants: Country and Gender',
+     'width': 1000, 'height': 350},
+    {'key': 'gender', 'question': 'gender', 'source': 'india', 'title': 'Gender Distribution of Indian Participants',
+     'legend_title': 'Gender', 'width': 800, 'height': 300},
+    {'key': 'career_factors', 'question': 'career_factors', 'source': 'india',
+     'title': 'Distribution of Career Factors Influencing Aspirations', 'legend_title': 'Career Factors',
+     'width': 800, 'height': 350},
+    {'key': 'higher_ed_abroad', 'question': 'higher_ed_abroad', 'source': 'india',
+     'title': 'Willingness to Pursue Higher Education Abroad (Self-Sponsored)', 'legend_title': 'Response',
+     'width': 800, 'height': 300},
+    {'key': 'long_term_employer', 'question': 'long_term_employer', 'source': 'india',
+     'title': 'Likelihood of Working for One Employer for 3+ Years', 'legend_title': 'Likelihood',
+     'width': 800, 'height': 300},
+    {'key': 'unclear_mission', 'question': 'unclear_mission', 'source': 'india',
+     'title': 'Willingness to Work for a Company with an Unclear Mission', 'legend_title': 'Response',
+     'width': 600, 'height': 300},
+    {'key': 'misaligned_mission', 'question': 'misaligned_mission', 'source': 'india',
+     'title': 'Likelihood of Working for a Company with a Misaligned Mission', 'legend_title': 'Response',
+     'width': 600, 'height': 300},
+    {'key': 'no_social_impact', 'question': 'no_social_impact', 'source': 'india',
+     'title': 'Likelihood of not Working for a Company with a social impact Mission', 'legend_title': 'Response',
+     'width': 800, 'height': 350},
+    {'key': 'work_env', 'question': 'work_env', 'source': 'india', 'title': 'Preferred Working Environment',
+     'legend_title': 'Work Environment', 'width': 800, 'height': 300},
+    {'key': 'employer_choice', 'question': 'employer_choice', 'source': 'india', 'title': 'Preferred Employer Choice',
+     'legend_title': 'Employer', 'width': 1000, 'height': 350},
+    {'key': 'learning_env', 'question': 'learning_env', 'source': 'options', 'title': 'Preferred Learning Environment',
+     'legend_title': 'Learning Environment', 'width': 1000, 'height': 350},
+    {'key': 'asp_job', 'question': 'asp_job', 'source': 'options', 'title': 'Aspirational Job Preferences',
+     'legend_title': 'Aspirational Job', 'width': 1400, 'height': 500, 'legend_font_size': 8},
+    {'key': 'manager_type', 'question': 'manager_type', 'source': 'india', 'title': 'Preferred Manager Type',
+     'legend_title': 'Manager Type', 'width': 900, 'height': 400, 'legend_font_size': 8},
+    {'key': 'work_setup', 'question': 'work_setup', 'source': 'options', 'title': 'Preferred Work Setup',
+     'legend_title': 'Work Setup', 'width': 1200, 'height': 400, 'legend_font_size': 8},
+]
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Career Preferences Report: Gen Z Edition</title>
+    {plotly_script}
+</head>
+<body>
+{figure_divs}
+    <script>
+        const figures = {figures_json};
+        figures.forEach((fig, i) => Plotly.newPlot('figure-' + i, fig.data, fig.layout));
+    </script>
+</body>
+</html>
+"""
+
+
+def _series(counts):
+    # Plain lists so the counts pickle cheaply into worker processes
+    return counts.iloc[:, 0].tolist(), counts['count'].tolist()
+
+
+def figure_data(tallies, multi_select, country='India'):
+    """Labels and values for every figure in ``REPORT_FIGURES``, keyed by figure key."""
+    data = {}
+    for spec in REPORT_FIGURES:
+        if spec['key'] == 'participants':
+            data['participants'] = {
+                'country': _series(question_counts(tallies, 'country')),
+                'gender': _series(question_counts(tallies, 'gender')),
+            }
+        elif spec['source'] == 'options':
+            data[spec['key']] = _series(multi_select[spec['question']].option_counts())
+        else:
+            filters = {'country': country} if spec['source'] == 'india' else {}
+            data[spec['key']] = _series(question_counts(tallies, spec['question'], **filters))
+    return data
+
+
+def participants_figure(spec, data):
+    """Country and gender pies side by side, as in the first report section."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(
+        rows=1, cols=2,
+        specs=[[{'type': 'pie'}, {'type': 'pie'}]],
+        subplot_titles=['Participants by Country', 'Participants by Gender'],
+        horizontal_spacing=0.4
+    )
+    for col, (name, (labels, values), x) in enumerate([
+        ('Country', data['country'], [0, 0.45]),
+        ('Gender', data['gender'], [0.55, 1]),
+    ], start=1):
+        fig.add_trace(go.Pie(labels=labels, values=values, textinfo='percent', textposition='inside',
+                             name=name, showlegend=True, domain=dict(x=x, y=[0, 1])), row=1, col=col)
+    fig.update_layout(
+        title_text=spec['title'], width=spec['width'], height=spec['height'],
+        legend=dict(title='', yanchor="middle", y=0.5, xanchor="left", x=0.25),
+        margin=dict(t=100, b=50, l=50, r=150)
+    )
+    fig.update_traces(legendgroup='country', selector=dict(name='Country'))
+    fig.update_traces(legendgroup='gender', legend='legend2', selector=dict(name='Gender'))
+    return fig
+
+
+def pie_figure(spec, data):
+    """Single pie with percentages inside and the legend on the right."""
+    import plotly.graph_objects as go
+
+    labels, values = data
+    fig = go.Figure(go.Pie(labels=labels, values=values, textinfo='percent', textposition='inside'))
+    legend = dict(yanchor="middle", y=0.5, xanchor="left", x=1.1)
+    if 'legend_font_size' in spec:
+        legend['font'] = dict(size=spec['legend_font_size'])
+    fig.update_layout(
+        title_text=spec['title'], width=spec['width'], height=spec['height'],
+        legend_title_text=spec['legend_title'], legend=legend,
+        margin=dict(t=50, b=50, l=50, r=150)
+    )
+    return fig
+
+
+def build_figure(spec, data):
+    """Plotly figure for one ``REPORT_FIGURES`` entry."""
+    if spec['key'] == 'participants':
+        return participants_figure(spec, data)
+    return pie_figure(spec, data)
+
+
+def _figure_json(args):
+    # Pool worker: build one figure and serialize it for a <script> block
+    spec, data = args
+    return build_figure(spec, data).to_json().replace('</', '<\\/')
+
+
+def _build_figures(jobs, processes):
+    # Serialize (spec, data) jobs, in a pool unless processes == 1
+    if processes == 1:
+        return [_figure_json(job) for job in jobs]
+    # Fork where available so workers do not re-run the calling script
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count(), mp_context=context) as pool:
+        return list(pool.map(_figure_json, jobs))
+
+
+@profiled('build_figures')
+def figures_json(data, processes=None, cache=None):
+    """Serialized figures in report order, built across ``processes`` workers.
+
+    ``processes=1`` builds everything in the current process. With a
+    ``BuildCache`` figures are keyed by their spec, counts and the plotly
+    version, and only the ones not built before are rebuilt.
+    """
+    jobs = [(spec, data[spec['key']]) for spec in REPORT_FIGURES]
+    if cache is None:
+        return _build_figures(jobs, processes)
+
+    version = metadata.version('plotly')
+    keys = [digest(CACHE_FORMAT, code_digest(), version, spec, figure_data) for spec, figure_data in jobs]
+    figures = [cache.get('figures', key) for key in keys]
+    stale = [i for i, figure in enumerate(figures) if figure is None]
+    if stale:
+        for i, figure in zip(stale, _build_figures([jobs[i] for i in stale], processes)):
+            figures[i] = cache.put('figures', keys[i], figure)
+    return figures
+
+
+@profiled('write_report')
+def write_report(tallies, multi_select, path='report.html', country='India', processes=None, plotly='cdn',
+                 cache=None):
+    """Write every report figure into one HTML file and return its size report.
+
+    plotly.js is included exactly once (linked, or inlined with
+    ``plotly='inline'``) and all figure JSON is embedded as one array.
+    A ``BuildCache`` reuses the JSON of figures whose counts did not change.
+    """
+    serialized = figures_json(figure_data(tallies, multi_select, country), processes, cache)
+    script, source = plotly_script(plotly)
+    figure_divs = '\n'.join(f'    <div id="figure-{i}"></div>' for i in range(len(serialized)))
+    html_content = REPORT_TEMPLATE.format(
+        plotly_script=script,
+        figure_divs=figure_divs,
+        figures_json='[' + ','.join(serialized) + ']',
+    )
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    return {'path': str(path), 'figures': len(serialized), 'plotly': source,
+            **size_report(html_content, budget=None)}
@@ -0,0 +1,104 @@
+"""Survey schema: original question headers, short column names and labels."""
+
+from pathlib import Path
+
+# Repository layout
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT / "data"
+DATA_PATH = DATA_DIR / "GenZ.csv"
+COLUMN_MAPPING_PATH = DATA_DIR / "column_mapping.csv"
+ANSWER_MAPPING_PATH = DATA_DIR / "answer_mapping.csv"
+# Country-partitioned Parquet copy of the survey (git-ignored), see genz.partitioned
+PARQUET_DIR = DATA_DIR / "parquet"
+# Append-only segments written by the live ingest endpoint (git-ignored), see genz.ingest
+SEGMENTS_DIR = DATA_DIR / "segments"
+# Content-addressed build outputs (git-ignored), see genz.cache
+CACHE_DIR = ROOT / ".cache"
+
+# Original column names
+ORIGINAL_COLUMNS = [
+    'Your Current Country.',
+    'Your Current Zip Code / Pin Code',
+    'Your Gender',
+    'Which of the below factors influence the most about your career aspirations ?',
+    'Would you definitely pursue a Higher Education / Post Graduation outside of India ? If only you have to self sponsor it.',
+    'How likely is that you will work for one employer for 3 years or more ?',
+    'Would you work for a company whose mission is not clearly defined and publicly posted.',
+    'How likely would you work for a company whose mission is misaligned with their public actions or even their product ?',
+    'How likely would you work for a company whose mission is not bringing social impact ?',
+    'What is the most preferred working environment for you.',
+    'Which of the below Employers would you work with.',
+    'Which type of learning environment that you are most likely to work in ?',
+    'Which of the below careers looks close to your Aspirational job ?',
+    'What type of Manager would you work without looking into your watch ?',
+    'Which of the following setup you would like to work ?'
+]
+
+# New short names
+NEW_COLUMNS = ['country', 'zip_code', 'gender', 'career_factors', 'higher_ed_abroad',
+               'long_term_employer', 'unclear_mission', 'misaligned_mission',
+               'no_social_impact', 'work_env', 'employer_choice', 'learning_env',
+               'asp_job', 'manager_type', 'work_setup']
+
+# col_map (short name -> original name)
+COL_MAP = dict(zip(NEW_COLUMNS, ORIGINAL_COLUMNS))
+
+# Columns parsed as numbers rather than answer text
+NUMERIC_COLUMNS = ['zip_code', 'no_social_impact']
+
+# Fixed option vocabulary of the multi-select questions, in bit order.
+# Answers are stored comma-joined, and some options contain commas themselves.
+MULTI_SELECT_OPTIONS = {
+    'employer_choice': [
+        'Employer who rewards learning and enables that environment',
+        'Employer who appreciates learning and enables that environment',
+        'Employer who pushes your limits by enabling an learning environment, and rewards you at the end',
+        "Employer who pushes your limits and doesn't enables learning environment and never rewards you",
+        "Employers who appreciates learning but doesn't enables an learning environment",
+    ],
+    'learning_env': [
+        'Self Paced Learning Portals',
+        'Instructor or Expert Learning Programs',
+        'Learning by observing others',
+        'Trial and error by doing side projects within the company',
+    ],
+    'asp_job': [
+        'Business Operations in any organization',
+        'Build and develop a Team',
+        'Work as a freelancer and do my thing my way',
+        'Look deeply into Data and generate insights',
+        'Design and Develop amazing software',
+        'Manage and drive End-to-End Projects or Products',
+        'Design and Creative strategy in any company',
+        'Teaching in any of the institutes/online or Offline',
+        'Become a content Creator in some platform',
+        'Work in a BPO setup for some well known client',
+    ],
+    'work_setup': [
+        'Work alone',
+        'Work with 2 to 3 people in my team',
+        'Work with 5 to 6 people in my team',
+        'Work with 7 to 10 or more people in my team',
+        'Work with more than 10 people in my team',
+    ],
+}
+MULTI_SELECT_COLUMNS = list(MULTI_SELECT_OPTIONS)
+
+# Demographic columns the answers are split by
+DIMENSIONS = ['gender', 'country']
+
+# Questions shown in the dashboard (short name -> dropdown label)
+QUESTIONS = {
+    'career_factors': 'Which factors influence your career aspirations most?',
+    'higher_ed_abroad': 'Would you pursue higher education abroad if self-sponsored?',
+    'long_term_employer': 'How likely to work for one employer for 3+ years?',
+    'unclear_mission': 'Would you work for a company with an unclear mission?',
+    'misaligned_mission': 'How likely to work for a company with a misaligned mission?',
+    'no_social_impact': 'How likely to work for a company with no social impact?',
+    'work_env': 'What is your most preferred working environment?',
+    'employer_choice': 'Which employers would you work with?',
+    'learning_env': 'Which learning environment do you prefer?',
+    'asp_job': 'Which career is closest to your aspirational job?',
+    'manager_type': 'What type of manager would you work for without watching the clock?',
+    'work_setup': 'Which work setup do you prefer?'
+}
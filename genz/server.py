@@ -0,0 +1,180 @@
+"""Local HTTP aggregation service for the dashboard.
+
+``GET /counts?question=...&gender=...&top=N&view=top|bottom`` answers from
+an in-memory index of answer counts, sorted once per (question, gender) at
+start-up. Every response carries an ETag derived from the data version and
+the normalized query, and a matching ``If-None-Match`` gets ``304 Not
+Modified`` without a body. ``serve(approximate=True)`` streams the CSV into
+bounded-memory ``AnswerSketch``es instead (see ``genz.sketches``).
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .answers import AnswerMap, canonicalize_answers
+from .dashboard import CELL_KEY_SEPARATOR, build_cube
+from .data import filter_country
+from .encoding import load_encoded
+from .schema import DATA_PATH, QUESTIONS
+from .sketches import ALL, DEFAULT_CAPACITY, VIEWS, sketch_answers
+
+
+class CountsIndex:
+    """Answer counts per (question, gender), sorted most frequent first."""
+
+    def __init__(self, survey, questions=QUESTIONS):
+        cube = build_cube(survey, questions, by=['gender'])
+        self.version = hashlib.sha1(json.dumps(cube, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.sorted = {}
+        for question, entry in cube['questions'].items():
+            totals = [0] * len(entry['labels'])
+            for key, values in entry['cells'].items():
+                gender = key.split(CELL_KEY_SEPARATOR)[0]
+                self.sorted[question, gender] = self._sort(entry['labels'], values)
+                totals = [total + value for total, value in zip(totals, values)]
+            self.sorted[question, ALL] = self._sort(entry['labels'], totals)
+        self.response = lru_cache(maxsize=4096)(self._response)
+
+    @staticmethod
+    def _sort(labels, values):
+        pairs = [(label, value) for label, value in zip(labels, values) if value > 0]
+        return sorted(pairs, key=lambda pair: -pair[1])
+
+    @staticmethod
+    def _check_query(known, question, gender, top, view):
+        if not known:
+            raise KeyError(f"Unknown question/gender: {question!r}/{gender!r}")
+        if top < 1:
+            raise ValueError(f"top must be at least 1, got {top}")
+        if view not in VIEWS:
+            raise ValueError(f"view must be 'top' or 'bottom', got {view!r}")
+
+    def counts(self, question, gender=ALL, top=3, view='top'):
+        """Top or bottom ``top`` answers as a JSON-ready dict."""
+        self._check_query((question, gender) in self.sorted, question, gender, top, view)
+        pairs = self.sorted[question, gender]
+        pairs = pairs[:top] if view == 'top' else pairs[::-1][:top]
+        return {
+            'question': question, 'gender': gender, 'view': view, 'top': top,
+            'labels': [label for label, _ in pairs],
+            'values': [value for _, value in pairs],
+        }
+
+    def _response(self, question, gender, top, view):
+        # (ETag, body) for one normalized query; memoized per index
+        body = json.dumps(self.counts(question, gender, top, view), separators=(',', ':')).encode('utf-8')
+        etag = '"' + hashlib.sha1(f'{self.version}:{question}:{gender}:{view}:{top}'.encode('utf-8')).hexdigest()[:20] + '"'
+        return etag, body
+
+
+class SketchIndex(CountsIndex):
+    """``CountsIndex`` over ``AnswerSketch``es: approximate counts from bounded memory.
+
+    Multi-select questions are counted per answered combination of options.
+    Responses add ``min_values``, the guaranteed lower bounds of ``values``,
+    and ``max_error``.
+    """
+
+    def __init__(self, sketches):
+        self.sketches = sketches
+        state = json.dumps({question: sketch.to_dict() for question, sketch in sketches.items()}, sort_keys=True)
+        self.version = hashlib.sha1(state.encode('utf-8')).hexdigest()[:16]
+        self.response = lru_cache(maxsize=4096)(self._response)
+
+    def counts(self, question, gender=ALL, top=3, view='top'):
+        """Top or bottom ``top`` answers with their bounds as a JSON-ready dict."""
+        sketch = self.sketches.get(question)
+        self._check_query(sketch is not None and gender in sketch.groups, question, gender, top, view)
+        table = sketch.counts(gender, top, view)
+        return {
+            'question': question, 'gender': gender, 'view': view, 'top': top,
+            'labels': [str(label) for label in table[question]],
+            'values': table['count'].tolist(),
+            'min_values': table['min_count'].tolist(),
+            'max_error': table.attrs['max_error'],
+        }
+
+
+def make_handler(index):
+    """Request handler class bound to one ``CountsIndex``."""
+
+    class CountsHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls
+        disable_nagle_algorithm = True
+
+        def _send(self, status, body=b'', etag=None):
+            self.send_response(status)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Cache-Control', 'no-cache')
+            if etag:
+                self.send_header('ETag', etag)
+            if body:
+                self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def _error(self, status, message):
+            self._send(status, json.dumps({'error': message}).encode('utf-8'))
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path != '/counts':
+                return self._error(404, f'Unknown path {url.path}')
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                top = int(params.get('top', 3))
+                etag, body = index.response(params.get('question', ''), params.get('gender', ALL),
+                                            top, params.get('view', 'top'))
+            except (KeyError, ValueError) as error:
+                return self._error(400, error.args[0])
+            if etag in self.headers.get('If-None-Match', ''):
+                return self._send(304, etag=etag)
+            self._send(200, body, etag)
+
+        def log_message(self, format, *args):
+            # Keep load tests quiet; errors are still reported through the response
+            pass
+
+    return CountsHandler
+
+
+def make_server(survey, host='127.0.0.1', port=8000, questions=QUESTIONS):
+    """HTTP server over a freshly built index; call ``serve_forever()`` on it."""
+    return ThreadingHTTPServer((host, port), make_handler(CountsIndex(survey, questions)))
+
+
+def serve(path=DATA_PATH, country='India', host='127.0.0.1', port=8000, approximate=False,
+          chunksize=None, capacity=DEFAULT_CAPACITY):
+    """Load, rename and filter the survey, then serve ``/counts`` until interrupted.
+
+    With ``approximate`` the CSV is streamed ``chunksize`` rows at a time
+    into ``AnswerSketch``es, so memory stays bounded however large it is.
+    """
+    if approximate:
+        from .streaming import DEFAULT_CHUNKSIZE, iter_chunks
+
+        answer_map = AnswerMap.from_csv()
+        chunks = (canonicalize_answers(chunk, answer_map)[0]
+                  for chunk in iter_chunks(path, chunksize or DEFAULT_CHUNKSIZE, country))
+        index = SketchIndex(sketch_answers(chunks, QUESTIONS, capacity))
+        server = ThreadingHTTPServer((host, port), make_handler(index))
+        description = f"approximate counts ({capacity} counters per question and gender)"
+    else:
+        survey, _ = canonicalize_answers(load_encoded(path))
+        if country is not None:
+            survey = filter_country(survey, country)
+        server = make_server(survey, host, port)
+        description = f"counts for {len(survey)} participants"
+    print(f"Serving {description} on http://{host}:{server.server_port}/counts")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,106 @@
+"""Map-reduce tallies over many CSV exports in parallel worker processes.
+
+Exports with the schema of ``data/GenZ.csv`` are cut into shards:
+line-aligned byte ranges of about equal size, so one large export is spread
+over several workers and small ones are not split further. Each worker
+tallies its shard into a partial ``AggregateState``: counts per question,
+gender and country, option counts and respondents. The partials are merged
+by adding counts, so the result equals a single-process tally exactly with
+no recomputation. Rows are validated per shard; a shard holding a repeat
+of an earlier shard's row is tallied again knowing that shard's rows, so
+duplicates are quarantined across shards and exports too. The result
+carries a watermark per export, so ``AggregateState.refresh`` can later
+count rows appended to one of them. Like ``refresh``, sharding assumes one
+response per line.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .aggregates import AggregateState, _watermark
+from .answers import AnswerMap
+from .profiling import profiled
+from .validation import RowHashes
+
+# Shards per worker process, so uneven shards still keep every worker busy
+SHARDS_PER_PROCESS = 4
+# Smallest shard worth sending to a worker
+MIN_SHARD_BYTES = 4 * 1024 * 1024
+
+
+def plan_shards(paths, n_shards, min_bytes=MIN_SHARD_BYTES):
+    """Line-aligned ``(path, start, end)`` byte ranges covering the rows of ``paths``.
+
+    The bytes after each header are cut into ranges of about
+    ``1 / n_shards`` of the total, but at least ``min_bytes``; each cut
+    moves forward to the next line start.
+    """
+    sizes = {str(path): os.path.getsize(path) for path in paths}
+    target = max(sum(sizes.values()) // max(n_shards, 1), min_bytes)
+    shards = []
+    for path, size in sizes.items():
+        with open(path, 'rb') as f:
+            start = len(f.readline())
+            while start < size:
+                if start + target < size:
+                    f.seek(start + target - 1)
+                    f.readline()
+                    end = f.tell()
+                else:
+                    end = size
+                shards.append((path, start, end))
+                start = end
+    return shards
+
+
+def _tally_shard(shard, seen=None):
+    # Pool worker: tally one byte range into a partial state, given the row hashes of earlier shards
+    path, start, end, answer_map = shard
+    state = AggregateState(answer_map)
+    if seen is not None:
+        state.seen = RowHashes(seen.recent.copy(), seen.window, seen.hashes.copy())
+    with open(path, 'rb') as f:
+        _, offset = state.apply_range(f, start, end)
+    return state, offset
+
+
+@profiled('tally_shards')
+def tally_shards(paths, processes=None, answer_map=None, min_bytes=MIN_SHARD_BYTES):
+    """Tally CSV exports across ``processes`` workers and merge the partial results.
+
+    ``processes=1`` tallies every shard in the current process. Returns an
+    ``AggregateState`` equal to counting all exports in one process, with
+    the watermark of each export.
+    """
+    answer_map = AnswerMap.from_csv() if answer_map is None else answer_map
+    processes = processes or os.cpu_count() or 1
+    shards = [(*shard, answer_map) for shard in plan_shards(paths, processes * SHARDS_PER_PROCESS, min_bytes)]
+    if processes == 1 or len(shards) <= 1:
+        partials = [_tally_shard(shard) for shard in shards]
+    else:
+        # Fork where available so workers do not re-run the calling script
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=min(processes, len(shards)), mp_context=context) as pool:
+            partials = list(pool.map(_tally_shard, shards))
+
+    # Shards were validated apart: tally again, in order, any that repeats an earlier shard's row
+    seen = RowHashes()
+    for index, shard in enumerate(shards):
+        if len(seen) and seen.repeated(partials[index][0].seen.recent).any():
+            partials[index] = _tally_shard(shard, seen)
+        seen.merge(partials[index][0].seen)
+
+    # Reduce: one concatenation and group-by per table, whatever the number of shards
+    merged = AggregateState(answer_map).merge(*(partial for partial, _ in partials))
+    rows, quarantined, offsets = {}, {}, {}
+    for (path, *_), (partial, offset) in zip(shards, partials):
+        rows[path] = rows.get(path, 0) + partial.rows
+        quarantined[path] = quarantined.get(path, 0) + partial.quarantined
+        offsets[path] = offset
+    for path in rows:
+        with open(path, 'rb') as f:
+            merged.watermarks[str(Path(path).resolve())] = _watermark(f, f.readline(), rows[path], offsets[path],
+                                                                      quarantined[path])
+    return merged
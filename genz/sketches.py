@@ -0,0 +1,254 @@
+"""Approximate answer counts in bounded memory, mergeable across files and time windows.
+
+Multi-select questions such as ``asp_job`` are answered with combinations
+of options, and the number of distinct combinations grows with the data.
+An ``AnswerSketch`` counts one question's answers per gender, and in total,
+in fixed memory using two summaries:
+
+- ``HeavyHitters`` is a Space-Saving style summary, kept in Misra-Gries
+  form, holding at most ``capacity`` counters. With ``N`` answers counted,
+  the true count of a kept answer lies in ``[low, low + max_error]``, where
+  ``max_error <= N / (capacity + 1)``. Every answer given more often than
+  ``max_error`` is kept. Merging two summaries keeps the bound for the
+  combined ``N`` (Agarwal et al., "Mergeable Summaries", 2012).
+- ``CountMinSketch`` is a ``depth x width`` table of counters. It never
+  underestimates, and it overestimates an answer by more than
+  ``e / width * N`` with probability at most ``exp(-depth)``. Merging adds
+  the tables.
+
+An answer's ``count`` is the smaller of its two upper bounds, and
+``min_count`` is its guaranteed lower bound. The top view ranks the kept
+answers by ``count``. The bottom view ranks the same answers from the
+rarest, because answers counted fewer than ``max_error`` times cannot be
+told apart in bounded memory. While a group has at most ``capacity``
+distinct answers nothing is dropped, ``max_error`` is 0, and both views
+are exact.
+"""
+
+import hashlib
+import json
+import math
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .schema import MULTI_SELECT_COLUMNS
+from .tally import column_codes
+
+# Group of every respondent, whatever their gender
+ALL = 'All'
+VIEWS = ('top', 'bottom')
+
+# Counters per group and Count-Min shape: ~(1 / 1024) of the answers at
+# most as heavy-hitter error, ~(e / 4096) as Count-Min error with
+# probability 1 - exp(-5) > 99%
+DEFAULT_CAPACITY = 1024
+DEFAULT_WIDTH = 4096
+DEFAULT_DEPTH = 5
+# Distinct answers whose hash columns are remembered
+HASH_CACHE_SIZE = 65_536
+
+
+class HeavyHitters:
+    """Space-Saving / Misra-Gries summary with at most ``capacity`` counters."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, counters=None, total=0):
+        self.capacity = capacity
+        # {answer: lower bound of its count}
+        self.counters = pd.Series(dtype='int64') if counters is None else counters
+        self.total = total
+
+    def update(self, counts):
+        """Fold in exact ``{answer: count}`` counts (a Series), e.g. of one chunk."""
+        return self._combine(counts, int(counts.sum()))
+
+    def merge(self, other):
+        """Fold in another summary; the error bound holds for the combined total."""
+        if other.capacity != self.capacity:
+            raise ValueError(f"Cannot merge summaries of capacity {self.capacity} and {other.capacity}")
+        return self._combine(other.counters, other.total)
+
+    def _combine(self, counters, total):
+        counters = self.counters.add(counters, fill_value=0).astype('int64')
+        if len(counters) > self.capacity:
+            # Subtract the (capacity + 1)-th largest counter from all and drop those left at zero
+            rank = len(counters) - self.capacity - 1
+            counters = counters - np.partition(counters.to_numpy(), rank)[rank]
+            counters = counters[counters > 0]
+        self.counters = counters
+        self.total += total
+        return self
+
+    @property
+    def max_error(self):
+        """Most any answer's true count can exceed its counter (0 while nothing was dropped)."""
+        return (self.total - int(self.counters.sum())) // (self.capacity + 1)
+
+
+class CountMinSketch:
+    """``depth x width`` counters; estimates never fall below the true count."""
+
+    def __init__(self, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH, seed=0, table=None):
+        self.width, self.depth, self.seed = width, depth, seed
+        self.table = np.zeros((depth, width), dtype=np.int64) if table is None else table
+        self._columns_of = lru_cache(maxsize=HASH_CACHE_SIZE)(self._hash_columns)
+
+    def _hash_columns(self, key):
+        # One column per row from two 64-bit hashes (Kirsch-Mitzenmacher double hashing)
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16, key=self.seed.to_bytes(8, 'little')).digest()
+        first, step = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return tuple((first + row * step) % self.width for row in range(self.depth))
+
+    def _columns(self, keys):
+        return np.array([self._columns_of(key) for key in keys], dtype=np.intp).reshape(len(keys), self.depth).T
+
+    def update(self, keys, counts):
+        """Add ``counts`` to the string ``keys``."""
+        columns = self._columns(keys)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+        return self
+
+    def estimate(self, keys):
+        """Upper bounds of the counts of ``keys``."""
+        columns = self._columns(keys)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def merge(self, other):
+        """Add another sketch of the same shape and seed."""
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError("Count-Min sketches differ in width, depth or seed")
+        self.table += other.table
+        return self
+
+    @property
+    def total(self):
+        return int(self.table[0].sum())
+
+    @property
+    def max_error(self):
+        """Overestimate exceeded with probability at most ``exp(-depth)``."""
+        return math.e / self.width * self.total
+
+
+def _key(group, label):
+    # Count-Min key of an answer within a gender group
+    return f'{group}\x1f{label}'
+
+
+class AnswerSketch:
+    """Approximate answer counts of one question, per gender and in total."""
+
+    def __init__(self, question, capacity=DEFAULT_CAPACITY, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH, seed=0):
+        self.question = question
+        self.capacity = capacity
+        # {gender or ALL: HeavyHitters}
+        self.groups = {}
+        self.frequencies = CountMinSketch(width, depth, seed)
+
+    @property
+    def genders(self):
+        return list(self.groups)
+
+    def update(self, survey):
+        """Count a renamed chunk of responses (DataFrame or EncodedSurvey)."""
+        codes, labels = column_codes(survey, self.question)
+        gender_codes, genders = column_codes(survey, 'gender')
+        answered = codes >= 0
+        groups = [(ALL, answered)] + [(gender, answered & (gender_codes == i)) for i, gender in enumerate(genders)]
+        for group, rows in groups:
+            counts = np.bincount(codes[rows], minlength=len(labels))
+            given = np.flatnonzero(counts)
+            self.groups.setdefault(group, HeavyHitters(self.capacity)).update(
+                pd.Series(counts[given], index=pd.Index(labels[given], dtype=object)))
+            self.frequencies.update([_key(group, label) for label in labels[given]], counts[given])
+        return self
+
+    def merge(self, other):
+        """Fold in the sketch of another file or time window."""
+        if other.question != self.question:
+            raise ValueError(f"Cannot merge sketches of {self.question!r} and {other.question!r}")
+        for group, summary in other.groups.items():
+            self.groups.setdefault(group, HeavyHitters(self.capacity)).merge(summary)
+        self.frequencies.merge(other.frequencies)
+        return self
+
+    def counts(self, gender=ALL, top=10, view='top'):
+        """Top or bottom ``top`` answers with ``count``, ``min_count`` and ``share``.
+
+        Same ``[question, 'count', 'share']`` layout as ``question_counts``;
+        ``attrs['max_error']`` holds the heavy-hitter error bound.
+        """
+        if view not in VIEWS:
+            raise ValueError(f"view must be 'top' or 'bottom', got {view!r}")
+        summary = self.groups[gender]
+        low = summary.counters
+        high = np.minimum(low.to_numpy() + summary.max_error,
+                          self.frequencies.estimate([_key(gender, label) for label in low.index]))
+        table = pd.DataFrame({self.question: low.index, 'count': high, 'min_count': low.to_numpy()})
+        table = table.sort_values(['count', 'min_count'], ascending=view == 'bottom', kind='stable')
+        table = table.head(top).reset_index(drop=True)
+        table['share'] = table['count'] / max(summary.total, 1)
+        table.attrs['max_error'] = summary.max_error
+        return table
+
+    def to_dict(self):
+        """JSON-ready summaries and Count-Min table."""
+        return {
+            'question': self.question,
+            'capacity': self.capacity,
+            'groups': {group: {'total': summary.total,
+                               'counters': list(zip(summary.counters.index.tolist(), summary.counters.tolist()))}
+                       for group, summary in self.groups.items()},
+            'width': self.frequencies.width,
+            'depth': self.frequencies.depth,
+            'seed': self.frequencies.seed,
+            'table': self.frequencies.table.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['question'], data['capacity'], data['width'], data['depth'], data['seed'])
+        for group, summary in data['groups'].items():
+            labels = [label for label, _ in summary['counters']]
+            counters = pd.Series([count for _, count in summary['counters']],
+                                 index=pd.Index(labels, dtype=object), dtype='int64')
+            sketch.groups[group] = HeavyHitters(data['capacity'], counters, summary['total'])
+        sketch.frequencies.table = np.array(data['table'], dtype=np.int64).reshape(data['depth'], data['width'])
+        return sketch
+
+
+def sketch_answers(chunks, questions=MULTI_SELECT_COLUMNS, capacity=DEFAULT_CAPACITY, width=DEFAULT_WIDTH,
+                   depth=DEFAULT_DEPTH, seed=0):
+    """``{question: AnswerSketch}`` over an iterable of renamed chunks, e.g. ``iter_chunks``."""
+    sketches = {question: AnswerSketch(question, capacity, width, depth, seed) for question in questions}
+    for chunk in chunks:
+        for sketch in sketches.values():
+            sketch.update(chunk)
+    return sketches
+
+
+def save_sketches(sketches, path):
+    """Write ``{question: AnswerSketch}`` as JSON."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({question: sketch.to_dict() for question, sketch in sketches.items()}, f)
+    return path
+
+
+def load_sketches(path):
+    """``{question: AnswerSketch}`` written by ``save_sketches``."""
+    with open(path, encoding='utf-8') as f:
+        return {question: AnswerSketch.from_dict(data) for question, data in json.load(f).items()}
+
+
+def merge_sketches(*sketch_sets):
+    """Merge ``{question: AnswerSketch}`` sets of several files or windows into the first."""
+    merged = sketch_sets[0]
+    for sketches in sketch_sets[1:]:
+        for question, sketch in sketches.items():
+            if question in merged:
+                merged[question].merge(sketch)
+            else:
+                merged[question] = sketch
+    return merged
@@ -0,0 +1,117 @@
+"""Chunked, constant-memory ingestion of the survey CSV.
+
+The CSV is read ``chunksize`` rows at a time; each chunk is validated,
+renamed, filtered to one country and tallied, and only the small tally
+table is kept in a ``TallyAccumulator``. Peak memory therefore depends on
+the chunk size and the number of answer categories, not on the size of the
+file. The hashes that catch duplicate submissions are capped at
+``DUPLICATE_WINDOW`` rows, and quarantined rows are appended to the
+quarantine file chunk by chunk rather than held until the end.
+"""
+
+from contextlib import closing
+
+import pandas as pd
+
+from .data import filter_country, rename_columns
+from .schema import COL_MAP, DATA_PATH, DIMENSIONS, NUMERIC_COLUMNS
+from .tally import add_shares, tally
+from .validation import QUARANTINE_COLUMNS, iter_validated, write_quarantine
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class TallyAccumulator:
+    """Running ``tally`` table that chunk tallies are folded into."""
+
+    def __init__(self, questions=None, by=DIMENSIONS):
+        self.questions = questions
+        self.by = list(by)
+        self.keys = ['question', 'answer', *self.by]
+        self.rows = 0
+        self._counts = pd.Series(dtype='int64')
+
+    def update(self, chunk):
+        """Tally a renamed chunk of responses and fold it in."""
+        self.add_table(tally(chunk, self.questions, self.by))
+        self.rows += len(chunk)
+        return self
+
+    def retract(self, chunk):
+        """Tally a chunk of responses counted earlier and take it back out."""
+        self.add_table(tally(chunk, self.questions, self.by), sign=-1)
+        self.rows -= len(chunk)
+        return self
+
+    def add_table(self, table, sign=1):
+        """Fold an existing ``tally`` table into the running counts (``sign=-1`` subtracts it).
+
+        Raises ``ValueError``, leaving the counts unchanged, if a count would
+        drop below zero.
+        """
+        counts = table.groupby(self.keys, sort=False, dropna=False)['count'].sum() * sign
+        if not self._counts.empty:
+            counts = pd.concat([self._counts, counts]).groupby(
+                level=self.keys, sort=False, dropna=False).sum()
+        if (counts < 0).any():
+            raise ValueError(f"Retracted counts exceed the accumulated counts for "
+                             f"{counts[counts < 0].index.tolist()[:5]}")
+        self._counts = counts
+        return self
+
+    def merge(self, *others):
+        """Fold other accumulators into this one, all in one pass."""
+        counts = [counts for counts in (self._counts, *(other._counts for other in others)) if not counts.empty]
+        if counts:
+            self._counts = pd.concat(counts).groupby(level=self.keys, sort=False, dropna=False).sum()
+        self.rows += sum(other.rows for other in others)
+        return self
+
+    def table(self):
+        """Tidy table with the same layout as ``tally``."""
+        if self._counts.empty:
+            return pd.DataFrame(columns=[*self.keys, 'count', 'share'])
+        table = self._counts[self._counts != 0].rename('count').reset_index()
+        return add_shares(table, self.by)
+
+
+def _validated_chunks(path, chunksize, dtype):
+    # Valid rows of each chunk; each chunk's quarantined rows are appended to the
+    # quarantine file as it is read, which the first chunk starts afresh
+    append = False
+    for chunk, quarantine in iter_validated(path, chunksize, dtype=dtype):
+        write_quarantine(quarantine, path, append=append)
+        append = True
+        if len(chunk):
+            yield chunk
+    if not append:
+        write_quarantine(pd.DataFrame(columns=QUARANTINE_COLUMNS), path)
+
+
+def iter_chunks(path=DATA_PATH, chunksize=DEFAULT_CHUNKSIZE, country='India', validate=True):
+    """Yield renamed (and, unless ``country`` is None, filtered) chunks of the CSV.
+
+    With ``validate``, rows failing a ``genz.validation`` check are left
+    out and appended to the CSV's quarantine file chunk by chunk.
+    """
+    dtype = {original: 'category' for short, original in COL_MAP.items()
+             if short not in NUMERIC_COLUMNS}
+    if validate:
+        chunks = _validated_chunks(path, chunksize, dtype)
+    else:
+        chunks = pd.read_csv(path, chunksize=chunksize, dtype=dtype)
+    with closing(chunks):
+        for chunk in chunks:
+            chunk = rename_columns(chunk)
+            if country is not None:
+                chunk = filter_country(chunk, country)
+            yield chunk
+
+
+def stream_tally(path=DATA_PATH, chunksize=DEFAULT_CHUNKSIZE, country='India',
+                 questions=None, by=DIMENSIONS):
+    """Tally the CSV chunk by chunk and return the filled accumulator."""
+    accumulator = TallyAccumulator(questions, by)
+    for chunk in iter_chunks(path, chunksize, country):
+        accumulator.update(chunk)
+    return accumulator
@@ -0,0 +1,50 @@
+"""Synthetic survey responses for scaling tests.
+
+Each column is sampled from the empirical distribution of the real
+data/GenZ.csv column, so synthetic files keep the 15 original headers, the
+answer vocabularies, the comma-joined multi-select combinations and the
+per-column marginal distributions. Columns are sampled independently.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .data import load_survey
+from .schema import DATA_PATH
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+
+def fit_marginals(df):
+    """``{column: (values, probabilities)}`` of every column of a survey frame."""
+    marginals = {}
+    for column in df.columns:
+        counts = df[column].value_counts()
+        marginals[column] = (np.asarray(counts.index, dtype=object),
+                             counts.to_numpy() / counts.sum())
+    return marginals
+
+
+def generate(n_rows, marginals=None, seed=0):
+    """DataFrame of ``n_rows`` synthetic responses with the original headers."""
+    marginals = fit_marginals(load_survey(DATA_PATH)) if marginals is None else marginals
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for column, (values, probabilities) in marginals.items():
+        codes = rng.choice(len(values), size=n_rows, p=probabilities)
+        columns[column] = pd.Categorical.from_codes(codes, categories=pd.Index(values, dtype=object))
+    return pd.DataFrame(columns)
+
+
+def write_synthetic(path, n_rows, seed=0, chunksize=DEFAULT_CHUNKSIZE):
+    """Write ``n_rows`` synthetic responses to a CSV in bounded-memory chunks."""
+    marginals = fit_marginals(load_survey(DATA_PATH))
+    # One child seed per chunk keeps the output reproducible for any chunk size
+    seeds = np.random.SeedSequence(seed).spawn(-(-n_rows // chunksize) or 1)
+    written = 0
+    for chunk_seed in seeds:
+        rows = min(chunksize, n_rows - written)
+        generate(rows, marginals, chunk_seed).to_csv(
+            path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += rows
+    return path
@@ -0,0 +1,138 @@
+"""Single-pass answer tallies for every survey column.
+
+``tally`` encodes every question column once, counts answers for all
+(question, answer, gender, country) cells with ``np.bincount`` and returns
+one tidy table. Report sections and the dashboard slice that table with
+``question_counts`` instead of running ``value_counts`` per question.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .profiling import profiled
+from .schema import DIMENSIONS, NEW_COLUMNS
+
+TALLY_COLUMNS = ['question', 'answer', *DIMENSIONS, 'count', 'share']
+
+
+def column_codes(df, column):
+    """Integer codes (-1 for missing) of a column and the labels they index into.
+
+    ``df`` is a renamed DataFrame or an ``EncodedSurvey``, whose stored codes
+    are returned without re-factorizing.
+    """
+    if isinstance(df, pd.DataFrame):
+        codes, labels = pd.factorize(df[column])
+    else:
+        codes, labels = df.factorize(column)
+    return codes, np.asarray(labels, dtype=object)
+
+
+def _group_ids(df, by):
+    # One group id per row for the combination of split dimensions
+    if not by:
+        return np.zeros(len(df), dtype=np.intp), [], ()
+    codes, labels = [], []
+    for dim in by:
+        if isinstance(df, pd.DataFrame):
+            dim_codes, dim_labels = pd.factorize(df[dim], use_na_sentinel=False)
+        else:
+            dim_codes, dim_labels = df.factorize(dim, use_na_sentinel=False)
+        codes.append(dim_codes)
+        labels.append(np.asarray(dim_labels, dtype=object))
+    shape = tuple(len(dim_labels) for dim_labels in labels)
+    return np.ravel_multi_index(codes, shape), labels, shape
+
+
+@profiled('tally')
+def tally(df, questions=None, by=DIMENSIONS, weights=None):
+    """Count every answer of every question, split by the ``by`` dimensions.
+
+    ``df`` is a renamed DataFrame or an ``EncodedSurvey``; the latter is
+    tallied straight from its stored codes.
+
+    Returns a tidy DataFrame with one row per non-empty
+    (question, answer, *by) cell, its ``count`` and its ``share`` of the
+    answers to that question within the same ``by`` group. With per-row
+    ``weights`` (see ``genz.weighting``) ``count`` is the weighted count.
+    """
+    questions = list(NEW_COLUMNS if questions is None else questions)
+    by = list(by)
+    group_ids, group_labels, group_shape = _group_ids(df, by)
+    n_groups = int(np.prod(group_shape)) if by else 1
+
+    # Encode each question and lay its answers out in one shared code space
+    encoded = [column_codes(df, question) for question in questions]
+    sizes = np.array([len(labels) for _, labels in encoded], dtype=np.intp)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    counts = np.zeros((offsets[-1], n_groups), dtype=np.int64 if weights is None else float)
+    for (codes, labels), offset in zip(encoded, offsets):
+        valid = codes >= 0
+        keys = codes[valid] * n_groups + group_ids[valid]
+        counts[offset:offset + len(labels)] += np.bincount(
+            keys, weights=None if weights is None else weights[valid], minlength=len(labels) * n_groups
+        ).reshape(len(labels), n_groups)
+
+    # Shares within each (question, group)
+    question_of_row = np.repeat(np.arange(len(questions)), sizes)
+    totals = np.add.reduceat(counts, offsets[:-1], axis=0) if len(counts) else counts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares = counts / totals[question_of_row]
+
+    rows, groups = np.nonzero(counts)
+    table = {
+        'question': np.asarray(questions, dtype=object)[question_of_row[rows]],
+        'answer': np.concatenate([labels for _, labels in encoded] or [[]])[rows],
+    }
+    if by:
+        dim_codes = np.unravel_index(groups, group_shape)
+        for dim, labels, codes in zip(by, group_labels, dim_codes):
+            table[dim] = labels[codes]
+    table['count'] = counts[rows, groups]
+    table['share'] = shares[rows, groups]
+    return pd.DataFrame(table, columns=['question', 'answer', *by, 'count', 'share'])
+
+
+def add_shares(table, by=DIMENSIONS):
+    """Recompute ``share`` for a table of summed ``count`` values."""
+    table = table.copy()
+    totals = table.groupby(['question', *by], sort=False, dropna=False)['count'].transform('sum')
+    table['share'] = table['count'] / totals
+    return table
+
+
+def question_counts(table, question, **filters):
+    """Answer counts for one question from a ``tally`` table.
+
+    Keyword filters select a dimension value, e.g. ``gender='Male'`` or
+    ``country='India'``; ``None`` keeps every value. The result has the same
+    ``[question, 'count']`` layout as ``value_counts().reset_index()``, most
+    frequent answer first, plus a ``share`` column.
+    """
+    rows = table[table['question'] == question]
+    for dim, value in filters.items():
+        if value is not None:
+            rows = rows[rows[dim] == value]
+    counts = rows.groupby('answer', sort=False)['count'].sum()
+    counts = counts.sort_values(ascending=False, kind='stable').reset_index()
+    counts.columns = [question, 'count']
+    counts['share'] = counts['count'] / counts['count'].sum()
+    return counts
+
+
+def format_counts(counts):
+    """Render ``question_counts`` output as 'answer: N participants (x%)' lines.
+
+    Tables with ``low``/``high`` bounds (see ``genz.inference``) also show
+    the interval, e.g. 'answer: N participants (x%, 95% CI a-b%)'.
+    """
+    answers, values = counts.iloc[:, 0].astype(str), counts['count']
+    # Weighted counts are fractional
+    values = values.map('{:.1f}'.format) if values.dtype.kind == 'f' else values.astype(str)
+    percents = (counts['share'] * 100).map('{:.1f}'.format)
+    if {'low', 'high'} <= set(counts.columns):
+        level = round(counts.attrs.get('confidence', 0.95) * 100)
+        percents = (percents + f'%, {level}% CI ' + (counts['low'] * 100).map('{:.1f}'.format)
+                    + '-' + (counts['high'] * 100).map('{:.1f}'.format))
+    lines = answers + ': ' + values + ' participants (' + percents + '%)'
+    return '\n'.join(lines)
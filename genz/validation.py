@@ -0,0 +1,437 @@
+"""Data-quality checks on raw responses, before the col_map rename and the country filter.
+
+``validate_survey`` checks whole columns at once; checks that need string
+work run once per distinct value. A row is quarantined when
+- its record has more or fewer fields than the 15 original headers;
+- ``no_social_impact`` is not a whole number on its 1-10 rating scale;
+- its gender label is not in ``data/answer_mapping.csv``;
+- it duplicates an earlier submission: its row hash
+  (``pd.util.hash_pandas_object``) matches one of the last
+  ``DUPLICATE_WINDOW`` distinct rows'.
+Missing answers are not errors, and neither are zip codes that are not
+PIN codes: such a response keeps its other answers, and ``RegionIndex``
+leaves it out of the region rollups and lists it in ``malformed()``.
+``validate_survey`` warns about the malformed PINs of India rows it keeps.
+Quarantined rows keep their values and get a ``reason`` listing every
+failed check. They are written next to the CSV as
+``<name>.quarantine.csv`` instead of flowing into the tallies.
+
+``read_csv`` pads short records with missing values and, with
+``on_bad_lines``, skips long ones, so field counts come from a quote-aware
+scan of the CSV bytes. The scan only runs when the parse shows a ragged
+record: a skipped line or a missing value in the last column. Clean files
+pay for the hashing and the column checks only.
+"""
+
+import io
+import os
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .answers import AnswerMap
+from .data import load_survey, rename_columns
+from .profiling import profiled
+from .regions import parse_pins
+from .schema import COL_MAP, DATA_PATH, ORIGINAL_COLUMNS
+
+# Rating scale of each numeric rating question; the export records 1-10
+RATING_SCALES = {'no_social_impact': (1, 10)}
+# Single-choice questions whose labels must be in the answer mapping
+KNOWN_LABEL_QUESTIONS = ['gender']
+QUARANTINE_COLUMNS = ['row', 'reason', *ORIGINAL_COLUMNS]
+# Country whose zip codes are PIN codes
+PIN_COUNTRY = 'India'
+# Row numbers listed in the malformed PIN warning
+PIN_WARNING_ROWS = 10
+# Distinct rows whose hashes are kept for the duplicate check: 16 MB at most
+DUPLICATE_WINDOW = 1_000_000
+# CSV bytes scanned at a time when counting fields
+BLOCK_BYTES = 16 * 1024 * 1024
+# bytes.translate table marking separators, quotes and line breaks
+_MARKS = bytes(1 if chr(byte) in ',"\n' else 0 for byte in range(256))
+_QUOTE, _NEWLINE = ord('"'), ord('\n')
+
+
+def field_counts(f, block_bytes=BLOCK_BYTES):
+    """Fields of each record of an open binary CSV, header first.
+
+    Separators and line breaks inside quotes do not count. Blank and
+    whitespace-only lines, which ``read_csv`` skips, count 0 fields.
+    """
+    counts = []
+    # Quote parity at the block start; fields and (while it has one field) bytes of the unfinished record
+    quoted, fields, tail = 0, 1, b''
+    while block := f.read(block_bytes):
+        data = np.frombuffer(block, dtype=np.uint8)
+        marks = np.flatnonzero(np.frombuffer(block.translate(_MARKS), dtype=bool))
+        quotes = data[marks] == _QUOTE
+        marks = marks[((np.cumsum(quotes) + quoted) % 2 == 0) & ~quotes]
+        ends = np.flatnonzero(data[marks] == _NEWLINE)
+        rest = 0
+        if len(ends):
+            # Marks between two line breaks are the separators of one record
+            per_record = np.diff(ends, prepend=-1)
+            per_record[0] += fields - 1
+            starts = np.concatenate([[0], marks[ends[:-1]] + 1])
+            for i in np.flatnonzero(per_record == 1):
+                text = block[starts[i]:marks[ends[i]]]
+                if not (tail + text if i == 0 else text).strip():
+                    per_record[i] = 0
+            counts.append(per_record)
+            fields, tail, rest = len(marks) - ends[-1], b'', marks[ends[-1]] + 1
+        else:
+            fields += len(marks)
+        if fields == 1:
+            tail += block[rest:]
+        quoted = (quoted + int(quotes.sum())) % 2
+    if fields > 1 or tail.strip():
+        counts.append([fields])
+    return np.concatenate(counts) if counts else np.zeros(0, dtype=np.intp)
+
+
+def row_hashes(df):
+    """64-bit hash of each row's values.
+
+    Numbers are hashed as floats, so a chunk whose numeric column holds
+    missing values (and was read as floats) hashes like one read as integers.
+    """
+    numeric = [column for column in df.columns if pd.api.types.is_numeric_dtype(df[column])]
+    return pd.util.hash_pandas_object(df.astype(dict.fromkeys(numeric, 'float64')), index=False).to_numpy()
+
+
+class RowHashes:
+    """Hashes of the last ``window`` distinct rows validated, to catch duplicates across chunks and refreshes.
+
+    Memory stays bounded: past ``window`` hashes the oldest are forgotten,
+    so a row repeating one read more than ``window`` distinct rows earlier
+    is not caught. ``window=0`` turns the duplicate check off.
+    """
+
+    def __init__(self, recent=None, window=DUPLICATE_WINDOW, hashes=None):
+        self.window = window
+        # Distinct hashes in the order they were added, and the same hashes sorted for lookups
+        self.recent = np.zeros(0, dtype=np.uint64) if recent is None else recent[max(len(recent) - window, 0):]
+        self.hashes = np.sort(self.recent) if hashes is None or len(hashes) != len(self.recent) else hashes
+
+    def __len__(self):
+        return len(self.recent)
+
+    def _contains(self, hashes):
+        # Sorted lookups walk the set in order instead of jumping around it
+        found = np.zeros(len(hashes), dtype=bool)
+        if len(self.hashes) and len(hashes):
+            order = np.argsort(hashes)
+            at = np.searchsorted(self.hashes, hashes[order]).clip(max=len(self.hashes) - 1)
+            found[order] = self.hashes[at] == hashes[order]
+        return found
+
+    def repeated(self, hashes):
+        """Mask of ``hashes`` seen before, here or earlier in ``hashes``."""
+        if not self.window:
+            return np.zeros(len(hashes), dtype=bool)
+        return pd.Series(hashes).duplicated().to_numpy() | self._contains(hashes)
+
+    def add(self, hashes):
+        # Append the new distinct hashes in arrival order and drop the oldest past the window;
+        # both arrays are spliced rather than sorted again
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        _, first = np.unique(hashes, return_index=True)
+        hashes = hashes[np.sort(first)]
+        hashes = hashes[~self._contains(hashes)]
+        hashes = hashes[max(len(hashes) - self.window, 0):]
+        n_old = max(len(self.recent) + len(hashes) - self.window, 0)
+        if n_old:
+            self.hashes = np.delete(self.hashes, np.searchsorted(self.hashes, self.recent[:n_old]))
+        self.recent = np.concatenate([self.recent[n_old:], hashes])
+        hashes = np.sort(hashes)
+        self.hashes = np.insert(self.hashes, np.searchsorted(self.hashes, hashes), hashes)
+        return self
+
+    def merge(self, *others):
+        """Take in the hashes of other sets, such as shards' partial results, in order."""
+        for other in others:
+            self.add(other.recent)
+        return self
+
+    def save(self, path):
+        """Write both arrays as one ``.npy`` file, so loading needs no sort."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with open(partial, 'wb') as f:
+            np.save(f, np.stack([self.recent, self.hashes]))
+        os.replace(partial, path)
+        return path
+
+    @classmethod
+    def load(cls, path, window=DUPLICATE_WINDOW):
+        """Hashes saved at ``path``, or an empty set if there are none."""
+        try:
+            recent, hashes = np.load(path)
+        except (FileNotFoundError, ValueError):
+            return cls(window=window)
+        return cls(recent, window, hashes if len(recent) <= window else None)
+
+
+def _check_columns(df):
+    if list(df.columns) != ORIGINAL_COLUMNS:
+        raise ValueError(f"Expected the {len(ORIGINAL_COLUMNS)} original headers of data/column_mapping.csv, "
+                         f"got {len(df.columns)} columns")
+
+
+def _off_scale(values, low, high):
+    # Present values that are not whole numbers in [low, high]
+    numbers = pd.to_numeric(values, errors='coerce')
+    return (values.notna() & ~(numbers.between(low, high) & (numbers % 1 == 0))).to_numpy()
+
+
+def _labels(answer_map, question, values):
+    # (canonical label, known) of each value; code -1 (missing) maps to (None, True)
+    codes, uniques = pd.factorize(values)
+    canonical, known = answer_map._map_labels(question, np.asarray(uniques, dtype=object))
+    return np.append(canonical, None)[codes], np.append(known, True)[codes]
+
+
+def _malformed_pins(df, answer_map):
+    # (positions, reasons) of PIN_COUNTRY rows whose zip code is given but not a valid PIN
+    countries = df[COL_MAP['country']]
+    if 'country' in answer_map.table:
+        countries = _labels(answer_map, 'country', countries)[0]
+    codes, zip_codes = pd.factorize(df[COL_MAP['zip_code']])
+    _, reasons = parse_pins(zip_codes)
+    reasons = np.append(reasons, None)[codes]
+    positions = np.flatnonzero((np.asarray(countries, dtype=object) == PIN_COUNTRY) & (reasons != None))  # noqa: E711
+    return positions, reasons[positions]
+
+
+def _warn_malformed_pins(rows, reasons):
+    counts = ', '.join(f'{reason}: {count:,}' for reason, count in pd.Series(reasons).value_counts().items())
+    listed = ', '.join(str(row) for row in rows[:PIN_WARNING_ROWS]) + (', ...' if len(rows) > PIN_WARNING_ROWS else '')
+    warnings.warn(f"{len(rows):,} {PIN_COUNTRY} zip codes are not valid PINs ({counts}; rows {listed}); "
+                  f"the responses are kept but left out of region rollups")
+
+
+@profiled('validate')
+def validate_survey(df, answer_map=None, fields=None, seen=None, first_row=0):
+    """Split responses with the original headers into ``(valid rows, quarantine)``.
+
+    ``fields`` are the field counts of the records ``df`` was read from
+    (see ``field_counts``); records with too many fields, which were not
+    read, are quarantined without values. ``seen`` is a
+    ``RowHashes`` of rows validated earlier, e.g. in other chunks; the
+    hashes of these rows are added to it. Quarantined rows are
+    numbered by record from ``first_row``, header and blank lines excluded.
+    Malformed PINs of kept India rows do not quarantine them; they are
+    reported in a warning with the same numbering.
+    """
+    _check_columns(df)
+    answer_map = AnswerMap.from_csv() if answer_map is None else answer_map
+    seen = RowHashes() if seen is None else seen
+    rows = np.arange(first_row, first_row + len(df))
+    long_rows = rows[:0]
+    checks = {}
+    if fields is not None:
+        fields = np.asarray(fields)
+        fields = fields[fields > 0]
+        parsed = fields <= len(ORIGINAL_COLUMNS)
+        records = np.arange(first_row, first_row + len(fields))
+        rows, long_rows = records[parsed], records[~parsed]
+        checks['wrong column count'] = fields[parsed] != len(ORIGINAL_COLUMNS)
+    for question, (low, high) in RATING_SCALES.items():
+        checks[f'{question} not in {low}-{high}'] = _off_scale(df[COL_MAP[question]], low, high)
+    for question in KNOWN_LABEL_QUESTIONS:
+        if question in answer_map.table:
+            _, known = _labels(answer_map, question, df[COL_MAP[question]])
+            checks[f'unknown {question}'] = ~known
+    hashes = row_hashes(df)
+    checks['duplicate'] = seen.repeated(hashes)
+
+    # One reason string per distinct combination of failed checks
+    failed = np.column_stack(list(checks.values())) @ (1 << np.arange(len(checks)))
+    bad = failed != 0
+    combos, combinations = pd.factorize(failed[bad])
+    reasons = np.array(['; '.join(name for bit, name in enumerate(checks) if combination >> bit & 1)
+                        for combination in combinations], dtype=object)
+    quarantine = df[bad].copy()
+    quarantine.insert(0, 'row', rows[bad])
+    quarantine.insert(1, 'reason', reasons[combos])
+    if len(long_rows):
+        skipped = pd.DataFrame({'row': long_rows, 'reason': 'wrong column count'})
+        quarantine = pd.concat([quarantine, skipped]).sort_values('row', kind='stable')
+    seen.add(hashes)
+    positions, pin_reasons = _malformed_pins(df, answer_map)
+    kept = ~bad[positions]
+    if kept.any():
+        _warn_malformed_pins(rows[positions[kept]], pin_reasons[kept])
+    return df[~bad].reset_index(drop=True), quarantine.reindex(columns=QUARANTINE_COLUMNS).reset_index(drop=True)
+
+
+def validate_renamed(survey, answer_map=None, seen=None, first_row=0):
+    """``validate_survey`` for responses with short column names, such as ingest segments.
+
+    ``survey`` is a renamed DataFrame or ``EncodedSurvey``. Returns the
+    valid rows, renamed, and the quarantine with the original headers.
+    """
+    df = survey if isinstance(survey, pd.DataFrame) else survey.decode()
+    valid, quarantine = validate_survey(df[list(COL_MAP)].rename(columns=COL_MAP), answer_map, None, seen,
+                                        first_row)
+    return rename_columns(valid), quarantine
+
+
+def _rewind(source):
+    # Seek a buffer back to its start so it can be read again
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+
+def _read(source, **read_csv_kwargs):
+    # (frame, whether read_csv skipped or cut a line); other warnings pass through.
+    # index_col=False keeps a long first row from turning into an index.
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        df = load_survey(_rewind(source), on_bad_lines='warn', index_col=False, **read_csv_kwargs)
+    ragged = False
+    for warning in caught:
+        if issubclass(warning.category, pd.errors.ParserWarning):
+            ragged = True
+        else:
+            warnings.warn_explicit(warning.message, warning.category, warning.filename, warning.lineno)
+    return df, ragged
+
+
+def read_validated(source=DATA_PATH, answer_map=None, seen=None, first_row=0, **read_csv_kwargs):
+    """Read a CSV (path or binary buffer) and split it into ``(valid rows, quarantine)``.
+
+    When a record may have the wrong number of fields, the CSV is scanned
+    with ``field_counts`` and read again without the records that have
+    too many, so every row lines up with its record.
+    """
+    df, ragged = _read(source, **read_csv_kwargs)
+    _check_columns(df)
+    fields = None
+    if ragged or df[ORIGINAL_COLUMNS[-1]].isna().any():
+        if hasattr(source, 'read'):
+            fields = field_counts(_rewind(source))
+        else:
+            with open(source, 'rb') as f:
+                fields = field_counts(f)
+        # Record numbers as read_csv counts them: header and blank lines included
+        too_long = np.flatnonzero(fields > len(ORIGINAL_COLUMNS))
+        if len(too_long):
+            df, _ = _read(source, skiprows=too_long, **read_csv_kwargs)
+        if read_csv_kwargs.get('header', 'infer') is not None:
+            fields = fields[1:]
+    return validate_survey(df, answer_map, fields, seen, first_row)
+
+
+class _ByteRange(io.RawIOBase):
+    # Read-only file over bytes [start, end) of an open binary file, so a chunk is parsed without copying it
+
+    def __init__(self, f, start, end):
+        super().__init__()
+        self.f, self.start, self.end = f, start, end
+        self.position = start
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: self.start, io.SEEK_CUR: self.position, io.SEEK_END: self.end}[whence]
+        self.position = min(max(base + offset, self.start), self.end)
+        return self.position - self.start
+
+    def tell(self):
+        return self.position - self.start
+
+    def readinto(self, buffer):
+        self.f.seek(self.position)
+        n = self.f.readinto(memoryview(buffer)[:max(self.end - self.position, 0)])
+        self.position += n
+        return n
+
+
+def _quoted_cut(f, start, end):
+    # Offset of the last line break in [start, end) that lies outside quotes
+    f.seek(start)
+    block = f.read(end - start)
+    cut = len(block)
+    while cut and block.count(b'"', 0, cut) % 2:
+        cut = block.rfind(b'\n', 0, cut - 1) + 1
+    return start + cut
+
+
+def iter_validated(path=DATA_PATH, chunksize=100_000, answer_map=None, **read_csv_kwargs):
+    """Yield ``(valid rows, quarantine)`` per chunk of about ``chunksize`` rows.
+
+    Chunks are cut from the file at line breaks and each is read and
+    validated on its own; duplicates are caught across chunks.
+    """
+    _check_columns(load_survey(path, nrows=0))
+    answer_map = AnswerMap.from_csv() if answer_map is None else answer_map
+    kwargs = dict(header=None, names=ORIGINAL_COLUMNS, **read_csv_kwargs)
+    seen, row = RowHashes(), 0
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        # The header (the known question texts) is one line
+        start = len(f.readline())
+        sample = f.read(1024 * 1024)
+        block_bytes = max(len(sample) * chunksize // max(sample.count(b'\n'), 1), 64 * 1024)
+        while start < size:
+            # Cut after the line running past the block, as plan_shards does
+            f.seek(min(start + block_bytes, size) - 1)
+            f.readline()
+            end = f.tell()
+            try:
+                valid, quarantine = read_validated(io.BufferedReader(_ByteRange(f, start, end)),
+                                                   answer_map, seen, row, **kwargs)
+            except pd.errors.ParserError:
+                # The cut fell inside quotes: back off to the last line break outside them
+                quoted_end = _quoted_cut(f, start, end)
+                if quoted_end in (start, end):
+                    raise
+                end = quoted_end
+                valid, quarantine = read_validated(io.BufferedReader(_ByteRange(f, start, end)),
+                                                   answer_map, seen, row, **kwargs)
+            start = end
+            row += len(valid) + len(quarantine)
+            yield valid, quarantine
+
+
+def quarantine_path(path):
+    """Where the quarantined rows of a CSV are written: ``<name>.quarantine.csv`` beside it."""
+    path = Path(path)
+    return path.with_name(f'{path.stem}.quarantine.csv')
+
+
+def write_quarantine(quarantine, path, append=False):
+    """Write the quarantined rows of the CSV at ``path`` and warn how many there are.
+
+    A quarantine file left from an earlier version of the CSV is removed
+    when no row fails. With ``append`` the rows are added to the file
+    instead, as when new rows are counted incrementally. Returns the
+    quarantine path, or ``None``.
+    """
+    target = quarantine_path(path)
+    if not len(quarantine):
+        if not append:
+            target.unlink(missing_ok=True)
+        return None
+    if append and target.exists():
+        quarantine.to_csv(target, mode='a', header=False, index=False)
+    else:
+        quarantine.to_csv(target, index=False)
+    warnings.warn(f"{len(quarantine):,} rows of {path} quarantined in {target} ({format_reasons(quarantine)})")
+    return target
+
+
+def format_reasons(quarantine):
+    """``'check: rows, ...'`` summary of a quarantine table, most frequent check first."""
+    reasons = quarantine['reason'].str.split('; ').explode().value_counts()
+    return ', '.join(f'{reason}: {count:,}' for reason, count in reasons.items())
@@ -0,0 +1,108 @@
+"""Post-stratification weights by raking to target margins.
+
+Respondents are collapsed into cells, one per combination of the weighting
+dimensions (gender, postal zone, ...), and iterative proportional fitting
+runs on that small array of cell counts rather than on rows. Every
+respondent then gets the fitted-to-observed ratio of their cell, so the
+weights sum to the number of respondents and their weighted margins match
+the targets.
+
+The default targets are approximate Census 2011 shares for India: 943
+females per 1,000 males, and state populations summed by postal zone.
+"""
+
+import warnings
+
+import numpy as np
+
+from .regions import LEVELS, RegionIndex
+from .tally import column_codes
+
+CENSUS_2011_GENDER = {'Male': 0.515, 'Female': 0.485}
+# Millions of people per first PIN digit
+CENSUS_2011_ZONES = {
+    '1': 90.4, '2': 209.9, '3': 129.5, '4': 212.0,
+    '5': 145.7, '6': 106.8, '7': 179.6, '8': 137.1,
+}
+DEFAULT_TARGETS = {'gender': CENSUS_2011_GENDER, 'zone': CENSUS_2011_ZONES}
+
+
+def _axis_totals(cells, axis):
+    return cells.sum(axis=tuple(other for other in range(cells.ndim) if other != axis))
+
+
+def ipf(cell_counts, margins, max_iter=100, tol=1e-10):
+    """Fit ``cell_counts`` to one target total per axis by iterative proportional fitting.
+
+    ``margins[axis]`` holds the target totals of that axis; targets over
+    categories without respondents cannot be met and should be dropped
+    first. Returns the fitted cell totals and the number of sweeps.
+    """
+    fitted = np.asarray(cell_counts, dtype=float).copy()
+    for sweep in range(1, max_iter + 1):
+        for axis, margin in enumerate(margins):
+            current = _axis_totals(fitted, axis)
+            factor = np.divide(margin, current, out=np.zeros_like(current), where=current > 0)
+            shape = [1] * fitted.ndim
+            shape[axis] = -1
+            fitted *= factor.reshape(shape)
+        error = max(np.abs(_axis_totals(fitted, axis) - margin).max() for axis, margin in enumerate(margins))
+        if error <= tol * fitted.sum():
+            return fitted, sweep
+    warnings.warn(f"Raking did not converge in {max_iter} sweeps (max margin error {error:.3g})")
+    return fitted, max_iter
+
+
+def _dimension(df, name, regions):
+    # Codes (0 = missing or malformed) and labels of one weighting dimension
+    if name in LEVELS:
+        return regions.codes[name] + 1, regions.labels(name)
+    codes, labels = column_codes(df, name)
+    return codes + 1, [str(label) for label in labels]
+
+
+def _margin(counts, labels, targets, name):
+    # Target totals for one dimension. Categories without a target (including
+    # missing) keep their sample total; the targets share out the rest.
+    labels = [None, *labels]
+    targeted = np.array([label in targets and counts[i] > 0 for i, label in enumerate(labels)])
+    unreached = sorted(label for label in targets if label not in labels or counts[labels.index(label)] == 0)
+    if unreached:
+        warnings.warn(f"No respondents for {name} targets {unreached}; they are dropped")
+    shares = np.array([targets[label] if targeted[i] else 0.0 for i, label in enumerate(labels)])
+    margin = np.where(targeted, 0.0, counts).astype(float)
+    if targeted.any():
+        margin[targeted] = counts[targeted].sum() * shares[targeted] / shares[targeted].sum()
+    return margin
+
+
+def raking_weights(df, targets=None, regions=None, max_iter=100):
+    """Per-row weights that rake ``df`` to ``targets``; they average to 1.
+
+    ``targets`` maps a dimension to ``{label: share}``; a dimension is a
+    survey column such as ``'gender'`` or a PIN region level (``'zone'``,
+    ``'subzone'``, ``'district'``) taken from ``regions``, a
+    ``RegionIndex`` built on demand. Defaults to ``DEFAULT_TARGETS``.
+    """
+    targets = DEFAULT_TARGETS if targets is None else targets
+    if regions is None and any(name in LEVELS for name in targets):
+        regions = RegionIndex.build(df)
+
+    codes, labels = zip(*(_dimension(df, name, regions) for name in targets))
+    shape = tuple(len(dim_labels) + 1 for dim_labels in labels)
+    cells = np.ravel_multi_index(codes, shape)
+    cell_counts = np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+
+    margins = []
+    for axis, (name, dim_targets) in enumerate(targets.items()):
+        margins.append(_margin(_axis_totals(cell_counts, axis), labels[axis], dim_targets, name))
+    fitted, _ = ipf(cell_counts, margins, max_iter)
+
+    cell_weights = np.divide(fitted, cell_counts, out=np.zeros_like(fitted), where=cell_counts > 0)
+    return cell_weights.ravel()[cells]
+
+
+def effective_sample_size(weights):
+    """Kish's effective sample size, ``sum(w) ** 2 / sum(w ** 2)``."""
+    weights = np.asarray(weights, dtype=float)
+    return weights.sum() ** 2 / (weights ** 2).sum()
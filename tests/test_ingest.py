@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pandas as pd
+
+from genz import ingest
+from genz.data import load_survey
+from genz.ingest import MAX_BODY_BYTES, IngestServer
+
+
+def _body(n_rows=1):
+    row = load_survey().iloc[0]
+    submission = {header: None if pd.isna(value) else getattr(value, 'item', lambda: value)()
+                  for header, value in row.items()}
+    return json.dumps([submission] * n_rows).encode('utf-8')
+
+
+def test_failing_writer_keeps_batch_and_rejects_new_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'WRITE_RETRY', 0.01)
+
+    async def run():
+        server = IngestServer(tmp_path, batch_rows=10, max_delay=0.01)
+        write, failures = server.writer.write, []
+
+        def flaky_write(rows):
+            if len(failures) < 3:
+                failures.append(rows)
+                raise OSError('disk full')
+            return write(rows)
+
+        server.writer.write = flaky_write
+        listener = await server.start(port=0)
+        assert (await server._submit_body(_body(5)))[0] == 202
+        while server.write_error is None:
+            await asyncio.sleep(0.005)
+        status, payload, _ = await server._submit_body(_body(5))
+        assert status == 503 and 'disk full' in payload['error']
+        await server.stop()
+        listener.close()
+        return server.stats
+
+    stats = asyncio.run(run())
+    assert stats['write_errors'] == 3
+    assert stats['accepted_rows'] == stats['rows_written'] == 5
+    assert len(ingest.load_segments(tmp_path)) == 5
+
+
+def test_stop_reports_rows_that_cannot_be_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'WRITE_RETRY', 0.01)
+
+    async def run():
+        server = IngestServer(tmp_path, batch_rows=10, max_delay=0.01)
+
+        def broken_write(rows):
+            raise OSError('disk full')
+
+        server.writer.write = broken_write
+        listener = await server.start(port=0)
+        await server._submit_body(_body(2))
+        try:
+            await server.stop(timeout=0.2)
+        except RuntimeError as error:
+            return str(error)
+        finally:
+            listener.close()
+
+    assert 'disk full' in asyncio.run(run())
+
+
+def test_malformed_requests_get_an_error_response(tmp_path):
+    async def request(port, head):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(head)
+        status_line = await reader.readline()
+        writer.close()
+        return int(status_line.split()[1])
+
+    async def run():
+        server = IngestServer(tmp_path)
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        statuses = [await request(port, head) for head in (
+            b'GARBAGE\r\n\r\n',
+            b'POST /submit HTTP/1.1\r\nContent-Length: abc\r\n\r\n',
+            b'POST /submit HTTP/1.1\r\nContent-Length: -5\r\n\r\n',
+            f'POST /submit HTTP/1.1\r\nContent-Length: {MAX_BODY_BYTES + 1}\r\n\r\n'.encode('latin-1'),
+        )]
+        await server.stop()
+        listener.close()
+        return statuses
+
+    assert asyncio.run(run()) == [400, 400, 400, 413]